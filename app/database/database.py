@@ -1,9 +1,15 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.config import get_database_url
+from app.config import get_database_url, settings
 
-engine = create_engine(get_database_url())
+engine = create_engine(
+    get_database_url(),
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_pre_ping=True,
+    connect_args={"connect_timeout": settings.database_connect_timeout_seconds}
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -14,4 +20,28 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+def warm_up_pool(connections: int = None) -> int:
+    """
+    Заранее открывает соединения пула, чтобы первые запросы не платили за подключение
+    
+    Args:
+        connections: количество соединений (по умолчанию размер пула)
+        
+    Returns:
+        Количество открытых соединений
+    """
+    connections = connections or settings.database_pool_size
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        # Соединения возвращаются в пул и остаются открытыми
+        for conn in opened:
+            conn.close()
+    return len(opened)
@@ -1,19 +1,335 @@
+from sqlalchemy import text
+from app.config import get_cache_partition_config
 from app.database.database import engine
-from app.database.models import Base
+from app.database.models import Base, CacheRadiusBucket
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Верхние границы корзин гистограммы радиусов в метрах (последняя корзина - без границы)
+RADIUS_BUCKET_BOUNDS = (100.0, 250.0, 500.0, 1000.0, 2500.0, 5000.0, 10000.0, 25000.0, 50000.0)
+
+CACHE_STATS_SQL = """
+CREATE OR REPLACE FUNCTION cache_radius_bucket(radius double precision) RETURNS integer
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$ SELECT width_bucket(radius, ARRAY[{bounds}]::double precision[]) $$;
+
+CREATE OR REPLACE FUNCTION cache_radius_bucket_bound(bucket integer) RETURNS double precision
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$ SELECT (ARRAY[{bounds}]::double precision[])[bucket + 1] $$;
+
+-- Корзины ведутся по поколениям: статистика отделяет текущие записи от ожидающих удаления.
+-- Строки блокируются в порядке ключа, чтобы конкурентные вставки не взаимоблокировались
+CREATE OR REPLACE FUNCTION cache_entries_stats_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO cache_radius_buckets AS b (generation, bucket, upper_bound_meters, entries)
+    SELECT d.generation, d.bucket, cache_radius_bucket_bound(d.bucket), d.entries
+    FROM (SELECT generation, cache_radius_bucket(radius_meters) AS bucket, count(*) AS entries
+          FROM new_rows GROUP BY 1, 2) d
+    ORDER BY 1, 2
+    ON CONFLICT (generation, bucket) DO UPDATE SET entries = b.entries + EXCLUDED.entries;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION cache_entries_stats_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE cache_radius_buckets b SET entries = b.entries - d.entries
+    FROM (SELECT generation, cache_radius_bucket(radius_meters) AS bucket, count(*) AS entries
+          FROM old_rows GROUP BY 1, 2) d
+    WHERE b.generation = d.generation AND b.bucket = d.bucket;
+    PERFORM cache_radius_buckets_cleanup();
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION cache_entries_stats_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM cache_radius_buckets;
+    RETURN NULL;
+END $$;
+
+-- Опустевшие корзины старых поколений больше не понадобятся
+CREATE OR REPLACE FUNCTION cache_radius_buckets_cleanup() RETURNS void LANGUAGE sql AS $$
+    DELETE FROM cache_radius_buckets
+    WHERE entries <= 0 AND generation < COALESCE((SELECT generation FROM cache_generation WHERE id = 1), 0)
+$$;
+
+DROP TRIGGER IF EXISTS cache_entries_stats_insert ON cache_entries;
+CREATE TRIGGER cache_entries_stats_insert AFTER INSERT ON cache_entries
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION cache_entries_stats_insert();
+
+DROP TRIGGER IF EXISTS cache_entries_stats_delete ON cache_entries;
+CREATE TRIGGER cache_entries_stats_delete AFTER DELETE ON cache_entries
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION cache_entries_stats_delete();
+
+DROP TRIGGER IF EXISTS cache_entries_stats_truncate ON cache_entries;
+CREATE TRIGGER cache_entries_stats_truncate AFTER TRUNCATE ON cache_entries
+    FOR EACH STATEMENT EXECUTE FUNCTION cache_entries_stats_truncate();
+"""
+
+# Обслуживание секций поколений: функции устанавливаются при любой схеме таблицы,
+# без секционирования создание секции - пустая операция, а отсоединять нечего
+CACHE_PARTITION_SQL = r"""
+CREATE OR REPLACE FUNCTION cache_entries_partitioned() RETURNS boolean LANGUAGE sql STABLE AS $$
+    SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'cache_entries'::regclass)
+$$;
+
+CREATE OR REPLACE FUNCTION cache_entries_create_partition(p_generation bigint, p_modulus integer)
+RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    v_name text := 'cache_entries_g' || p_generation;
+BEGIN
+    IF NOT cache_entries_partitioned() OR to_regclass(v_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- Строки этого поколения в секции по умолчанию (запись без секции) не дадут создать
+    -- секцию; удаление через родителя, чтобы сработали триггеры статистики
+    DELETE FROM cache_entries WHERE generation = p_generation;
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF cache_entries FOR VALUES FROM (%s) TO (%s) '
+        'PARTITION BY HASH (cache_key)', v_name, p_generation, p_generation + 1);
+    FOR i IN 0 .. greatest(p_modulus, 1) - 1 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+            v_name || '_h' || i, v_name, greatest(p_modulus, 1), i);
+    END LOOP;
+END $$;
+
+-- Отсоединение - изменение каталога: короткая эксклюзивная блокировка родителя
+-- без чтения строк; при долгих запросах к таблице ожидание ограничено lock_timeout
+CREATE OR REPLACE FUNCTION cache_entries_detach_stale_partitions(p_generation bigint, p_lock_timeout_ms integer)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    v_partition record;
+    v_detached integer := 0;
+BEGIN
+    PERFORM set_config('lock_timeout', p_lock_timeout_ms || 'ms', true);
+    FOR v_partition IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'cache_entries'::regclass
+          AND c.relname ~ '^cache_entries_g[0-9]+$'
+          AND substring(c.relname FROM '[0-9]+$')::bigint < p_generation
+    LOOP
+        EXECUTE format('ALTER TABLE cache_entries DETACH PARTITION %I', v_partition.relname);
+        v_detached := v_detached + 1;
+    END LOOP;
+    RETURN v_detached;
+END $$;
+
+-- Триггеры статистики не срабатывают при удалении секции: корзины гистограммы
+-- уменьшаются по содержимому отсоединенной таблицы, в которую уже никто не пишет
+CREATE OR REPLACE FUNCTION cache_entries_drop_detached_partitions() RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    v_partition record;
+    v_entries bigint;
+    v_dropped bigint := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname FROM pg_class c
+        WHERE c.relname ~ '^cache_entries_g[0-9]+$' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+          AND c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'cache_entries'::regclass)
+    LOOP
+        EXECUTE format(
+            'WITH d AS (SELECT generation, cache_radius_bucket(radius_meters) AS bucket, count(*) AS entries '
+            'FROM %I GROUP BY 1, 2), '
+            'u AS (UPDATE cache_radius_buckets b SET entries = b.entries - d.entries '
+            'FROM d WHERE b.generation = d.generation AND b.bucket = d.bucket) '
+            'SELECT COALESCE(sum(entries), 0) FROM d', v_partition.relname) INTO v_entries;
+        EXECUTE format('DROP TABLE %I', v_partition.relname);
+        v_dropped := v_dropped + v_entries;
+    END LOOP;
+    PERFORM cache_radius_buckets_cleanup();
+    RETURN v_dropped;
+END $$;
+"""
+
+_INIT_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('cache_entries_init'))"
+
+# Секционированная таблица кэша: диапазон по поколению (очистка кэша - удаление
+# секций старых поколений), внутри поколения - hash по ключу кэша
+PARTITIONED_CACHE_ENTRIES_SQL = """
+CREATE TABLE cache_entries_partitioned (
+    id integer NOT NULL DEFAULT nextval('cache_entries_id_seq'),
+    cache_key varchar NOT NULL,
+    latitude double precision NOT NULL,
+    longitude double precision NOT NULL,
+    radius_meters double precision NOT NULL,
+    polygon_data varchar NOT NULL,
+    area_sqm double precision NOT NULL,
+    geom geometry(Geometry, 4326),
+    generation bigint NOT NULL DEFAULT 0,
+    created_at timestamp with time zone DEFAULT now(),
+    updated_at timestamp with time zone,
+    CONSTRAINT cache_entries_partitioned_pkey PRIMARY KEY (id, generation)
+) PARTITION BY RANGE (generation);
+
+-- Записи воркеров, еще не заметивших смену поколения, после удаления их секции
+CREATE TABLE cache_entries_default PARTITION OF cache_entries_partitioned DEFAULT;
+"""
+
 
 def init_database():
     """Создает все таблицы в базе данных"""
     try:
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created successfully")
+        upgrade_cache_entries()
+        partition_config = get_cache_partition_config()
+        if partition_config.get('enabled'):
+            partition_cache_entries(partition_config.get('hash_modulus', 8))
+        create_cache_indexes()
+        install_cache_stats()
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
         raise
 
 
+def upgrade_cache_entries():
+    """Добавляет в существующую таблицу кэша колонки геометрии (с GiST индексом) и поколения, заполняет геометрию"""
+    with engine.begin() as connection:
+        connection.execute(text(
+            "ALTER TABLE cache_entries ADD COLUMN IF NOT EXISTS geom geometry(Geometry, 4326)"
+        ))
+        connection.execute(text(
+            "ALTER TABLE cache_entries ADD COLUMN IF NOT EXISTS generation bigint NOT NULL DEFAULT 0"
+        ))
+        connection.execute(text(
+            "INSERT INTO cache_generation (id, generation) VALUES (1, 0) ON CONFLICT (id) DO NOTHING"
+        ))
+        updated = connection.execute(text(
+            "UPDATE cache_entries SET geom = ST_SetSRID(ST_GeomFromGeoJSON(polygon_data), 4326) "
+            "WHERE geom IS NULL"
+        )).rowcount
+    if updated:
+        logger.info(f"Backfilled geometry for {updated} cache entries")
+
+
+def partition_cache_entries(hash_modulus: int):
+    """
+    Переводит таблицу кэша на секционирование по поколениям и создает секции текущего и следующего поколений
+    
+    Секция следующего поколения создается заранее, чтобы смена поколения не брала
+    эксклюзивную блокировку таблицы (bump_generation создает секцию лишь при ее отсутствии).
+    
+    Существующая несекционированная таблица заменяется под эксклюзивной блокировкой:
+    переносятся только записи текущего поколения (остальные недействительны),
+    последовательность id сохраняется, гистограмма радиусов пересчитывается.
+    """
+    with engine.begin() as connection:
+        # Воркеры запускаются одновременно - перенос выполняет первый, остальные видят результат
+        connection.execute(text(_INIT_LOCK_SQL))
+        connection.execute(text(CACHE_PARTITION_SQL))
+        if not connection.execute(text("SELECT cache_entries_partitioned()")).scalar():
+            connection.execute(text("LOCK TABLE cache_entries IN ACCESS EXCLUSIVE MODE"))
+            connection.execute(text(PARTITIONED_CACHE_ENTRIES_SQL))
+            connection.execute(text("ALTER TABLE cache_entries RENAME TO cache_entries_unpartitioned"))
+            connection.execute(text("ALTER TABLE cache_entries_partitioned RENAME TO cache_entries"))
+            connection.execute(text("ALTER SEQUENCE cache_entries_id_seq OWNED BY cache_entries.id"))
+            generation = connection.execute(text("SELECT generation FROM cache_generation WHERE id = 1")).scalar()
+            for partition_generation in (generation, generation + 1):
+                connection.execute(
+                    text("SELECT cache_entries_create_partition(:generation, :modulus)"),
+                    {"generation": partition_generation, "modulus": hash_modulus}
+                )
+            moved = connection.execute(text(
+                "INSERT INTO cache_entries SELECT id, cache_key, latitude, longitude, radius_meters, polygon_data, "
+                "area_sqm, geom, generation, created_at, updated_at "
+                "FROM cache_entries_unpartitioned WHERE generation >= :generation"
+            ), {"generation": generation}).rowcount
+            connection.execute(text("DROP TABLE cache_entries_unpartitioned"))
+            # Пустая гистограмма при непустом кэше пересчитывается install_cache_stats
+            connection.execute(text("DELETE FROM cache_radius_buckets"))
+            logger.info(f"Cache entries table partitioned by generation: {moved} entries moved")
+            return
+        
+        generation = connection.execute(text("SELECT generation FROM cache_generation WHERE id = 1")).scalar()
+        for partition_generation in (generation, generation + 1):
+            connection.execute(
+                text("SELECT cache_entries_create_partition(:generation, :modulus)"),
+                {"generation": partition_generation, "modulus": hash_modulus}
+            )
+
+
+def create_cache_indexes():
+    """
+    Создает индексы таблицы кэша, общие для обеих схем, и устанавливает функции обслуживания секций
+    
+    Уникальность (cache_key, generation) - цель ON CONFLICT при записи: в секционированной
+    таблице уникальный индекс обязан включать ключ секционирования. Прежний уникальный
+    индекс по одному ключу удаляется: он не дает записать ключ в новом поколении,
+    пока старая запись не удалена, а поиск по ключу обслуживает составной индекс.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(_INIT_LOCK_SQL))
+        connection.execute(text(CACHE_PARTITION_SQL))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_cache_entries_geom ON cache_entries USING GIST (geom)"
+        ))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_cache_entries_key_generation "
+            "ON cache_entries (cache_key, generation)"
+        ))
+        connection.execute(text("DROP INDEX IF EXISTS ix_cache_entries_cache_key"))
+        if not connection.execute(text("SELECT cache_entries_partitioned()")).scalar():
+            # В секционированной таблице поколение отбирается секциями
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_generation ON cache_entries (generation)"
+            ))
+
+
+
+def install_cache_stats():
+    """
+    Устанавливает триггеры статистики кэша и при необходимости пересчитывает гистограмму
+    
+    Триггеры уровня оператора обновляют корзины гистограммы радиусов (по поколениям)
+    при вставке, удалении и очистке cache_entries, поэтому чтение статистики не
+    сканирует таблицу. Полный пересчет выполняется один раз: при первой установке,
+    смене границ корзин или переходе со схемы корзин без поколений.
+    """
+    bounds = list(RADIUS_BUCKET_BOUNDS)
+    expected = dict(enumerate(bounds + [None]))
+    with engine.begin() as connection:
+        # Пересчет и установка триггеров под блокировкой, чтобы не потерять конкурентные вставки
+        connection.execute(text("LOCK TABLE cache_entries IN SHARE ROW EXCLUSIVE MODE"))
+        
+        migrated = not connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'cache_radius_buckets' AND column_name = 'generation')"
+        )).scalar()
+        if migrated:
+            # Корзины - производные данные: старая таблица без поколений пересоздается
+            connection.execute(text("DROP TABLE IF EXISTS cache_radius_buckets"))
+            CacheRadiusBucket.__table__.create(connection)
+        
+        connection.execute(text(CACHE_STATS_SQL.format(bounds=", ".join(repr(bound) for bound in bounds))))
+        
+        current = connection.execute(text(
+            "SELECT DISTINCT bucket, upper_bound_meters FROM cache_radius_buckets"
+        )).all()
+        if current:
+            if not migrated and all(expected.get(bucket, -1.0) == bound for bucket, bound in current):
+                return
+        elif not connection.execute(text("SELECT EXISTS (SELECT 1 FROM cache_entries)")).scalar():
+            return
+        
+        counts = connection.execute(text(
+            "SELECT generation, cache_radius_bucket(radius_meters), count(*) FROM cache_entries GROUP BY 1, 2"
+        )).all()
+        connection.execute(text("DELETE FROM cache_radius_buckets"))
+        if counts:
+            connection.execute(
+                text(
+                    "INSERT INTO cache_radius_buckets (generation, bucket, upper_bound_meters, entries) "
+                    "VALUES (:generation, :bucket, :upper_bound_meters, :entries)"
+                ),
+                [
+                    {"generation": generation, "bucket": bucket, "upper_bound_meters": expected[bucket],
+                     "entries": entries}
+                    for generation, bucket, entries in counts
+                ]
+            )
+    logger.info(f"Cache radius histogram rebuilt: {sum(entries for _, _, entries in counts)} entries")
+
+
 if __name__ == "__main__":
     init_database() 
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+SQL функции приложения, устанавливаемые init_db.py
+
+Функции версионируются именем: изменение тела - новая версия с новым именем,
+поэтому во время обновления воркеры прежней версии продолжают вызывать свою функцию.
+"""
+
+# Версия функции поиска или построения полигона
+POLYGON_FUNCTION_VERSION = 3
+LOOKUP_OR_CREATE_POLYGON = f"lookup_or_create_polygon_v{POLYGON_FUNCTION_VERSION}"
+
+_LOOKUP_OR_CREATE_POLYGON_TEMPLATE = """
+CREATE OR REPLACE FUNCTION {name}(
+    p_cache_key varchar,
+    p_lat double precision,
+    p_lon double precision,
+    p_radius double precision,
+    p_segments integer,
+    p_simplify_tolerance double precision,
+    p_precision integer,
+    p_generation bigint
+) RETURNS TABLE (polygon_json varchar, area double precision, created boolean)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_srid integer;
+    v_geom geometry;
+BEGIN
+    -- Записи поколений ниже текущего недействительны (см. cache_generation)
+    RETURN QUERY
+        SELECT e.polygon_data, e.area_sqm, false
+        FROM cache_entries e
+        WHERE e.cache_key = p_cache_key
+          AND e.generation >= COALESCE((SELECT g.generation FROM cache_generation g WHERE g.id = 1), 0);
+    IF FOUND THEN
+        RETURN;
+    END IF;
+
+    -- Та же проекция, что у PostgisRepository.create_polygon: UTM зона по долготе,
+    -- у полюсов и антимеридиана - полярная стереографическая
+    IF abs(p_lat) > 80 OR abs(p_lon) > 175 THEN
+        v_srid := CASE WHEN p_lat > 0 THEN 3413 ELSE 3412 END;
+    ELSE
+        v_srid := CASE WHEN p_lat >= 0 THEN 32600 ELSE 32700 END + floor((p_lon + 180) / 6)::integer + 1;
+    END IF;
+
+    v_geom := ST_Buffer(ST_Transform(ST_SetSRID(ST_MakePoint(p_lon, p_lat), 4326), v_srid), p_radius, p_segments);
+    IF p_simplify_tolerance IS NOT NULL THEN
+        -- Упрощение в метрической проекции, допуск в метрах
+        v_geom := ST_SimplifyPreserveTopology(v_geom, p_simplify_tolerance);
+    END IF;
+    area := ST_Area(v_geom);
+    {geojson}
+    created := true;
+
+    -- Одновременное построение того же ключа другим запросом перезаписывает строку тем же полигоном
+    INSERT INTO cache_entries AS e
+        (cache_key, latitude, longitude, radius_meters, polygon_data, area_sqm, geom, generation, created_at)
+    VALUES (p_cache_key, p_lat, p_lon, p_radius, polygon_json, area,
+            ST_SetSRID(ST_GeomFromGeoJSON(polygon_json), 4326), p_generation, now())
+    ON CONFLICT ({conflict_target}) DO UPDATE
+    SET polygon_data = EXCLUDED.polygon_data, area_sqm = EXCLUDED.area_sqm, geom = EXCLUDED.geom,
+        generation = EXCLUDED.generation, updated_at = now();
+    RETURN NEXT;
+END $$;
+"""
+
+# v1, v2: округление только при выводе ST_AsGeoJSON - совпавшие соседние вершины остаются
+_GEOJSON_ROUNDED = "polygon_json := ST_AsGeoJSON(ST_Transform(v_geom, 4326), COALESCE(p_precision, 15));"
+
+# Как round_coordinates при построении по шагам: привязка к сетке без повторных вершин
+# с валидным контуром, при вырождении на этой сетке - полигон без округления
+_GEOJSON_SNAPPED = """v_geom := ST_Transform(v_geom, 4326);
+    IF p_precision IS NOT NULL THEN
+        DECLARE
+            v_snapped geometry := ST_ReducePrecision(v_geom, power(10, -p_precision));
+        BEGIN
+            IF NOT ST_IsEmpty(v_snapped) AND GeometryType(v_snapped) IN ('POLYGON', 'MULTIPOLYGON') THEN
+                polygon_json := ST_AsGeoJSON(v_snapped, p_precision);
+            END IF;
+        END;
+    END IF;
+    polygon_json := COALESCE(polygon_json, ST_AsGeoJSON(v_geom, 15));"""
+
+LOOKUP_OR_CREATE_POLYGON_SQL = _LOOKUP_OR_CREATE_POLYGON_TEMPLATE.format(
+    name=LOOKUP_OR_CREATE_POLYGON, conflict_target="cache_key, generation", geojson=_GEOJSON_SNAPPED
+)
+
+# Функции по именам для установки (новая версия добавляется сюда же)
+FUNCTIONS = {
+    # v1: ключ уникален во всей таблице - не работает с секционированной cache_entries и после
+    # удаления уникального индекса по ключу (воркеры прежней версии строят полигоны по шагам)
+    "lookup_or_create_polygon_v1": _LOOKUP_OR_CREATE_POLYGON_TEMPLATE.format(
+        name="lookup_or_create_polygon_v1", conflict_target="cache_key", geojson=_GEOJSON_ROUNDED
+    ),
+    # v2: уникальность (cache_key, generation) включает ключ секционирования
+    "lookup_or_create_polygon_v2": _LOOKUP_OR_CREATE_POLYGON_TEMPLATE.format(
+        name="lookup_or_create_polygon_v2", conflict_target="cache_key, generation", geojson=_GEOJSON_ROUNDED
+    ),
+    # v3: координаты привязываются к сетке точности так же, как при построении по шагам
+    LOOKUP_OR_CREATE_POLYGON: LOOKUP_OR_CREATE_POLYGON_SQL
+}
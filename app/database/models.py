@@ -1,18 +1,58 @@
 from typing import Dict, Any, Optional
-from sqlalchemy import Column, String, Float, DateTime, Integer
+from geoalchemy2 import Geometry
+from sqlalchemy import BigInteger, Column, String, Float, DateTime, Index, Integer
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database.database import Base
 
 
 class CacheEntry(Base):
+    # При CACHE_PARTITIONING_ENABLED init_database заменяет таблицу секционированной по поколению:
+    # первичный ключ (id, generation), ключ кэша уникален в пределах поколения
     __tablename__ = "cache_entries"
+    __table_args__ = (
+        # Ключ кэша уникален в пределах поколения - цель ON CONFLICT при записи
+        Index("ux_cache_entries_key_generation", "cache_key", "generation", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    cache_key = Column(String, unique=True, index=True, nullable=False)
+    cache_key = Column(String, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     radius_meters = Column(Float, nullable=False)
     polygon_data = Column(String, nullable=False)  # JSON строка
     area_sqm = Column(Float, nullable=False)
+    # Геометрия полигона с GiST индексом для пространственных запросов (загружается только явно)
+    geom = deferred(Column(Geometry(geometry_type="GEOMETRY", srid=4326, spatial_index=True), nullable=True))
+    # Поколение кэша на момент записи: записи старых поколений недействительны и удаляются в фоне
+    generation = Column(BigInteger, nullable=False, server_default="0", index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class CacheRadiusBucket(Base):
+    """Гистограмма радиусов кэша по поколениям, поддерживается триггерами на cache_entries"""
+    __tablename__ = "cache_radius_buckets"
+    
+    generation = Column(BigInteger, primary_key=True, autoincrement=False)
+    bucket = Column(Integer, primary_key=True, autoincrement=False)
+    upper_bound_meters = Column(Float, nullable=True)  # не включая границу, NULL - без границы
+    entries = Column(BigInteger, nullable=False, default=0)
+
+
+class CacheCounter(Base):
+    """Накопительные счетчики кэша (попадания, промахи, вытеснения), общие для всех воркеров"""
+    __tablename__ = "cache_counters"
+    
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CacheGeneration(Base):
+    """Текущее поколение кэша (одна строка), увеличивается при очистке кэша"""
+    __tablename__ = "cache_generation"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
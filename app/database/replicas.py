@@ -0,0 +1,201 @@
+import asyncio
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import get_replica_config
+from app.database.database import SessionLocal
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Отставание реплики: 0, если все полученные WAL применены, иначе время с последней примененной транзакции
+_HEALTH_QUERY = text("""
+    SELECT pg_is_in_recovery() AS in_recovery,
+           CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END AS lag
+    """)
+
+
+class _Replica:
+    def __init__(self, url: str, config: Dict[str, Any]):
+        parsed = make_url(url)
+        self.name = f"{parsed.host}:{parsed.port or 5432}/{parsed.database}"
+        self.engine = create_engine(
+            url,
+            pool_size=config.get('pool_size', 5),
+            max_overflow=config.get('max_overflow', 10),
+            pool_pre_ping=True,
+            connect_args={"connect_timeout": config.get('connect_timeout', 5)}
+        )
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # До первой проверки реплика считается исправной, иначе чтения сразу после старта идут в основную базу
+        self.healthy = True
+        self.lag = 0.0
+        self.reads = 0
+        self.errors = 0
+
+
+class ReplicaRouter:
+    """
+    Маршрутизация чтений кэша на реплики
+
+    Чтения распределяются по кругу между исправными репликами; при ошибке реплика
+    исключается до следующей успешной проверки, а чтение повторяется в основной базе.
+    Фоновая проверка (pg_is_in_recovery, отставание применения WAL) возвращает
+    реплики в работу и исключает сильно отстающие. Записи, инвалидация и чтение
+    поколения выполняются только в основной базе.
+
+    Без настроенных реплик все чтения идут в основную базу.
+    """
+
+    def __init__(self):
+        self.config = get_replica_config()
+        self.health_interval = self.config.get('health_interval', 5.0)
+        self.max_lag = self.config.get('max_lag', 30.0)
+        self.miss_fallback = self.config.get('miss_fallback', True)
+        self.replicas: List[_Replica] = [_Replica(url, self.config) for url in self.config.get('urls', [])]
+
+        # Чтения выполняются в потоках executor
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+        self.primary_reads = 0
+        self.miss_fallbacks = 0
+        metrics.register_collector("replicas", self.get_metrics)
+
+    @property
+    def enabled(self) -> bool:
+        """Настроены ли реплики"""
+        return bool(self.replicas)
+
+    def _choose(self) -> Optional[_Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def read(self, func: Callable[[Session], T]) -> Tuple[T, bool]:
+        """
+        Выполняет чтение на реплике, а без исправных реплик или при ошибке - в основной базе
+
+        Вызывается в потоке executor.
+
+        Args:
+            func: функция чтения, получающая сессию
+
+        Returns:
+            Результат и признак того, что он получен с реплики
+        """
+        replica = self._choose()
+        if replica is not None:
+            db = replica.session_factory()
+            try:
+                result = func(db)
+            except Exception as e:
+                with self._lock:
+                    replica.errors += 1
+                replica.healthy = False
+                logger.warning("Read from replica %s failed, using primary: %s", replica.name, e)
+            else:
+                with self._lock:
+                    replica.reads += 1
+                return result, True
+            finally:
+                db.close()
+        return self.primary(func), False
+
+    def primary(self, func: Callable[[Session], T]) -> T:
+        """
+        Выполняет чтение в основной базе
+
+        Args:
+            func: функция чтения, получающая сессию
+
+        Returns:
+            Результат функции
+        """
+        db = SessionLocal()
+        try:
+            result = func(db)
+        finally:
+            db.close()
+        with self._lock:
+            self.primary_reads += 1
+        return result
+
+    def record_miss_fallback(self) -> None:
+        """Учитывает перечитывание промаха реплики в основной базе"""
+        with self._lock:
+            self.miss_fallbacks += 1
+
+    def start(self) -> None:
+        """Запускает периодическую проверку реплик"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает проверку и закрывает соединения реплик"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.gather(*[asyncio.to_thread(self._check, replica) for replica in self.replicas])
+            await asyncio.sleep(self.health_interval)
+
+    def _check(self, replica: _Replica) -> None:
+        try:
+            with replica.engine.connect() as connection:
+                row = connection.execute(_HEALTH_QUERY).one()
+        except Exception as e:
+            if replica.healthy:
+                logger.warning(f"Replica {replica.name} is unavailable: {e}")
+            replica.healthy = False
+            return
+
+        replica.lag = float(row.lag)
+        healthy = replica.lag <= self.max_lag
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info(f"Replica {replica.name} is back in rotation (lag {replica.lag:.1f}s)")
+            else:
+                logger.warning(f"Replica {replica.name} lags {replica.lag:.1f}s, reads go to other replicas")
+        replica.healthy = healthy
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики реплик
+
+        Returns:
+            Состояние, отставание и количество чтений по репликам, чтения основной базы
+        """
+        return {
+            "enabled": self.enabled,
+            "replicas": {
+                replica.name: {
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag,
+                    "reads": replica.reads,
+                    "errors": replica.errors
+                }
+                for replica in self.replicas
+            },
+            "primary_reads": self.primary_reads,
+            "miss_fallbacks": self.miss_fallbacks
+        }
+
+
+# Маршрутизация чтений процесса
+replica_router = ReplicaRouter()
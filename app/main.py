@@ -1,16 +1,17 @@
+import asyncio
 from fastapi import FastAPI
-from app.routes import router, sheets_router, cache_router, polygon_router
+from app.routes import (
+    router, sheets_router, cache_router, polygon_router, admin_router, tiles_router, analytics_router, get_polygon_service
+)
+from app.middleware import CompressionMiddleware, ProfilingMiddleware
 from app.config import settings
-from app.database.database_init import init_database
+from app.services.geometry_executor import geometry_executor
+from app.services.readiness_service import readiness_service
+from app.services.logging_service import logging_pipeline
 import logging
-from logging.handlers import RotatingFileHandler
-import sys
 
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, settings.log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования: запись в stdout из отдельного потока, файл добавляет setup_logging
+logging_pipeline.configure(settings.log_level)
 
 logger = logging.getLogger(__name__)
 
@@ -24,36 +25,106 @@ app.include_router(router)
 app.include_router(polygon_router)
 app.include_router(sheets_router)
 app.include_router(cache_router)
+app.include_router(tiles_router)
+app.include_router(analytics_router)
+app.include_router(admin_router)
+
+# Профилирование - внешний слой, чтобы в разбивку по этапам попадало и сжатие ответа
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Инициализация при запуске"""
+    """Запускает фоновый конвейер инициализации, не блокируя прием соединений"""
     logger.info("Starting GeoPolygon API...")
-    try:
-        # Инициализируем базу данных с PostGIS
-        from init_db import init_postgis_database
-        init_postgis_database()
-        logger.info("PostGIS database initialized successfully")
-        
-        # Создаем таблицы приложения
-        init_database()
-        logger.info("Application tables created successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
-        # Не прерываем запуск, так как база данных может быть недоступна
+    require_database = settings.readiness_require_database
+    
+    readiness_service.register_check("services", _load_services)
+    readiness_service.register_check("database", _init_databases, required=require_database)
+    readiness_service.register_check(
+        "connection_pool", _warm_up_connection_pool, required=require_database, depends_on=["database"]
+    )
+    readiness_service.register_check("geometry", geometry_executor.start)
+    readiness_service.register_check(
+        "cache", _warm_up_cache, required=require_database, depends_on=["services", "database"]
+    )
+    readiness_service.register_check("spatial_index", _load_spatial_index, required=False, depends_on=["cache"])
+    readiness_service.register_check("sheets", _warm_up_sheets, required=False, depends_on=["services"])
+    readiness_service.start()
+    
+    from app.services.analytics_service import analytics_service
+    from app.services.cache_generation_service import cache_generation_service
+    from app.services.cache_stats_service import cache_stats_service
+    cache_generation_service.start()
+    cache_stats_service.start()
+    analytics_service.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Освобождение ресурсов при остановке"""
+    from app.services.analytics_service import analytics_service
+    from app.services.cache_generation_service import cache_generation_service
+    from app.services.cache_stats_service import cache_stats_service
+    await readiness_service.stop()
+    await cache_generation_service.stop()
+    await cache_stats_service.stop()
+    await analytics_service.stop()
+    if get_polygon_service.cache_info().currsize:
+        from app.database.replicas import replica_router
+        await get_polygon_service().sheets_service.aclose()
+        await replica_router.stop()
+    geometry_executor.shutdown()
+
+
+async def _load_services():
+    """Импортирует тяжелые зависимости и создает сервисы в фоновом потоке"""
+    await asyncio.to_thread(get_polygon_service)
+    # Модуль реплик импортирован вместе с репозиторием кэша
+    from app.database.replicas import replica_router
+    replica_router.start()
+
+
+async def _init_databases():
+    """Инициализирует базу данных с PostGIS и создает таблицы приложения"""
+    from init_db import init_postgis_database
+    from app.database.database_init import init_database
+    await asyncio.to_thread(init_postgis_database)
+    logger.info("PostGIS database initialized successfully")
+    
+    await asyncio.to_thread(init_database)
+    logger.info("Application tables created successfully")
+
+
+async def _warm_up_connection_pool():
+    """Открывает соединения пула базы данных заранее"""
+    from app.database.database import warm_up_pool
+    connections = await asyncio.to_thread(warm_up_pool)
+    logger.info(f"Database connection pool warmed up: {connections} connections")
+
+
+async def _warm_up_cache():
+    """Прогревает кэш полигонов"""
+    await get_polygon_service().cache_service.warm_up()
+
+
+async def _load_spatial_index():
+    """Строит пространственный индекс кэша в памяти"""
+    from app.services.spatial_index_service import spatial_index_service
+    count = await spatial_index_service.load()
+    logger.info(f"Spatial index loaded: {count} entries")
+
+
+async def _warm_up_sheets():
+    """Создает клиент Google Sheets и получает токен доступа до первого запроса"""
+    if not await get_polygon_service().sheets_service.warm_up():
+        raise RuntimeError("Google Sheets integration is not available")
 
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            RotatingFileHandler('api.log', maxBytes=1024*1024, backupCount=5),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    logging_pipeline.configure(settings.log_level, log_file=settings.log_file)
 
     # Уменьшаем уровень логгирования для некоторых библиотек
     logging.getLogger('uvicorn').setLevel(logging.WARNING)
@@ -63,6 +134,6 @@ def setup_logging():
 
 
 if __name__ == "__main__":
-    import uvicorn
+    from app.server import run
     setup_logging()
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    run(app) 
\ No newline at end of file
@@ -0,0 +1,7 @@
+from .compression import CompressionMiddleware
+from .profiling import ProfilingMiddleware
+
+__all__ = [
+    'CompressionMiddleware',
+    'ProfilingMiddleware'
+]
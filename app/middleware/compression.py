@@ -0,0 +1,315 @@
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from app.config import get_compression_config
+from app.services.metrics_service import metrics
+from app.services.profiling_service import profile_stage
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Типы содержимого, которые имеет смысл сжимать (TWKB уже компактен и почти не сжимается)
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/geo+json",
+    "application/wkb",
+    "application/flatgeobuf",
+    "application/x-protobuf",
+    "application/vnd.mapbox-vector-tile",
+)
+
+# Порядок предпочтения при одинаковом q в Accept-Encoding
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+
+class _GzipCodec:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level, wbits=31)
+
+    def stream(self) -> "_Stream":
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return _Stream(
+            lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush
+        )
+
+
+class _BrotliCodec:
+    name = "br"
+
+    def __init__(self, quality: int):
+        import brotli
+        self._brotli = brotli
+        self.quality = quality
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.compress(data, quality=self.quality)
+
+    def stream(self) -> "_Stream":
+        compressor = self._brotli.Compressor(quality=self.quality)
+        return _Stream(lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish)
+
+
+class _ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        import zstandard
+        self._zstandard = zstandard
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def stream(self) -> "_Stream":
+        compressor = self._zstandard.ZstdCompressor(level=self.level).compressobj()
+        flush_block = self._zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return _Stream(lambda chunk: compressor.compress(chunk) + compressor.flush(flush_block), compressor.flush)
+
+
+class _Stream:
+    """Потоковый компрессор: каждый чанк сбрасывается сразу, чтобы клиент получал данные без задержки"""
+
+    def __init__(self, compress_chunk, finish):
+        self.compress = compress_chunk
+        self.finish = finish
+
+
+def load_codecs(config: Dict) -> Dict[str, object]:
+    """
+    Создает доступные кодеки сжатия
+
+    brotli и zstandard - необязательные зависимости: без них остается gzip.
+    """
+    codecs: Dict[str, object] = {"gzip": _GzipCodec(config.get("gzip_level", 6))}
+    for name, factory, option in (("br", _BrotliCodec, "brotli_quality"), ("zstd", _ZstdCodec, "zstd_level")):
+        try:
+            codecs[name] = factory(config[option])
+        except ImportError:
+            logger.info(f"Compression codec {name} is not installed, skipping")
+    return codecs
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """
+    Выбирает кодировку по заголовку Accept-Encoding
+
+    Args:
+        accept_encoding: значение заголовка
+        available: имена доступных кодеков
+
+    Returns:
+        Имя кодировки или None, если сжатие не нужно
+    """
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        weight = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name] = weight
+
+    wildcard = weights.get("*", 0.0)
+    candidates = [
+        (weights.get(name, wildcard), -index, name)
+        for index, name in enumerate(ENCODING_PREFERENCE) if name in available
+    ]
+    candidates = [candidate for candidate in candidates if candidate[0] > 0]
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+class PrecompressedCache:
+    """LRU сжатых копий горячих ответов: повторные попадания в кэш не сжимаются заново"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(encoding: str, body: bytes) -> Tuple[str, bytes]:
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[bytes]:
+        compressed = self._entries.get(key)
+        if compressed is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return compressed
+
+    def put(self, key: Tuple[str, bytes], compressed: bytes) -> None:
+        if self.max_entries <= 0 or len(compressed) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = compressed
+        self._size += len(compressed)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get_metrics(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware сжатия ответов (zstd, brotli, gzip)
+
+    Кодировка выбирается по Accept-Encoding, ответы меньше порога не сжимаются.
+    Потоковые ответы сжимаются по чанкам. Сжатые копии ответов с ETag (полигоны)
+    хранятся в LRU, поэтому горячие попадания в кэш не тратят CPU на повторное сжатие.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.config = get_compression_config()
+        self.enabled = self.config.get("enabled", True)
+        self.minimum_size = self.config.get("minimum_size", 1024)
+        self.codecs = load_codecs(self.config) if self.enabled else {}
+        self.precompressed = PrecompressedCache(
+            self.config.get("precompressed_max_entries", 1024),
+            self.config.get("precompressed_max_bytes", 64 * 1024 * 1024)
+        )
+        metrics.register_collector("compression", self.get_metrics)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"), self.codecs)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compress_body(self, encoding: str, body: bytes, cacheable: bool) -> bytes:
+        """Сжимает тело ответа целиком, используя сохраненную копию для горячих ответов"""
+        key = self.precompressed.make_key(encoding, body) if cacheable else None
+        if key is not None:
+            compressed = self.precompressed.get(key)
+            if compressed is not None:
+                return compressed
+
+        with profile_stage("compress_response"):
+            compressed = self.codecs[encoding].compress(body)
+        if key is not None:
+            self.precompressed.put(key, compressed)
+        return compressed
+
+    def get_metrics(self) -> Dict:
+        return {
+            "codecs": list(self.codecs),
+            "minimum_size": self.minimum_size,
+            "precompressed": self.precompressed.get_metrics()
+        }
+
+
+class _CompressionResponder:
+    """Перехватывает ответ приложения и сжимает его тело"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Dict] = None
+        self.mode: Optional[str] = None  # passthrough, buffered или stream
+        self.stream: Optional[_Stream] = None
+
+    async def send(self, message: Dict) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            if not self._is_compressible(message):
+                self.mode = "passthrough"
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.mode == "passthrough":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            if not more_body:
+                await self._send_whole(body)
+                return
+            await self._start_stream()
+
+        chunk = self.stream.compress(body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _is_compressible(self, message: Dict) -> bool:
+        status = message["status"]
+        if status < 200 or status in (204, 304):
+            return False
+        headers = Headers(raw=message.get("headers", []))
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _send_whole(self, body: bytes) -> None:
+        self.mode = "buffered"
+        headers = MutableHeaders(scope=self.start_message)
+        if len(body) < self.middleware.minimum_size:
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        compressed = self.middleware.compress_body(self.encoding, body, cacheable="etag" in headers)
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        metrics.increment(f"compression_{self.encoding}_responses")
+        metrics.increment("compression_bytes_saved", len(body) - len(compressed))
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    async def _start_stream(self) -> None:
+        self.mode = "stream"
+        self.stream = self.middleware.codecs[self.encoding].stream()
+        headers = MutableHeaders(scope=self.start_message)
+        del headers["Content-Length"]
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        metrics.increment(f"compression_{self.encoding}_streamed_responses")
+        await self._send(self.start_message)
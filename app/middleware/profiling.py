@@ -0,0 +1,50 @@
+from urllib.parse import parse_qs
+from app.services.profiling_service import profiling_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware профилирования запросов
+
+    Профилирование включается заголовком `X-Profile: 1` или параметром `?profile=1`
+    вместе с `X-Admin-Token`, либо сэмплированием доли запросов к /polygon.
+    Для запросов администратора в ответ добавляются заголовки `Server-Timing` и `X-Profile-Id`.
+    cProfile снимает все корутины event loop за время запроса, поэтому под нагрузкой
+    в профиль попадают и соседние запросы; разбивка по этапам относится только к этому запросу.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        profile_flag = headers.get("x-profile") or (query.get("profile") or [None])[0]
+
+        is_requested = profiling_service.is_requested(profile_flag, headers.get("x-admin-token"))
+        if not is_requested and not profiling_service.is_sampled(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile, profiler, token = profiling_service.start(scope["path"])
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start" and is_requested:
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"server-timing", profile.server_timing().encode("latin-1")),
+                    (b"x-profile-id", profile.id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            profiling_service.finish(profile, profiler, token)
@@ -1,10 +1,30 @@
 from pydantic import BaseModel, Field
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 class PointRequest(BaseModel):
     latitude: float = Field(..., ge=-90, le=90, description="Широта в градусах")
     longitude: float = Field(..., ge=-180, le=180, description="Долгота в градусах")
     radius: float = Field(..., gt=0, description="Радиус в метрах")
+    precision: Optional[int] = Field(None, ge=0, le=15, description="Знаков после запятой в координатах")
+    segments: Optional[int] = Field(None, ge=1, description="Количество сегментов на четверть окружности")
+    simplify_tolerance: Optional[float] = Field(None, gt=0, description="Допуск упрощения контура в метрах")
+
+
+class PolygonBatchRequest(BaseModel):
+    points: List[PointRequest] = Field(..., min_length=1, description="Точки для построения полигонов")
+
+
+class CoverageCircle(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90, description="Широта в градусах")
+    longitude: float = Field(..., ge=-180, le=180, description="Долгота в градусах")
+    radius: float = Field(..., gt=0, description="Радиус в метрах")
+
+
+class CoverageRequest(BaseModel):
+    circles: List[CoverageCircle] = Field(..., min_length=1, description="Круги покрытия")
+    precision: Optional[int] = Field(None, ge=0, le=15, description="Знаков после запятой в координатах")
+    segments: Optional[int] = Field(None, ge=1, description="Количество сегментов на четверть окружности")
+    use_postgis: bool = Field(False, description="Объединять силами PostGIS (ST_Union)")
 
 
 class PolygonResponse(BaseModel):
@@ -18,6 +38,19 @@ class SpreadsheetResponse(BaseModel):
     url: str
 
 
+class RadiusBucket(BaseModel):
+    upper_bound_meters: Optional[float] = Field(None, description="Верхняя граница радиуса, не включая (None - без границы)")
+    entries: int
+
+
 class CacheStatsResponse(BaseModel):
-    total_cached_polygons: int
+    total_cached_polygons: int = Field(..., description="Записи текущего поколения")
+    stale_cached_polygons: int = Field(0, description="Записи старых поколений, ожидающие фонового удаления")
+    radius_histogram: List[RadiusBucket] = []
+    hits: int = 0
+    hot_hits: int = Field(0, description="Из них попаданий в кэш в разделяемой памяти")
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+    hit_rate: Optional[float] = None
 
@@ -0,0 +1,105 @@
+"""
+Классы protobuf-сообщений, собранные во время выполнения по описаниям схем из app/proto/*.proto
+
+Так не нужен protoc и сгенерированные *_pb2.py: дескриптор файла описывается здесь
+и должен совпадать с соответствующим .proto файлом.
+"""
+
+from typing import Dict, List, Tuple
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+FieldSpec = Tuple[str, int, int, int, str]
+
+_TYPE = descriptor_pb2.FieldDescriptorProto
+_OPTIONAL = _TYPE.LABEL_OPTIONAL
+_REPEATED = _TYPE.LABEL_REPEATED
+_REQUIRED = _TYPE.LABEL_REQUIRED
+
+
+def _build_messages(file_name: str, package: str, messages: Dict[str, List[FieldSpec]],
+                    syntax: str = "proto3") -> Dict[str, type]:
+    """
+    Регистрирует файл в пуле дескрипторов и возвращает классы сообщений
+
+    Args:
+        file_name: имя .proto файла
+        package: пакет protobuf
+        messages: имя сообщения -> список полей (имя, номер, label, тип, имя типа сообщения)
+        syntax: proto2 или proto3
+
+    Returns:
+        Словарь имя сообщения -> класс
+    """
+    file_proto = descriptor_pb2.FileDescriptorProto(name=file_name, package=package, syntax=syntax)
+    for message_name, fields in messages.items():
+        message_proto = file_proto.message_type.add(name=message_name)
+        for field_name, number, label, field_type, type_name in fields:
+            field = message_proto.field.add(name=field_name, number=number, label=label, type=field_type)
+            if type_name:
+                field.type_name = f".{package}.{type_name}"
+            if label == _REPEATED and field_type not in (_TYPE.TYPE_MESSAGE, _TYPE.TYPE_STRING, _TYPE.TYPE_BYTES):
+                field.options.packed = True
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return {
+        name: message_factory.GetMessageClass(pool.FindMessageTypeByName(f"{package}.{name}"))
+        for name in messages
+    }
+
+
+# app/proto/polygon.proto
+_polygon_messages = _build_messages("polygon.proto", "geopolygon", {
+    "PolygonFeature": [
+        ("center_lon", 1, _OPTIONAL, _TYPE.TYPE_DOUBLE, ""),
+        ("center_lat", 2, _OPTIONAL, _TYPE.TYPE_DOUBLE, ""),
+        ("radius", 3, _OPTIONAL, _TYPE.TYPE_DOUBLE, ""),
+        ("area_sqm", 4, _OPTIONAL, _TYPE.TYPE_DOUBLE, ""),
+        ("cached", 5, _OPTIONAL, _TYPE.TYPE_BOOL, ""),
+        ("precision", 6, _OPTIONAL, _TYPE.TYPE_UINT32, ""),
+        ("ring_sizes", 7, _REPEATED, _TYPE.TYPE_UINT32, ""),
+        ("coords", 8, _REPEATED, _TYPE.TYPE_SINT64, ""),
+    ],
+    "PolygonFeatureCollection": [
+        ("features", 1, _REPEATED, _TYPE.TYPE_MESSAGE, "PolygonFeature"),
+    ],
+})
+
+PolygonFeature = _polygon_messages["PolygonFeature"]
+PolygonFeatureCollection = _polygon_messages["PolygonFeatureCollection"]
+
+
+# app/proto/vector_tile.proto
+_vector_tile_messages = _build_messages("vector_tile.proto", "vector_tile", {
+    "Value": [
+        ("string_value", 1, _OPTIONAL, _TYPE.TYPE_STRING, ""),
+        ("float_value", 2, _OPTIONAL, _TYPE.TYPE_FLOAT, ""),
+        ("double_value", 3, _OPTIONAL, _TYPE.TYPE_DOUBLE, ""),
+        ("int_value", 4, _OPTIONAL, _TYPE.TYPE_INT64, ""),
+        ("uint_value", 5, _OPTIONAL, _TYPE.TYPE_UINT64, ""),
+        ("sint_value", 6, _OPTIONAL, _TYPE.TYPE_SINT64, ""),
+        ("bool_value", 7, _OPTIONAL, _TYPE.TYPE_BOOL, ""),
+    ],
+    "Feature": [
+        ("id", 1, _OPTIONAL, _TYPE.TYPE_UINT64, ""),
+        ("tags", 2, _REPEATED, _TYPE.TYPE_UINT32, ""),
+        ("type", 3, _OPTIONAL, _TYPE.TYPE_UINT32, ""),
+        ("geometry", 4, _REPEATED, _TYPE.TYPE_UINT32, ""),
+    ],
+    "Layer": [
+        ("version", 15, _REQUIRED, _TYPE.TYPE_UINT32, ""),
+        ("name", 1, _REQUIRED, _TYPE.TYPE_STRING, ""),
+        ("features", 2, _REPEATED, _TYPE.TYPE_MESSAGE, "Feature"),
+        ("keys", 3, _REPEATED, _TYPE.TYPE_STRING, ""),
+        ("values", 4, _REPEATED, _TYPE.TYPE_MESSAGE, "Value"),
+        ("extent", 5, _OPTIONAL, _TYPE.TYPE_UINT32, ""),
+    ],
+    "Tile": [
+        ("layers", 3, _REPEATED, _TYPE.TYPE_MESSAGE, "Layer"),
+    ],
+}, syntax="proto2")
+
+VectorTile = _vector_tile_messages["Tile"]
+VectorTileLayer = _vector_tile_messages["Layer"]
+VectorTileFeature = _vector_tile_messages["Feature"]
+VectorTileValue = _vector_tile_messages["Value"]
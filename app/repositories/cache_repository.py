@@ -1,46 +1,98 @@
-import json
 import asyncio
-from typing import Optional, Dict, List
+import random
+import time
+import orjson
+from typing import Any, Callable, Optional, Dict, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database.models import CacheEntry
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.exc import OperationalError
+from app.config import get_cache_partition_config
+from app.database.models import CacheCounter, CacheEntry, CacheGeneration, CacheRadiusBucket
 from app.database.database import get_db
+from app.database.database_init import RADIUS_BUCKET_BOUNDS
+from app.database.replicas import replica_router
+from app.services.profiling_service import bind_context, profile_stage
 import logging
 
 logger = logging.getLogger(__name__)
 
+# SQLSTATE lock_not_available: истек lock_timeout
+_LOCK_NOT_AVAILABLE = "55P03"
+# Попытки создания секции поколения при занятой таблице и базовая пауза между ними
+_PARTITION_CREATE_ATTEMPTS = 3
+_PARTITION_CREATE_BACKOFF = 0.2
+
+
+def _known_generation() -> int:
+    # Реплика может отставать и в поколении: нижняя граница - поколение, известное процессу
+    from app.services.cache_generation_service import cache_generation_service
+    return cache_generation_service.generation
+
+
+def _stored_generation():
+    return func.coalesce(
+        select(CacheGeneration.generation).where(CacheGeneration.id == 1).scalar_subquery(), 0
+    )
+
+
+def _current_generation():
+    # Записи поколений ниже текущего недействительны (очистка кэша без удаления строк)
+    return func.greatest(_stored_generation(), _known_generation())
+
+
+def _is_current():
+    # Постоянная нижняя граница отсекает секции старых поколений уже при планировании,
+    # подзапрос к cache_generation - при выполнении
+    return and_(
+        CacheEntry.generation >= _current_generation(),
+        CacheEntry.generation >= _known_generation()
+    )
+
 
 class CacheRepository:
     def __init__(self):
-        pass
+        self.partition_config = get_cache_partition_config()
     
-    async def get_by_cache_key(self, cache_key: str) -> Optional[CacheEntry]:
+    @property
+    def reads_from_replicas(self) -> bool:
+        """Обслуживаются ли чтения кэша репликами"""
+        return replica_router.enabled
+    
+    async def get_by_cache_key(self, cache_key: str, primary_fallback: bool = True) -> Optional[CacheEntry]:
         """
-        Получает запись кэша по ключу
+        Получает запись кэша по ключу (с реплики, если они настроены)
         
         Args:
             cache_key: ключ кэша
+            primary_fallback: перечитать промах реплики в основной базе (запись могла еще не дойти до реплики)
             
         Returns:
             Запись кэша или None
         """
+        def _query(db: Session) -> Optional[CacheEntry]:
+            return db.query(CacheEntry).filter(
+                CacheEntry.cache_key == cache_key,
+                _is_current()
+            ).first()
+        
         def _get_cache_entry():
-            db = next(get_db())
-            try:
-                cache_entry = db.query(CacheEntry).filter(CacheEntry.cache_key == cache_key).first()
-                if cache_entry:
-                    logger.debug(f"Cache hit for key: {cache_key}")
-                else:
-                    logger.debug(f"Cache miss for key: {cache_key}")
-                return cache_entry
-            finally:
-                db.close()
+            cache_entry, from_replica = replica_router.read(_query)
+            if cache_entry is None and from_replica and primary_fallback and replica_router.miss_fallback:
+                replica_router.record_miss_fallback()
+                cache_entry = replica_router.primary(_query)
+            if cache_entry:
+                logger.debug("Cache hit for key: %s", cache_key)
+            else:
+                logger.debug("Cache miss for key: %s", cache_key)
+            return cache_entry
         
+        from app.services.circuit_breaker import cache_breaker
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _get_cache_entry)
+        return await cache_breaker.call(loop.run_in_executor, None, _get_cache_entry)
     
     async def create_cache_entry(self, cache_key: str, lat: float, lon: float, 
-                          radius_meters: float, polygon_data: Dict, area: float) -> CacheEntry:
+                          radius_meters: float, polygon_data: Dict, area: float,
+                          generation: int = 0) -> CacheEntry:
         """
         Создает новую запись в кэше
         
@@ -51,11 +103,15 @@ class CacheRepository:
             radius_meters: радиус в метрах
             polygon_data: GeoJSON полигон
             area: площадь полигона
+            generation: поколение кэша, в котором построен полигон
             
         Returns:
             Созданная запись кэша
         """
         def _create_cache_entry():
+            with profile_stage("json_encode"):
+                polygon_json = orjson.dumps(polygon_data, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+            
             db = next(get_db())
             try:
                 cache_entry = CacheEntry(
@@ -63,71 +119,568 @@ class CacheRepository:
                     latitude=lat,
                     longitude=lon,
                     radius_meters=radius_meters,
-                    polygon_data=json.dumps(polygon_data),
-                    area_sqm=area
+                    polygon_data=polygon_json,
+                    area_sqm=area,
+                    geom=func.ST_SetSRID(func.ST_GeomFromGeoJSON(polygon_json), 4326),
+                    generation=generation
                 )
                 db.add(cache_entry)
                 db.commit()
                 db.refresh(cache_entry)
                 
-                logger.info(f"Created cache entry for key: {cache_key}")
+                logger.info("Created cache entry for key: %s", cache_key)
                 return cache_entry
             finally:
                 db.close()
         
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, bind_context(_create_cache_entry))
+    
+    async def lookup_or_create(self, cache_key: str, lat: float, lon: float, radius_meters: float,
+                               segments: Optional[int] = None, simplify_tolerance: Optional[float] = None,
+                               precision: Optional[int] = None, generation: int = 0) -> Tuple[str, float, bool]:
+        """
+        Находит полигон в кэше или строит и сохраняет его одним вызовом SQL функции
+        
+        Поиск, построение буфера в метрической проекции и запись выполняются
+        в базе атомарно, за один round trip.
+        
+        Args:
+            cache_key: ключ кэша
+            lat: широта
+            lon: долгота
+            radius_meters: радиус в метрах
+            segments: количество сегментов на четверть окружности (по умолчанию из настроек)
+            simplify_tolerance: допуск упрощения контура в метрах
+            precision: знаков после запятой в координатах GeoJSON
+            generation: поколение кэша, в котором строится полигон
+            
+        Returns:
+            GeoJSON строка, площадь в квадратных метрах и признак построения нового полигона
+        """
+        from app.config import settings
+        from app.database.functions import LOOKUP_OR_CREATE_POLYGON
+        query = text(f"""
+            SELECT polygon_json, area, created FROM {LOOKUP_OR_CREATE_POLYGON}(
+                :cache_key, :lat, :lon, :radius, :segments, :simplify_tolerance, :precision, :generation
+            )
+            """)
+        params = {
+            "cache_key": cache_key,
+            "lat": float(lat),
+            "lon": float(lon),
+            "radius": float(radius_meters),
+            "segments": int(segments or settings.default_polygon_points),
+            "simplify_tolerance": float(simplify_tolerance) if simplify_tolerance else None,
+            "precision": precision,
+            "generation": generation
+        }
+        
+        def _lookup_or_create():
+            db = next(get_db())
+            try:
+                row = db.execute(query, params).one()
+                db.commit()
+                logger.debug("Cache %s for key: %s", "miss, polygon created" if row.created else "hit", cache_key)
+                return row.polygon_json, row.area, row.created
+            finally:
+                db.close()
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, bind_context(_lookup_or_create))
+    
+    async def get_many(self, cache_keys: List[str]) -> Dict[str, Tuple[str, float]]:
+        """
+        Получает записи кэша для набора ключей одним запросом
+        
+        Args:
+            cache_keys: ключи кэша
+            
+        Returns:
+            Найденные ключи с GeoJSON строкой и площадью (отсутствующих ключей в словаре нет)
+        """
+        query = text("""
+            SELECT cache_key, polygon_data, area_sqm FROM cache_entries
+            WHERE cache_key = ANY(CAST(:keys AS varchar[]))
+              AND generation >= GREATEST(
+                  COALESCE((SELECT generation FROM cache_generation WHERE id = 1), 0), :min_generation
+              )
+              AND generation >= :min_generation
+            """)
+        min_generation = _known_generation()
+        
+        def _query(keys: List[str]) -> Callable[[Session], Dict[str, Tuple[str, float]]]:
+            def _run(db: Session) -> Dict[str, Tuple[str, float]]:
+                rows = db.execute(query, {"keys": keys, "min_generation": min_generation}).all()
+                return {row.cache_key: (row.polygon_data, row.area_sqm) for row in rows}
+            return _run
+        
+        def _get_many():
+            found, from_replica = replica_router.read(_query(cache_keys))
+            missing = [cache_key for cache_key in cache_keys if cache_key not in found]
+            if missing and from_replica and replica_router.miss_fallback:
+                # Промахи реплики перечитываются в основной базе одним запросом
+                replica_router.record_miss_fallback()
+                found.update(replica_router.primary(_query(missing)))
+            logger.debug("Cache lookup for %s keys: %s hits", len(cache_keys), len(found))
+            return found
+        
+        if not cache_keys:
+            return {}
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, bind_context(_get_many))
+    
+    async def put_many(self, entries: List[Dict[str, Any]], generation: int = 0) -> Dict[str, str]:
+        """
+        Сохраняет набор полигонов одним многострочным upsert
+        
+        Args:
+            entries: словари с ключами cache_key, lat, lon, radius_meters, polygon_data, area
+            generation: поколение кэша, в котором построены полигоны
+            
+        Returns:
+            Ключи кэша и сохраненные GeoJSON строки
+        """
+        query = text("""
+            INSERT INTO cache_entries
+                (cache_key, latitude, longitude, radius_meters, polygon_data, area_sqm, geom, generation, created_at)
+            SELECT t.cache_key, t.latitude, t.longitude, t.radius_meters, t.polygon_data, t.area_sqm,
+                   ST_SetSRID(ST_GeomFromGeoJSON(t.polygon_data), 4326), :generation, now()
+            FROM unnest(
+                CAST(:keys AS varchar[]), CAST(:lats AS float8[]), CAST(:lons AS float8[]),
+                CAST(:radii AS float8[]), CAST(:polygons AS varchar[]), CAST(:areas AS float8[])
+            ) AS t(cache_key, latitude, longitude, radius_meters, polygon_data, area_sqm)
+            ON CONFLICT (cache_key, generation) DO UPDATE
+            SET polygon_data = EXCLUDED.polygon_data, area_sqm = EXCLUDED.area_sqm, geom = EXCLUDED.geom,
+                generation = EXCLUDED.generation, updated_at = now()
+            """)
+        
+        def _put_many():
+            with profile_stage("json_encode"):
+                polygons = [
+                    orjson.dumps(entry["polygon_data"], option=orjson.OPT_SERIALIZE_NUMPY).decode()
+                    for entry in entries
+                ]
+            params = {
+                "keys": [entry["cache_key"] for entry in entries],
+                "lats": [entry["lat"] for entry in entries],
+                "lons": [entry["lon"] for entry in entries],
+                "radii": [entry["radius_meters"] for entry in entries],
+                "polygons": polygons,
+                "areas": [entry["area"] for entry in entries],
+                "generation": generation
+            }
+            
+            db = next(get_db())
+            try:
+                db.execute(query, params)
+                db.commit()
+                
+                logger.info("Created %s cache entries", len(entries))
+                return dict(zip(params["keys"], polygons))
+            finally:
+                db.close()
+        
+        # Один оператор ON CONFLICT не может обновить строку дважды
+        entries = list({entry["cache_key"]: entry for entry in entries}.values())
+        if not entries:
+            return {}
+        from app.services.circuit_breaker import cache_breaker
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _create_cache_entry)
+        return await cache_breaker.call(loop.run_in_executor, None, bind_context(_put_many))
     
-    async def get_cache_stats(self) -> Dict[str, int]:
+    async def get_cache_stats(self) -> Dict[str, Any]:
         """
-        Получает статистику кэша
+        Получает статистику кэша из поддерживаемых триггерами и счетчиками сводок
+        
+        Таблица cache_entries не сканируется: читаются корзины гистограммы радиусов
+        и накопительные счетчики (несколько строк независимо от размера кэша).
+        Корзины ведутся по поколениям: количество записей и гистограмма - только по
+        текущему поколению, записи старых поколений до фонового удаления считаются отдельно.
         
         Returns:
-            Словарь со статистикой
+            Словарь с количеством текущих и устаревших записей, гистограммой радиусов и счетчиками
         """
+        def _query(db: Session) -> Dict[str, Any]:
+            generation = db.execute(select(_current_generation())).scalar()
+            is_current = CacheRadiusBucket.generation >= generation
+            buckets = dict((bucket, (current or 0, stale or 0)) for bucket, current, stale in db.query(
+                    CacheRadiusBucket.bucket,
+                    func.sum(CacheRadiusBucket.entries).filter(is_current),
+                    func.sum(CacheRadiusBucket.entries).filter(~is_current)
+            ).group_by(CacheRadiusBucket.bucket).all())
+            counters = dict(db.query(CacheCounter.name, CacheCounter.value).all())
+            
+            histogram = [
+                {"upper_bound_meters": upper_bound, "entries": int(buckets.get(bucket, (0, 0))[0])}
+                for bucket, upper_bound in enumerate(list(RADIUS_BUCKET_BOUNDS) + [None])
+            ]
+            total_entries = sum(item["entries"] for item in histogram)
+            stale_entries = int(sum(stale for _, stale in buckets.values()))
+            logger.debug(f"Cache stats: {total_entries} current entries, {stale_entries} stale")
+            
+            return {
+                "total_cached_polygons": total_entries,
+                "stale_cached_polygons": stale_entries,
+                "radius_histogram": histogram,
+                "counters": counters
+            }
+        
         def _get_cache_stats():
+            # Сводки на реплике могут немного отставать - перечитывать в основной базе не нужно
+            return replica_router.read(_query)[0]
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, _get_cache_stats)
+    
+    async def add_counters(self, counters: Dict[str, int]) -> None:
+        """
+        Прибавляет значения к накопительным счетчикам кэша одним запросом
+        
+        Args:
+            counters: имя счетчика и прирост
+        """
+        query = text("""
+            INSERT INTO cache_counters (name, value, updated_at)
+            SELECT name, value, now() FROM unnest(CAST(:names AS varchar[]), CAST(:values AS bigint[])) AS t(name, value)
+            ON CONFLICT (name) DO UPDATE
+            SET value = cache_counters.value + EXCLUDED.value, updated_at = EXCLUDED.updated_at
+            """)
+        params = {"names": list(counters), "values": list(counters.values())}
+        
+        def _add_counters():
             db = next(get_db())
             try:
-                total_entries = db.query(CacheEntry).count()
+                db.execute(query, params)
+                db.commit()
+            finally:
+                db.close()
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        await cache_breaker.call(loop.run_in_executor, None, _add_counters)
+    
+    async def get_generation(self) -> int:
+        """
+        Получает текущее поколение кэша
+        
+        Returns:
+            Номер поколения
+        """
+        def _get_generation():
+            db = next(get_db())
+            try:
+                return db.execute(select(_stored_generation())).scalar()
+            finally:
+                db.close()
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, _get_generation)
+    
+    async def bump_generation(self) -> Tuple[int, int]:
+        """
+        Увеличивает поколение кэша: все записи становятся недействительными сразу
+        
+        Обновляется одна строка, таблица cache_entries не блокируется; недействительные
+        записи удаляются в фоне порциями (purge_stale_entries). В секционированной таблице
+        секция нового поколения создается заранее (при инициализации и после предыдущей
+        смены поколения) отдельной транзакцией с lock_timeout, а старые секции удаляются
+        целиком (drop_stale_partitions).
+        
+        Returns:
+            Новое поколение и количество записей, ожидающих удаления
+        """
+        query = text("""
+            INSERT INTO cache_generation (id, generation, updated_at) VALUES (1, 1, now())
+            ON CONFLICT (id) DO UPDATE
+            SET generation = cache_generation.generation + 1, updated_at = EXCLUDED.updated_at
+            RETURNING generation, (SELECT COALESCE(sum(entries), 0) FROM cache_radius_buckets) AS entries
+            """)
+        
+        def _bump_generation():
+            db = next(get_db())
+            try:
+                partitioned = self.partition_config.get('enabled')
+                if partitioned:
+                    # Обычно секция уже создана заранее, и проверка не берет блокировок
+                    generation = db.execute(
+                        text("SELECT COALESCE(max(generation), 0) FROM cache_generation WHERE id = 1")
+                    ).scalar()
+                    db.commit()
+                    self._create_partition(db, generation + 1)
                 
-                # Статистика по радиусам
-                radius_stats = db.query(
-                    CacheEntry.radius_meters,
-                    func.count(CacheEntry.id)
-                ).group_by(CacheEntry.radius_meters).all()
+                row = db.execute(query).one()
+                db.commit()
+                logger.info(f"Cache generation bumped to {row.generation}: {row.entries} entries invalidated")
                 
-                logger.debug(f"Cache stats: {total_entries} total entries")
+                if partitioned:
+                    # Секция следующего поколения - чтобы следующая смена не ждала блокировку
+                    self._create_partition(db, row.generation + 1)
+                return row.generation, row.entries
+            finally:
+                db.close()
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, _bump_generation)
+    
+    def _create_partition(self, db: Session, generation: int) -> bool:
+        """
+        Создает секцию поколения, ограничивая ожидание блокировки cache_entries
+        
+        Создание секции берет эксклюзивную блокировку родителя: при долгих запросах к
+        таблице ожидание ограничено lock_timeout и повторяется с паузой. Если секцию
+        создать не удалось, записи поколения попадают в секцию по умолчанию и удаляются
+        порциями.
+        
+        Args:
+            db: сессия базы данных
+            generation: поколение
+            
+        Returns:
+            True, если секция создана или уже существовала
+        """
+        for attempt in range(_PARTITION_CREATE_ATTEMPTS):
+            try:
+                db.execute(
+                    text("SELECT set_config('lock_timeout', :lock_timeout, true)"),
+                    {"lock_timeout": f"{self.partition_config.get('lock_timeout_ms', 2000)}ms"}
+                )
+                db.execute(
+                    text("SELECT cache_entries_create_partition(:generation, :modulus)"),
+                    {"generation": generation, "modulus": self.partition_config.get('hash_modulus', 8)}
+                )
+                db.commit()
+                return True
+            except OperationalError as e:
+                db.rollback()
+                if getattr(e.orig, "pgcode", None) != _LOCK_NOT_AVAILABLE:
+                    raise
+            if attempt + 1 < _PARTITION_CREATE_ATTEMPTS:
+                time.sleep(random.uniform(0, _PARTITION_CREATE_BACKOFF * 2 ** attempt))
+        
+        logger.warning(f"Could not lock cache_entries to create partition for generation {generation}, "
+                       f"its entries will go to the default partition")
+        return False
+    
+    async def drop_stale_partitions(self, generation: int) -> int:
+        """
+        Отсоединяет и удаляет секции поколений ниже заданного
+        
+        Удаление секции - изменение каталога вместо построчного DELETE: нет мертвых
+        строк, VACUUM и всплеска WAL. Отсоединение и удаление выполняются отдельными
+        транзакциями, поэтому эксклюзивная блокировка таблицы держится только на время
+        отсоединения; секции, отсоединенные прерванным ранее удалением, удаляются здесь же.
+        Без секционирования ничего не делает.
+        
+        Args:
+            generation: текущее поколение
+            
+        Returns:
+            Количество записей в удаленных секциях
+        """
+        def _drop_stale_partitions():
+            db = next(get_db())
+            try:
+                detached = db.execute(
+                    text("SELECT cache_entries_detach_stale_partitions(:generation, :lock_timeout)"),
+                    {"generation": generation, "lock_timeout": self.partition_config.get('lock_timeout_ms', 2000)}
+                ).scalar()
+                db.commit()
+                dropped = db.execute(text("SELECT cache_entries_drop_detached_partitions()")).scalar()
+                db.commit()
                 
-                return {
-                    "total_cached_polygons": total_entries,
-                    "radius_distribution": dict(radius_stats)
-                }
+                if detached or dropped:
+                    logger.info(f"Dropped {detached} stale cache partitions: {dropped} entries")
+                return dropped
             finally:
                 db.close()
         
+        if not self.partition_config.get('enabled'):
+            return 0
+        from app.services.circuit_breaker import cache_breaker
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _get_cache_stats)
+        return await cache_breaker.call(loop.run_in_executor, None, _drop_stale_partitions)
     
-    async def clear_cache(self) -> int:
+    async def purge_stale_entries(self, generation: int, limit: int) -> int:
         """
-        Очищает весь кэш
+        Удаляет порцию записей поколений ниже заданного
         
+        Короткая транзакция на порцию не держит блокировки таблицы и не создает
+        всплеска WAL; строки, заблокированные другим воркером, пропускаются.
+        В секционированной таблице остаются только записи секции по умолчанию.
+        
+        Args:
+            generation: текущее поколение
+            limit: максимальное количество удаляемых записей
+            
         Returns:
             Количество удаленных записей
         """
-        def _clear_cache():
+        query = text("""
+            DELETE FROM cache_entries
+            WHERE id IN (
+                SELECT id FROM cache_entries WHERE generation < :generation
+                LIMIT :limit FOR UPDATE SKIP LOCKED
+            )
+            """)
+        
+        def _purge_stale_entries():
             db = next(get_db())
             try:
-                deleted_count = db.query(CacheEntry).delete()
+                deleted_count = db.execute(query, {"generation": generation, "limit": limit}).rowcount
                 db.commit()
                 
-                logger.info(f"Cleared cache: {deleted_count} entries deleted")
+                if deleted_count:
+                    logger.debug(f"Purged {deleted_count} stale cache entries")
                 return deleted_count
             finally:
                 db.close()
         
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, _purge_stale_entries)
+    
+    async def load_index_entries(self, limit: int) -> List[Tuple]:
+        """
+        Загружает записи кэша для построения пространственного индекса в памяти
+        
+        Args:
+            limit: максимальное количество записей
+            
+        Returns:
+            Кортежи (cache_key, latitude, longitude, radius_meters, area_sqm, polygon_data)
+        """
+        def _query(db: Session) -> List[Tuple]:
+            return [tuple(row) for row in db.query(
+                CacheEntry.cache_key,
+                CacheEntry.latitude,
+                CacheEntry.longitude,
+                CacheEntry.radius_meters,
+                CacheEntry.area_sqm,
+                CacheEntry.polygon_data
+            ).filter(
+                _is_current()
+            ).order_by(CacheEntry.id).limit(limit).all()]
+        
+        def _load_index_entries():
+            # Записи, еще не дошедшие до реплики, индекс получит через on_cache_write
+            return replica_router.read(_query)[0]
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, _load_index_entries)
+    
+    async def find_intersecting(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                                limit: int) -> List[CacheEntry]:
+        """
+        Находит записи кэша, полигоны которых пересекают прямоугольник (GiST индекс)
+        
+        Для точки передается вырожденный прямоугольник.
+        
+        Args:
+            min_lon, min_lat, max_lon, max_lat: границы прямоугольника
+            limit: максимальное количество записей
+            
+        Returns:
+            Список записей кэша
+        """
+        def _query(db: Session) -> List[CacheEntry]:
+            if min_lon == max_lon and min_lat == max_lat:
+                area = func.ST_SetSRID(func.ST_MakePoint(min_lon, min_lat), 4326)
+            else:
+                area = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+            return db.query(CacheEntry).filter(
+                func.ST_Intersects(CacheEntry.geom, area),
+                _is_current()
+            ).limit(limit).all()
+        
+        def _find_intersecting():
+            return replica_router.read(_query)[0]
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, bind_context(_find_intersecting))
+    
+    async def get_mvt_tile(self, z: int, x: int, y: int, extent: int, buffer: int,
+                           limit: int) -> Tuple[bytes, List[str]]:
+        """
+        Строит векторный тайл из полигонов кэша силами PostGIS (ST_AsMVT)
+        
+        Args:
+            z, x, y: координаты тайла
+            extent: размер тайла во внутренних единицах
+            buffer: буфер вокруг тайла во внутренних единицах
+            limit: максимальное количество полигонов в тайле
+            
+        Returns:
+            Байты тайла и ключи кэша попавших в него полигонов
+        """
+        # Отбор кандидатов по GiST индексу geom (в 4326), обрезка и квантование - в 3857
+        query = text("""
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(:z, :x, :y) AS tile,
+                       ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => :margin), 4326) AS search
+            ),
+            features AS (
+                SELECT ST_AsMVTGeom(ST_Transform(c.geom, 3857), bounds.tile, :extent, :buffer, true) AS geom,
+                       c.cache_key, c.latitude, c.longitude, c.radius_meters, c.area_sqm
+                FROM cache_entries c, bounds
+                WHERE c.geom && bounds.search
+                  AND c.generation >= GREATEST(
+                      COALESCE((SELECT generation FROM cache_generation WHERE id = 1), 0), :min_generation
+                  )
+                  AND c.generation >= :min_generation
+                LIMIT :limit
+            )
+            SELECT ST_AsMVT(features.*, 'coverage', :extent, 'geom') AS tile,
+                   array_agg(features.cache_key) AS cache_keys
+            FROM features
+            WHERE features.geom IS NOT NULL
+            """)
+        params = {
+            "z": z, "x": x, "y": y,
+            "margin": buffer / extent,
+            "extent": extent,
+            "buffer": buffer,
+            "limit": limit,
+            "min_generation": _known_generation()
+        }
+        
+        def _query(db: Session) -> Tuple[bytes, List[str]]:
+            row = db.execute(query, params).one()
+            return bytes(row.tile or b""), list(row.cache_keys or [])
+        
+        def _get_mvt_tile():
+            return replica_router.read(_query)[0]
+        
+        from app.services.circuit_breaker import cache_breaker
+        loop = asyncio.get_event_loop()
+        return await cache_breaker.call(loop.run_in_executor, None, bind_context(_get_mvt_tile))
+    
+    async def ping(self) -> bool:
+        """
+        Проверяет доступность таблицы кэша и прогревает соединение
+        
+        Returns:
+            True если таблица доступна
+        """
+        def _ping():
+            db = next(get_db())
+            try:
+                db.query(CacheEntry.id).limit(1).first()
+                return True
+            finally:
+                db.close()
+        
+        from app.services.circuit_breaker import cache_breaker
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _clear_cache)
+        return await cache_breaker.call(loop.run_in_executor, None, _ping)
     
     def get_oldest_entries(self, limit: int = 10) -> List[CacheEntry]:
         """
@@ -11,74 +11,133 @@ class PostgisRepository:
     def __init__(self):
         pass
     
-    async def create_polygon(self, lat: float, lon: float, radius_meters: float) -> Dict:
+    async def create_polygon(self, lat: float, lon: float, radius_meters: float, segments: int = None,
+                             simplify_tolerance: float = None) -> Dict:
         """
         Создает полигон силами базы данных, возвращает геометрию и площадь в метрах
+        
+        Args:
+            lat: широта центральной точки
+            lon: долгота центральной точки
+            radius_meters: радиус в метрах
+            segments: количество сегментов на четверть окружности (по умолчанию из настроек)
+            simplify_tolerance: допуск упрощения контура в метрах
+        
+        Raises:
+            CircuitOpenError: если circuit breaker базы данных разомкнут
         """
-        try:
-            from app.config import settings
-            segments = settings.default_polygon_points
+        from app.config import settings
+        from app.services.circuit_breaker import postgis_breaker
+        from app.services.profiling_service import bind_context, profile_stage
+        from app.services.geometry_service import polygon_to_geojson
+        segments = segments or settings.default_polygon_points
+        
+        def _create_polygon():
+            # Используем UTM проекцию для более точных расчетов
+            # Определяем UTM зону на основе долготы
+            utm_zone = int((lon + 180) / 6) + 1
+            epsg_code = 32600 + utm_zone if lat >= 0 else 32700 + utm_zone
+            
+            # Для крайних случаев используем более безопасную проекцию
+            if abs(lat) > 80 or abs(lon) > 175:
+                # Используем полярную стереографическую проекцию для крайних случаев
+                epsg_code = 3413 if lat > 0 else 3412  # NSIDC Sea Ice Polar Stereographic
+            
+            buffer_sql = f"""
+                        ST_Buffer(
+                            ST_Transform(
+                                ST_SetSRID(ST_MakePoint({float(lon)}, {float(lat)}), 4326),
+                                {epsg_code}  -- Более подходящая проекция
+                            ),
+                            {float(radius_meters)},
+                            {int(segments)}  -- Количество сегментов для аппроксимации круга
+                        )"""
+            if simplify_tolerance:
+                # Упрощение в метрической проекции, допуск в метрах
+                buffer_sql = f"ST_SimplifyPreserveTopology({buffer_sql}, {float(simplify_tolerance)})"
             
-            def _create_polygon():
-                # Используем UTM проекцию для более точных расчетов
-                # Определяем UTM зону на основе долготы
-                utm_zone = int((lon + 180) / 6) + 1
-                epsg_code = 32600 + utm_zone if lat >= 0 else 32700 + utm_zone
-                
-                # Для крайних случаев используем более безопасную проекцию
-                if abs(lat) > 80 or abs(lon) > 175:
-                    # Используем полярную стереографическую проекцию для крайних случаев
-                    epsg_code = 3413 if lat > 0 else 3412  # NSIDC Sea Ice Polar Stereographic
-                
-                query = f"""
-                    WITH circle AS (
-                        SELECT 
-                            ST_Buffer(
-                                ST_Transform(
-                                    ST_SetSRID(ST_MakePoint({lon}, {lat}), 4326),
-                                    {epsg_code}  -- Более подходящая проекция
-                                ),
-                                {radius_meters},
-                                {segments}  -- Количество сегментов для аппроксимации круга
-                            ) AS geom
-                    )
-                    SELECT 
-                        ST_Transform(geom, 4326) AS geom,
-                        ST_Area(geom) AS area
-                    FROM circle;
-                    """
-                
-                # Используем engine напрямую для geopandas
+            query = f"""
+                WITH circle AS (
+                    SELECT {buffer_sql} AS geom
+                )
+                SELECT 
+                    ST_Transform(geom, 4326) AS geom,
+                    ST_Area(geom) AS area
+                FROM circle;
+                """
+            
+            # Используем engine напрямую для geopandas
+            with profile_stage("geodataframe_read"):
                 result = gpd.read_postgis(query, engine, geom_col='geom')
-                
-                # Получаем геометрию и площадь из результата
-                geom = result['geom'].iloc[0]
-                area = float(result['area'].iloc[0])
-                
-                # Преобразуем геометрию в GeoJSON
-                geom_json = {
-                    "type": geom.geom_type,
-                    "coordinates": geom.__geo_interface__["coordinates"]
-                }
-                
-                return {
-                    "geometry": geom_json,
-                    "area_sqm": area
-                }
             
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, _create_polygon)
+            # Получаем геометрию и площадь из результата
+            geom = result['geom'].iloc[0]
+            area = float(result['area'].iloc[0])
             
-        except Exception as e:
-            logger.error(f"Error creating polygon in database: {e}")
-            # Если база данных недоступна, используем fallback
-            from app.services.geometry_service import GeometryService
-            geometry_service = GeometryService()
-            polygon = geometry_service.create_circular_polygon(lat, lon, radius_meters)
-            area = geometry_service.calculate_polygon_area(polygon)
+            # Преобразуем геометрию в GeoJSON
+            with profile_stage("geojson_conversion"):
+                geom_json = polygon_to_geojson(geom)
             
             return {
-                "geometry": polygon,
+                "geometry": geom_json,
                 "area_sqm": area
             }
         
+        loop = asyncio.get_event_loop()
+        return await postgis_breaker.call(loop.run_in_executor, None, bind_context(_create_polygon))
+
+    async def union_circles(self, circles: List[tuple], segments: int = None) -> Dict:
+        """
+        Строит круги и их объединение силами базы данных (ST_Union)
+        
+        Args:
+            circles: кортежи (lat, lon, radius_meters)
+            segments: количество сегментов на четверть окружности (по умолчанию из настроек)
+        
+        Returns:
+            Геометрия объединения (shapely) и площадь в квадратных метрах
+        
+        Raises:
+            CircuitOpenError: если circuit breaker базы данных разомкнут
+        """
+        from sqlalchemy import text
+        import shapely
+        from app.config import settings
+        from app.services.circuit_breaker import postgis_breaker
+        from app.services.profiling_service import bind_context, profile_stage
+        segments = segments or settings.default_polygon_points
+        
+        # Буфер в geography строится в локальной метрической проекции для каждого круга,
+        # поэтому круги из разных UTM зон объединяются без ручного выбора проекции
+        query = text(f"""
+            WITH coverage AS (
+                SELECT ST_Union(
+                    ST_Buffer(
+                        ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography,
+                        radius,
+                        'quad_segs={int(segments)}'
+                    )::geometry
+                ) AS geom
+                FROM unnest(CAST(:lats AS float8[]), CAST(:lons AS float8[]), CAST(:radii AS float8[]))
+                    AS circles(lat, lon, radius)
+            )
+            SELECT ST_AsBinary(geom) AS geom, ST_Area(geom::geography) AS area
+            FROM coverage;
+            """)
+        params = {
+            "lats": [float(lat) for lat, _, _ in circles],
+            "lons": [float(lon) for _, lon, _ in circles],
+            "radii": [float(radius) for _, _, radius in circles]
+        }
+        
+        def _union_circles():
+            with profile_stage("postgis_union"):
+                with engine.connect() as connection:
+                    row = connection.execute(query, params).one()
+            return {
+                "geometry": shapely.from_wkb(bytes(row.geom)),
+                "area_sqm": float(row.area)
+            }
+        
+        loop = asyncio.get_event_loop()
+        return await postgis_breaker.call(loop.run_in_executor, None, bind_context(_union_circles))
@@ -0,0 +1,60 @@
+import hashlib
+from typing import Any, Dict, Optional
+import orjson
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.services.profiling_service import profile_stage
+
+
+class PolygonJSONResponse(JSONResponse):
+    """
+    Быстрый JSON-ответ для полигонов
+
+    Содержимое считается доверенным и не валидируется повторно через response_model.
+    Массивы NumPy сериализуются orjson напрямую из буфера, а orjson.Fragment
+    (GeoJSON из кэша) вставляется в ответ как есть.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with profile_stage("json_encode_response"):
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def make_etag(cache_key: str, response_format: str) -> str:
+    """
+    Строит ETag ответа по ключу кэша, версии геометрического движка и формату
+
+    Полигон для одних и тех же параметров не меняется, поэтому ETag вычисляется
+    до построения полигона. ETag слабый: признак cached в теле ответа может отличаться.
+    """
+    digest = hashlib.sha256(
+        f"{cache_key}:{settings.geometry_engine_version}:{response_format}".encode()
+    ).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (слабое сравнение)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque_tag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """Заголовки HTTP-кэширования для неизменяемого полигона"""
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.http_cache_max_age_seconds}, immutable",
+        "Vary": "Accept"
+    }
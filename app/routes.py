@@ -1,17 +1,89 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from app.services.polygon_service import PolygonService
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+from app.services.metrics_service import metrics
+from app.services.readiness_service import readiness_service
+from app.services.profiling_service import profiling_service
+from app.services.admission_service import AdmissionError
+from app.services.circuit_breaker import CircuitOpenError, CircuitState, get_circuit_breakers_state
+from app.services.format_service import FormatService, UnsupportedFormatError, GEOJSON, MEDIA_TYPES
+from app.config import settings
 from app.models import *
+from app.responses import PolygonJSONResponse, make_etag, etag_matches, cache_headers
 import logging
 
+if TYPE_CHECKING:
+    from app.services.coverage_service import CoverageService
+    from app.services.polygon_service import PolygonService
+    from app.services.spatial_index_service import SpatialIndexService
+    from app.services.tile_service import TileService
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 polygon_router = APIRouter(tags=["Построение полигона 🗺️"])
 cache_router = APIRouter(tags=["Работа с кешем ⚙️"])
 sheets_router = APIRouter(tags=["Работа с гугл-таблицами 📚"])
-polygon_service = PolygonService()
+admin_router = APIRouter(tags=["Администрирование 🛠️"])
+tiles_router = APIRouter(tags=["Векторные тайлы 🧩"])
+analytics_router = APIRouter(tags=["Аналитика запросов 📊"])
+
+format_service = FormatService()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Проверяет токен администратора из заголовка X-Admin-Token"""
+    if not profiling_service.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Требуется токен администратора")
+
+
+def get_client_id(request: Request, x_api_key: Optional[str] = Header(None)) -> str:
+    """Идентификатор клиента для лимитов построения: API ключ из X-API-Key или IP адрес"""
+    if x_api_key:
+        return f"key:{x_api_key}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _admission_exception(error: AdmissionError) -> HTTPException:
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": error.retry_after_header}
+    )
+
+
+@lru_cache(maxsize=None)
+def get_polygon_service() -> "PolygonService":
+    """
+    Возвращает сервис полигонов, создавая его при первом обращении
+    
+    Тяжелые зависимости (geopandas, pyproj, shapely, SQLAlchemy, httpx)
+    загружаются только здесь, а не при импорте приложения.
+    """
+    from app.services.polygon_service import PolygonService
+    return PolygonService()
+
+
+@lru_cache(maxsize=None)
+def get_coverage_service() -> "CoverageService":
+    """Возвращает сервис объединения покрытия, создавая его при первом обращении"""
+    from app.services.coverage_service import CoverageService
+    return CoverageService()
+
+
+def get_spatial_index_service() -> "SpatialIndexService":
+    """Возвращает пространственный индекс кэша (модуль с shapely загружается при первом обращении)"""
+    from app.services.spatial_index_service import spatial_index_service
+    return spatial_index_service
+
+
+def get_tile_service() -> "TileService":
+    """Возвращает сервис векторных тайлов (модуль с shapely загружается при первом обращении)"""
+    from app.services.tile_service import tile_service
+    return tile_service
 
 
 @router.get("/")
@@ -23,32 +95,104 @@ async def root():
 @router.get("/health")
 async def health_check():
     logger.debug("Health check endpoint accessed")
-    return {"status": "healthy"}
+    breakers = get_circuit_breakers_state()
+    is_degraded = any(state["state"] != CircuitState.CLOSED.value for state in breakers.values())
+    return {
+        "status": "degraded" if is_degraded else "healthy",
+        "circuit_breakers": breakers
+    }
 
 
-@polygon_router.post("/polygon", response_model=PolygonResponse)
-async def create_polygon(request: PointRequest):
-    logger.info(f"Creating polygon for coordinates ({request.latitude}, {request.longitude}) with radius {request.radius}m")
+@router.get("/livez")
+async def liveness_check():
+    """Проверка живости процесса: event loop отвечает"""
+    return {"status": "alive"}
+
+
+@router.get("/readyz")
+async def readiness_check():
+    """Проверка готовности: конвейер запуска завершен и зависимости доступны"""
+    status = readiness_service.get_status()
+    status["dependencies"] = get_circuit_breakers_state()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Возвращает метрики процесса"""
+    logger.debug("Metrics endpoint accessed")
+    return metrics.snapshot()
+
+
+def _feature_properties(request: PointRequest, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "center": [request.longitude, request.latitude],
+        "radius": request.radius,
+        "area_sqm": result["area"],
+        "cached": result["cached"]
+    }
+
+
+def _negotiate_format(accept: Optional[str], format_param: Optional[str], batch: bool = False) -> str:
+    try:
+        return format_service.negotiate(accept, format_param, batch)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+async def _build_polygon(request: PointRequest, client_id: Optional[str] = None) -> Dict[str, Any]:
+    return await get_polygon_service().create_polygon(
+        lat=request.latitude,
+        lon=request.longitude,
+        radius_meters=request.radius,
+        segments=request.segments,
+        precision=request.precision,
+        simplify_tolerance=request.simplify_tolerance,
+        client_id=client_id
+    )
+
+
+async def _polygon_response(request: PointRequest, response_format: str, if_none_match: Optional[str],
+                            client_id: Optional[str] = None) -> Response:
+    polygon_service = get_polygon_service()
+    # Некорректный запрос получает 400, даже если его ETag совпал
+    try:
+        polygon_service.validate(request.latitude, request.longitude, request.radius, request.segments)
+    except ValueError as e:
+        logger.warning(f"Validation error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    etag = make_etag(
+        polygon_service.get_cache_key(
+            request.latitude, request.longitude, request.radius,
+            request.segments, request.precision, request.simplify_tolerance
+        ),
+        response_format
+    )
+    headers = cache_headers(etag)
+    # Полигон для тех же параметров не меняется - повторный запрос не требует построения
+    if etag_matches(if_none_match, etag):
+        logger.debug("Polygon not modified, ETag %s", etag)
+        return Response(status_code=304, headers=headers)
     
     try:
-        result = await polygon_service.create_polygon(
-            lat=request.latitude,
-            lon=request.longitude,
-            radius_meters=request.radius
-        )
+        result = await _build_polygon(request, client_id)
+        
+        logger.info("Successfully created polygon with area %.2f m²", result['area'])
         
-        logger.info(f"Successfully created polygon with area {result['area']:.2f} m²")
+        properties = _feature_properties(request, result)
+        if response_format != GEOJSON:
+            content = format_service.encode_feature(response_format, result, properties, request.precision)
+            return Response(content=content, media_type=MEDIA_TYPES[response_format], headers=headers)
         
-        return {
+        return PolygonJSONResponse({
             "type": "Feature",
             "geometry": result["polygon"],
-            "properties": {
-                "center": [request.longitude, request.latitude],
-                "radius": request.radius,
-                "area_sqm": result["area"],
-                "cached": result["cached"]
-            }
-        }
+            "properties": properties
+        }, headers=headers)
+    except AdmissionError as e:
+        logger.warning(f"Polygon request rejected by admission control: {e}")
+        raise _admission_exception(e)
     except ValueError as e:
         logger.warning(f"Validation error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -56,11 +200,107 @@ async def create_polygon(request: PointRequest):
         logger.error(f"Unexpected error creating polygon: {e}")
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
+
+@polygon_router.post("/polygon", response_model=PolygonResponse, response_class=PolygonJSONResponse)
+async def create_polygon(request: PointRequest, format: Optional[str] = Query(None, description="geojson, wkb, twkb или protobuf"),
+                         accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None),
+                         client_id: str = Depends(get_client_id)):
+    logger.info("Creating polygon for coordinates (%s, %s) with radius %sm",
+                request.latitude, request.longitude, request.radius)
+    response_format = _negotiate_format(accept, format)
+    return await _polygon_response(request, response_format, if_none_match, client_id)
+
+
+@polygon_router.get("/polygon", response_model=PolygonResponse, response_class=PolygonJSONResponse)
+async def get_polygon(request: PointRequest = Depends(), format: Optional[str] = Query(None, description="geojson, wkb, twkb или protobuf"),
+                      accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None),
+                      client_id: str = Depends(get_client_id)):
+    """Кэшируемый вариант создания полигона: параметры передаются в строке запроса"""
+    logger.info("Getting polygon for coordinates (%s, %s) with radius %sm",
+                request.latitude, request.longitude, request.radius)
+    response_format = _negotiate_format(accept, format)
+    return await _polygon_response(request, response_format, if_none_match, client_id)
+
+
+@polygon_router.post("/polygon/batch", response_class=PolygonJSONResponse)
+async def create_polygon_batch(request: PolygonBatchRequest,
+                               format: Optional[str] = Query(None, description="geojson, flatgeobuf или protobuf"),
+                               accept: Optional[str] = Header(None), client_id: str = Depends(get_client_id)):
+    """Строит полигоны для набора точек и отдает их одной коллекцией"""
+    logger.info("Creating polygon batch of %s points", len(request.points))
+    response_format = _negotiate_format(accept, format, batch=True)
+    if len(request.points) > settings.max_batch_size:
+        raise HTTPException(status_code=400, detail=f"В пакете не больше {settings.max_batch_size} точек")
+    
+    try:
+        results = await get_polygon_service().create_polygons([
+            {
+                "lat": point.latitude,
+                "lon": point.longitude,
+                "radius_meters": point.radius,
+                "segments": point.segments,
+                "precision": point.precision,
+                "simplify_tolerance": point.simplify_tolerance
+            }
+            for point in request.points
+        ], client_id)
+        properties = [_feature_properties(point, result) for point, result in zip(request.points, results)]
+        
+        if response_format != GEOJSON:
+            content = format_service.encode_collection(response_format, results, properties)
+            return Response(content=content, media_type=MEDIA_TYPES[response_format])
+        
+        return PolygonJSONResponse({
+            "type": "FeatureCollection",
+            "features": [
+                {"type": "Feature", "geometry": result["polygon"], "properties": feature_properties}
+                for result, feature_properties in zip(results, properties)
+            ]
+        })
+    except AdmissionError as e:
+        logger.warning(f"Polygon batch rejected by admission control: {e}")
+        raise _admission_exception(e)
+    except ValueError as e:
+        logger.warning(f"Validation error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error creating polygon batch: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+@polygon_router.post("/coverage", response_model=PolygonResponse, response_class=PolygonJSONResponse)
+async def create_coverage(request: CoverageRequest):
+    """Строит объединение множества кругов и считает покрытую площадь"""
+    logger.info(f"Creating coverage for {len(request.circles)} circles")
+    
+    try:
+        result = await get_coverage_service().build_coverage(
+            [(circle.latitude, circle.longitude, circle.radius) for circle in request.circles],
+            segments=request.segments,
+            precision=request.precision,
+            use_postgis=request.use_postgis
+        )
+    except ValueError as e:
+        logger.warning(f"Validation error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error creating coverage: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+    
+    return PolygonJSONResponse({
+        "type": "Feature",
+        "geometry": result["geometry"],
+        "properties": {
+            "circles": len(request.circles),
+            "area_sqm": result["area_sqm"],
+            "engine": result["engine"]
+        }
+    })
+
 @polygon_router.post('/perfomance-test')
 async def stress_test(request: PointRequest):
     logger.info(f"Creating polygon for coordinates ({request.latitude}, {request.longitude}) with radius {request.radius}m")
     for i in range(0,20):
-        await polygon_service.create_polygon(
+        await get_polygon_service().create_polygon(
             lat=request.latitude,
             lon=request.longitude,
             radius_meters=request.radius
@@ -71,7 +311,7 @@ async def create_spreadsheet():
     """Создает новую Google таблицу для логирования запросов"""
     logger.info("Creating new Google Spreadsheet")
     
-    spreadsheet_id = polygon_service.create_spreadsheet()
+    spreadsheet_id = await get_polygon_service().create_spreadsheet()
     if not spreadsheet_id:
         logger.error("Failed to create Google Spreadsheet")
         raise HTTPException(status_code=500, detail="Не удалось создать Google таблицу")
@@ -87,7 +327,7 @@ async def get_spreadsheet_url():
     """Возвращает URL текущей Google таблицы"""
     logger.debug("Getting Google Spreadsheet URL")
     
-    url = polygon_service.get_spreadsheet_url()
+    url = get_polygon_service().get_spreadsheet_url()
     if not url:
         logger.warning("Google Spreadsheet URL not found")
         raise HTTPException(status_code=404, detail="Google таблица не настроена")
@@ -100,7 +340,10 @@ async def get_cache_stats():
     """Возвращает статистику кэша"""
     logger.debug("Getting cache statistics")
     
-    stats = await polygon_service.get_cache_stats()
+    try:
+        stats = await get_polygon_service().get_cache_stats()
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Кэш временно недоступен")
     return CacheStatsResponse(**stats)
 
 
@@ -109,18 +352,55 @@ async def clear_cache():
     """Очищает весь кэш"""
     logger.info("Clearing cache")
     
-    deleted_count = await polygon_service.clear_cache()
-    logger.info(f"Cleared {deleted_count} cache entries")
+    try:
+        deleted_count = await get_polygon_service().clear_cache()
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Кэш временно недоступен")
+    logger.info(f"Invalidated {deleted_count} cache entries")
     
     return {"deleted_entries": deleted_count}
 
 
+@cache_router.get("/cache/query/point")
+async def query_cache_by_point(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180),
+                               limit: Optional[int] = Query(None, ge=1)):
+    """Возвращает кэшированные полигоны, содержащие точку"""
+    try:
+        result = await get_spatial_index_service().query_point(lat, lon, limit)
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Кэш временно недоступен")
+    except Exception as e:
+        logger.error(f"Error querying spatial index: {e}")
+        raise HTTPException(status_code=503, detail="Кэш временно недоступен")
+    return PolygonJSONResponse(result)
+
+
+@cache_router.get("/cache/query/bbox")
+async def query_cache_by_bbox(min_lon: float = Query(..., ge=-180, le=180), min_lat: float = Query(..., ge=-90, le=90),
+                              max_lon: float = Query(..., ge=-180, le=180), max_lat: float = Query(..., ge=-90, le=90),
+                              limit: Optional[int] = Query(None, ge=1)):
+    """Возвращает кэшированные полигоны, пересекающие прямоугольник"""
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="Некорректные границы прямоугольника")
+    try:
+        result = await get_spatial_index_service().query_bbox(min_lon, min_lat, max_lon, max_lat, limit)
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail="Кэш временно недоступен")
+    except Exception as e:
+        logger.error(f"Error querying spatial index: {e}")
+        raise HTTPException(status_code=503, detail="Кэш временно недоступен")
+    return PolygonJSONResponse(result)
+
+
 @cache_router.delete("/cache/entry")
-async def delete_cache_entry(lat: float, lon: float, radius: float):
+async def delete_cache_entry(lat: float, lon: float, radius: float, segments: Optional[int] = None,
+                             precision: Optional[int] = None, simplify_tolerance: Optional[float] = None):
     """Удаляет конкретную запись кэша"""
     logger.info(f"Deleting cache entry for coordinates ({lat}, {lon}) with radius {radius}m")
     
-    success = polygon_service.cache_service.delete_cache_entry(lat, lon, radius)
+    polygon_service = get_polygon_service()
+    options = polygon_service.build_options(segments, precision, simplify_tolerance)
+    success = polygon_service.cache_service.delete_cache_entry(lat, lon, radius, options)
     if not success:
         logger.warning(f"Cache entry not found for coordinates ({lat}, {lon}) with radius {radius}m")
         raise HTTPException(status_code=404, detail="Запись кэша не найдена")
@@ -128,4 +408,58 @@ async def delete_cache_entry(lat: float, lon: float, radius: float):
     return {"message": "Cache entry deleted successfully"}
 
 
+@analytics_router.get("/analytics/summary")
+async def get_analytics_summary(hours: float = Query(24, gt=0, le=24 * 365), top: int = Query(20, ge=0, le=1000)):
+    """Возвращает сводку по запросам: доля попаданий в кэш, задержки по часам, горячие ключи"""
+    from app.services.analytics_service import analytics_service
+    try:
+        return await analytics_service.get_summary(hours, top)
+    except RuntimeError:
+        raise HTTPException(status_code=503, detail="Аналитика запросов недоступна")
+
+
+@tiles_router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_tile(z: int, x: int, y: int):
+    """Возвращает векторный тайл (Mapbox Vector Tile) с кэшированными полигонами"""
+    from app.services.tile_service import MVT_MEDIA_TYPE
+    tile_service = get_tile_service()
+    
+    try:
+        data, source = await tile_service.get_tile(z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error building tile {z}/{x}/{y}: {e}")
+        raise HTTPException(status_code=503, detail="Тайлы временно недоступны")
+    
+    headers = {
+        "Cache-Control": f"public, max-age={tile_service.config.get('cache_max_age', 60)}",
+        "X-Tile-Source": source
+    }
+    if not data:
+        return Response(status_code=204, headers=headers)
+    return Response(content=data, media_type=MVT_MEDIA_TYPE, headers=headers)
+
+
+@admin_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Возвращает сводки сохраненных профилей запросов"""
+    return {"profiles": profiling_service.list_profiles()}
+
+
+@admin_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Возвращает разбивку времени запроса по этапам"""
+    profile = profiling_service.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return profile
+
 
+@admin_router.get("/admin/profiles/{profile_id}/pstats", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """Отдает файл pstats профиля"""
+    profile = profiling_service.get_profile(profile_id)
+    if not profile or not profile.get("pstats_file"):
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return FileResponse(profile["pstats_file"], filename=f"{profile_id}.pstats")
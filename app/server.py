@@ -0,0 +1,125 @@
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+from app.config import get_server_config
+from app.services.shared_cache import shared_polygon_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Воркер, упавший быстрее этого времени, перезапускается с задержкой, чтобы не крутиться в цикле
+_MIN_WORKER_UPTIME_SECONDS = 1.0
+
+
+class WorkerSupervisor:
+    """
+    Pre-fork сервер: главный процесс открывает сокет и запускает воркеры через fork
+
+    Все воркеры принимают соединения с одного сокета (балансирует ядро), наследуют
+    импортированное приложение (copy-on-write) и кэш горячих полигонов в разделяемой
+    памяти. Упавший воркер перезапускается, SIGTERM/SIGINT завершает все воркеры.
+    """
+
+    def __init__(self, app, host: str, port: int, workers: int):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+        self._socket: Optional[socket.socket] = None
+
+    def run(self) -> None:
+        # Явный IPPROTO_TCP: asyncio включает TCP_NODELAY на принятых соединениях только для него,
+        # иначе ответы, записанные несколькими вызовами, задерживаются алгоритмом Нейгла
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.set_inheritable(True)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        logger.info(f"Starting {self.workers} workers on {self.host}:{self.port}")
+        for _ in range(self.workers):
+            self._spawn()
+
+        try:
+            while self._children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                started_at = self._children.pop(pid, None)
+                if started_at is None or self._stopping:
+                    continue
+                logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+                if time.monotonic() - started_at < _MIN_WORKER_UPTIME_SECONDS:
+                    time.sleep(_MIN_WORKER_UPTIME_SECONDS)
+                if not self._stopping:
+                    self._spawn()
+        finally:
+            self._socket.close()
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # uvicorn устанавливает собственные обработчики сигналов для плавной остановки
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            shared_polygon_cache.release_ownership()
+            exit_code = 0
+            try:
+                self._serve()
+            except Exception as e:
+                logger.error(f"Worker {os.getpid()} failed: {e}")
+                exit_code = 1
+            # Обычное завершение интерпретатора, чтобы atexit дождался процессов пула геометрии
+            sys.exit(exit_code)
+        self._children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def _serve(self) -> None:
+        import uvicorn
+        server = uvicorn.Server(uvicorn.Config(self.app, host=self.host, port=self.port, log_config=None))
+        server.run(sockets=[self._socket])
+
+    def _handle_stop(self, signum, frame) -> None:
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info(f"Received signal {signum}, stopping workers")
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def run(app) -> None:
+    """
+    Запускает приложение в одном процессе или в pre-fork режиме
+
+    Количество воркеров берется из SERVER_WORKERS (0 - по числу ядер). Кэш горячих
+    полигонов в разделяемой памяти создается до запуска воркеров.
+    """
+    import uvicorn
+
+    config = get_server_config()
+    workers = config["workers"] or os.cpu_count() or 1
+    if workers > 1 and not hasattr(os, "fork"):
+        logger.warning("Multi-worker mode requires fork, starting a single worker")
+        workers = 1
+
+    shared_polygon_cache.create()
+    try:
+        if workers == 1:
+            # log_config=None: логгеры uvicorn пишут через общую очередь логирования, а не в свои обработчики
+            uvicorn.run(app, host=config["host"], port=config["port"], log_config=None)
+        else:
+            WorkerSupervisor(app, config["host"], config["port"], workers).run()
+    finally:
+        shared_polygon_cache.destroy()
@@ -1,7 +1,19 @@
-from .geometry_service import GeometryService
-from .polygon_service import PolygonService
-
 __all__ = [
+    'CoverageService',
     'GeometryService',
     'PolygonService'
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # Сервисы тянут shapely/pyproj/geopandas, поэтому импортируются только по требованию
+    if name == 'CoverageService':
+        from .coverage_service import CoverageService
+        return CoverageService
+    if name == 'GeometryService':
+        from .geometry_service import GeometryService
+        return GeometryService
+    if name == 'PolygonService':
+        from .polygon_service import PolygonService
+        return PolygonService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
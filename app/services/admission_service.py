@@ -0,0 +1,240 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+from app.config import get_admission_config
+from app.services.metrics_service import metrics
+from app.services.profiling_service import profile_stage
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionError(RuntimeError):
+    """Запрос на построение полигона отклонен admission control"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Значение заголовка Retry-After в целых секундах"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class RateLimitExceededError(AdmissionError):
+    """Клиент превысил лимит построения новых полигонов"""
+
+    status_code = 429
+
+
+class AdmissionQueueFullError(AdmissionError):
+    """Очередь ожидания построения переполнена или ожидание истекло"""
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket на клиента (API ключ или IP)
+
+    Ведра хранятся в LRU ограниченного размера: давно не обращавшийся клиент
+    вытесняется и при следующем запросе получает полное ведро.
+
+    Запрос стоимостью больше burst (пакет с множеством промахов) допускается только
+    при полном ведре и уводит его в долг: следующие запросы ждут, пока долг не
+    восполнится, поэтому средняя скорость построения не превышает rate.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max(1, max_clients)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def try_acquire(self, client_id: str, cost: float = 1.0) -> float:
+        """
+        Забирает токены из ведра клиента
+
+        Args:
+            client_id: идентификатор клиента
+            cost: количество токенов (больше burst - при полном ведре, в долг)
+
+        Returns:
+            0, если токены получены, иначе время в секундах до их появления
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(client_id, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+        required = min(float(cost), float(self.burst))
+
+        if tokens >= required:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (required - tokens) / self.rate if self.rate > 0 else float(self.burst)
+
+        self._buckets[client_id] = (tokens, now)
+        self._buckets.move_to_end(client_id)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """
+    Admission control для пути промаха кэша
+
+    Построение новых полигонов ограничено по числу одновременных задач; сверх лимита
+    запросы ждут в ограниченной очереди (FIFO), при переполнении или истечении
+    ожидания сразу получают 503 с Retry-After. Перед очередью применяется token
+    bucket клиента (429). Попадания в кэш через admission control не проходят.
+
+    Лимиты действуют в пределах процесса (воркера).
+    """
+
+    def __init__(self):
+        self.config = get_admission_config()
+        self.enabled = self.config.get('enabled', True)
+        self.max_concurrent = max(1, self.config.get('max_concurrent', 32))
+        self.max_queued = max(0, self.config.get('max_queued', 128))
+        self.queue_timeout = self.config.get('queue_timeout', 10.0)
+        self.retry_after = self.config.get('retry_after', 1.0)
+        self.limiter: Optional[TokenBucketLimiter] = None
+        if self.config.get('rate_limit_enabled', True):
+            self.limiter = TokenBucketLimiter(
+                self.config.get('rate_limit_per_second', 10.0),
+                self.config.get('rate_limit_burst', 20),
+                self.config.get('rate_limit_max_clients', 10000)
+            )
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.rate_limited = 0
+        metrics.register_collector("admission", self.get_metrics)
+
+    @asynccontextmanager
+    async def admit(self, client_id: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Допускает построение полигона или отклоняет его
+
+        Args:
+            client_id: идентификатор клиента для token bucket (None - без лимита клиента)
+
+        Raises:
+            RateLimitExceededError: клиент исчерпал лимит
+            AdmissionQueueFullError: очередь ожидания переполнена или ожидание истекло
+        """
+        if not self.enabled:
+            yield
+            return
+
+        self.charge(client_id)
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def charge(self, client_id: Optional[str], cost: int = 1) -> None:
+        """
+        Забирает токены клиента без занятия слота построения
+
+        Пакетный запрос платит токен за каждый промах сразу за весь пакет, а
+        параллельность построения промахов ограничивают слоты admit() без клиента.
+
+        Args:
+            client_id: идентификатор клиента (None - без лимита клиента)
+            cost: количество токенов
+
+        Raises:
+            RateLimitExceededError: клиент исчерпал лимит
+        """
+        if not self.enabled or self.limiter is None or client_id is None:
+            return
+        wait = self.limiter.try_acquire(client_id, cost)
+        if wait > 0:
+            self.rate_limited += 1
+            metrics.increment("admission_rate_limited")
+            raise RateLimitExceededError("Превышен лимит построения новых полигонов", wait)
+
+    async def _acquire(self) -> None:
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queued:
+            self.rejected += 1
+            metrics.increment("admission_rejected")
+            raise AdmissionQueueFullError("Очередь построения полигонов переполнена", self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            with profile_stage("admission_wait"):
+                # Слот передается ожидающему при освобождении, счетчик активных не меняется
+                await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self.timed_out += 1
+            metrics.increment("admission_timed_out")
+            raise AdmissionQueueFullError("Истекло ожидание в очереди построения полигонов", self.retry_after)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже передан, но клиент отключился - отдаем его следующему
+                self._release()
+            else:
+                self._discard(waiter)
+            raise
+        self.admitted += 1
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики admission control
+
+        Returns:
+            Текущие активные и ожидающие построения и счетчики отказов
+        """
+        return {
+            "enabled": self.enabled,
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "rate_limited": self.rate_limited,
+            "tracked_clients": len(self.limiter) if self.limiter is not None else 0
+        }
+
+
+# Admission control построения полигонов процесса
+admission_controller = AdmissionController()
@@ -0,0 +1,402 @@
+import asyncio
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config import get_analytics_config
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "timestamp", "cache_key", "latitude", "longitude", "radius_meters",
+    "area_sqm", "cached", "engine", "latency_ms"
+)
+_FILE_PREFIX = "requests-"
+_TIME_FORMAT = "%Y%m%dT%H%M%S"
+_LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("cache_key", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("radius_meters", pa.float64()),
+        ("area_sqm", pa.float64()),
+        ("cached", pa.bool_()),
+        ("engine", pa.string()),
+        ("latency_ms", pa.float64())
+    ])
+
+
+class AnalyticsService:
+    """
+    Локальное хранилище аналитики запросов в Parquet файлах
+
+    Записи о запросах копятся в памяти по колонкам и пачками пишутся в Parquet
+    (одна row group на сброс). Файл процесса сменяется каждые rotate_seconds и
+    становится доступен для чтения после закрытия; строки открытого файла этого
+    процесса учитываются в сводке из памяти. Сводка считается векторными
+    агрегациями pyarrow (группировка по часам, ключам, движкам).
+
+    pyarrow - необязательная зависимость: без нее аналитика выключается.
+    """
+
+    def __init__(self):
+        self.config = get_analytics_config()
+        self.enabled = self.config.get('enabled', True)
+        self.directory = self.config.get('dir', 'analytics')
+        self.flush_interval = self.config.get('flush_interval', 5.0)
+        self.max_buffered = max(1, self.config.get('max_buffered', 10000))
+        self.rotate_seconds = max(1, self.config.get('rotate_seconds', 300))
+        self.retention_days = self.config.get('retention_days', 30)
+        self.summary_max_hours = self.config.get('summary_max_hours', 168)
+        self.sheets_summary_interval = self.config.get('sheets_summary_interval', 3600)
+
+        self._columns: Dict[str, List[Any]] = {name: [] for name in _COLUMNS}
+        self._buffered = 0
+        # Запись в файл и чтение строк открытого файла выполняются в потоках
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_path: Optional[str] = None
+        self._window_start: Optional[int] = None
+        self._open_batches: List[Any] = []
+        # Записи, переданные в поток записи, но еще не добавленные в открытый файл
+        self._inflight: Optional[Dict[str, List[Any]]] = None
+        # Сбросы (периодический, по заполнению буфера, при остановке) выполняются по одному
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._summary_task: Optional[asyncio.Task] = None
+        self._summary_sink: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+        self._summary_lock_file = None
+        self._started = False
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.files_written = 0
+        self.write_failures = 0
+        metrics.register_collector("analytics", self.get_metrics)
+
+    @property
+    def available(self) -> bool:
+        """Включена ли аналитика и установлен ли pyarrow"""
+        if not self.enabled:
+            return False
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def set_summary_sink(self, sink: Callable[[Dict[str, Any]], Awaitable[Any]]) -> None:
+        """Задает получателя периодических сводок (запись в Google Sheets)"""
+        self._summary_sink = sink
+
+    def record(self, cache_key: str, lat: float, lon: float, radius_meters: float, area: float,
+               cached: bool, engine: str, latency_seconds: float) -> None:
+        """
+        Добавляет запись о запросе в буфер
+
+        Args:
+            cache_key: ключ кэша полигона
+            lat: широта
+            lon: долгота
+            radius_meters: радиус в метрах
+            area: площадь полигона
+            cached: полигон взят из кэша
+            engine: кто построил полигон (cache, postgis, local)
+            latency_seconds: время обработки запроса
+        """
+        if not self._started:
+            return
+        if self._buffered >= self.max_buffered * 2:
+            # Запись в файлы не успевает или падает - память не растет без ограничений
+            self.dropped += 1
+            return
+
+        columns = self._columns
+        columns["timestamp"].append(datetime.now(timezone.utc))
+        columns["cache_key"].append(cache_key)
+        columns["latitude"].append(lat)
+        columns["longitude"].append(lon)
+        columns["radius_meters"].append(radius_meters)
+        columns["area_sqm"].append(area)
+        columns["cached"].append(cached)
+        columns["engine"].append(engine)
+        columns["latency_ms"].append(latency_seconds * 1000)
+        self._buffered += 1
+        self.recorded += 1
+
+        if self._buffered >= self.max_buffered and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    def start(self) -> None:
+        """Запускает периодический сброс записей и отправку сводок"""
+        if self._started:
+            return
+        if not self.available:
+            if self.enabled:
+                logger.warning("Request analytics requires pyarrow, analytics is disabled")
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._started = True
+        loop = asyncio.get_running_loop()
+        self._task = loop.create_task(self._run())
+        if self.sheets_summary_interval > 0 and self._acquire_summary_lock():
+            self._summary_task = loop.create_task(self._run_summaries())
+
+    async def stop(self) -> None:
+        """Останавливает фоновые задачи, сбрасывает буфер и закрывает файл"""
+        if not self._started:
+            return
+        for task in (self._task, self._summary_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._summary_task = self._flush_task = None
+        await self.flush()
+        await asyncio.to_thread(self._close_writer)
+        self._started = False
+
+    def _acquire_summary_lock(self) -> bool:
+        # Сводки отправляет один процесс из всех воркеров - тот, кто взял блокировку файла
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        lock_file = open(os.path.join(self.directory, ".summary.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._summary_lock_file = lock_file
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные записи в текущий файл и сменяет файл по времени
+
+        При ошибке записи пачка возвращается в буфер (в пределах того же лимита
+        max_buffered * 2, что и для новых записей) и будет записана следующим сбросом.
+        """
+        async with self._flush_lock:
+            columns = None
+            if self._buffered:
+                columns, self._columns = self._columns, {name: [] for name in _COLUMNS}
+                self._buffered = 0
+                with self._lock:
+                    self._inflight = columns
+            try:
+                await asyncio.to_thread(self._write, columns)
+            except Exception as e:
+                self.write_failures += 1
+                logger.error(f"Error writing request analytics: {e}")
+                if columns is not None:
+                    self._requeue(columns)
+            finally:
+                with self._lock:
+                    self._inflight = None
+
+    def _requeue(self, columns: Dict[str, List[Any]]) -> None:
+        # Незаписанная пачка старше записей, накопленных во время записи, - идет в начало буфера;
+        # при нехватке места отбрасываются самые старые записи
+        rows = len(columns["timestamp"])
+        keep = min(rows, max(0, self.max_buffered * 2 - self._buffered))
+        self.dropped += rows - keep
+        if not keep:
+            return
+        for name in _COLUMNS:
+            self._columns[name] = columns[name][rows - keep:] + self._columns[name]
+        self._buffered += keep
+
+    def _write(self, columns: Optional[Dict[str, List[Any]]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        window_start = int(time.time()) // self.rotate_seconds * self.rotate_seconds
+        with self._lock:
+            if self._writer is not None and window_start != self._window_start:
+                self._close_writer_locked()
+            if columns is None:
+                return
+
+            batch = pa.RecordBatch.from_pydict(columns, schema=_schema())
+            if self._writer is None:
+                name = datetime.fromtimestamp(window_start, timezone.utc).strftime(_TIME_FORMAT)
+                self._writer_path = os.path.join(self.directory, f"{_FILE_PREFIX}{name}-{os.getpid()}.parquet")
+                self._writer = pq.ParquetWriter(self._writer_path + ".tmp", _schema(), compression="zstd")
+                self._window_start = window_start
+            self._writer.write_batch(batch)
+            self._open_batches.append(batch)
+            self._inflight = None
+            self.written += batch.num_rows
+
+    def _close_writer(self) -> None:
+        with self._lock:
+            self._close_writer_locked()
+
+    def _close_writer_locked(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self._writer_path + ".tmp", self._writer_path)
+        self._writer = None
+        self._open_batches = []
+        self.files_written += 1
+        self._remove_expired()
+
+    def _remove_expired(self) -> None:
+        threshold = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime(_TIME_FORMAT)
+        for path in self._files():
+            if os.path.basename(path)[len(_FILE_PREFIX):][:len(threshold)] < threshold:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Error removing expired analytics file {path}: {e}")
+
+    def _files(self, since: Optional[datetime] = None) -> List[str]:
+        paths = sorted(glob.glob(os.path.join(self.directory, f"{_FILE_PREFIX}*.parquet")))
+        if since is None:
+            return paths
+        # Имя файла начинается с начала его окна - отбрасываются файлы, закончившиеся до since
+        first = (since - timedelta(seconds=self.rotate_seconds)).strftime(_TIME_FORMAT)
+        return [path for path in paths if os.path.basename(path)[len(_FILE_PREFIX):][:len(first)] >= first]
+
+    async def get_summary(self, hours: float = 24, top: int = 20) -> Dict[str, Any]:
+        """
+        Считает сводку по запросам за последние часы
+
+        Args:
+            hours: период в часах
+            top: количество самых частых ключей
+
+        Returns:
+            Количество запросов, доля попаданий, задержки по часам, движки и горячие ключи
+        """
+        if not self._started:
+            raise RuntimeError("Request analytics is not available")
+        hours = min(hours, self.summary_max_hours)
+        # Строки открытого файла и еще не записанные строки этого процесса тоже входят в сводку
+        pending = [{name: list(values) for name, values in self._columns.items()}]
+        with self._lock:
+            if self._inflight is not None:
+                pending.append(self._inflight)
+            open_batches = list(self._open_batches)
+        return await asyncio.to_thread(self._summarize, hours, top, open_batches, pending)
+
+    def _summarize(self, hours: float, top: int, open_batches: List[Any],
+                   pending: List[Dict[str, List[Any]]]) -> Dict[str, Any]:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        schema = _schema()
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        recent = ds.field("timestamp") >= pa.scalar(since, type=schema.field("timestamp").type)
+
+        tables = []
+        files = self._files(since)
+        if files:
+            tables.append(ds.dataset(files, schema=schema, format="parquet").to_table(filter=recent))
+        batches = open_batches + [
+            pa.RecordBatch.from_pydict(columns, schema=schema) for columns in pending if columns["timestamp"]
+        ]
+        if batches:
+            tables.append(pa.Table.from_batches(batches, schema=schema).filter(recent))
+        table = pa.concat_tables(tables) if tables else schema.empty_table()
+
+        table = table.append_column("hour", pc.floor_temporal(table["timestamp"], unit="hour"))
+        table = table.append_column("hit", pc.cast(table["cached"], pa.int64()))
+        total = table.num_rows
+        hits = pc.sum(table["hit"]).as_py() or 0
+
+        quantiles = pc.TDigestOptions(q=list(_LATENCY_QUANTILES))
+        by_hour = table.group_by("hour").aggregate([
+            ("hit", "count"), ("hit", "sum"), ("latency_ms", "tdigest", quantiles), ("latency_ms", "mean")
+        ]).sort_by("hour")
+        by_engine = table.group_by("engine").aggregate([("engine", "count")]).sort_by([("engine_count", "descending")])
+        hot_keys = table.group_by("cache_key").aggregate([
+            ("hit", "count"), ("hit", "sum"),
+            ("latitude", "min"), ("longitude", "min"), ("radius_meters", "min")
+        ]).sort_by([("hit_count", "descending")]).slice(0, top)
+
+        return {
+            "period_hours": hours,
+            "requests": total,
+            "hit_rate": hits / total if total else None,
+            "latency_ms": self._quantiles(pc.tdigest(table["latency_ms"], q=list(_LATENCY_QUANTILES)).to_pylist())
+            if total else {},
+            "by_hour": [
+                {
+                    "hour": row["hour"].isoformat(),
+                    "requests": row["hit_count"],
+                    "hit_rate": row["hit_sum"] / row["hit_count"] if row["hit_count"] else None,
+                    "latency_ms": {"mean": row["latency_ms_mean"], **self._quantiles(row["latency_ms_tdigest"])}
+                }
+                for row in by_hour.to_pylist()
+            ],
+            "engines": {row["engine"]: row["engine_count"] for row in by_engine.to_pylist()},
+            "hot_keys": [
+                {
+                    "cache_key": row["cache_key"],
+                    "latitude": row["latitude_min"],
+                    "longitude": row["longitude_min"],
+                    "radius_meters": row["radius_meters_min"],
+                    "requests": row["hit_count"],
+                    "hits": row["hit_sum"]
+                }
+                for row in hot_keys.to_pylist()
+            ]
+        }
+
+    @staticmethod
+    def _quantiles(values: List[Optional[float]]) -> Dict[str, Optional[float]]:
+        return {f"p{int(q * 100)}": value for q, value in zip(_LATENCY_QUANTILES, values or [])}
+
+    async def _run_summaries(self) -> None:
+        while True:
+            await asyncio.sleep(self.sheets_summary_interval)
+            if self._summary_sink is None:
+                continue
+            try:
+                summary = await self.get_summary(hours=self.sheets_summary_interval / 3600, top=1)
+                await self._summary_sink(summary)
+            except Exception as e:
+                logger.error(f"Error sending analytics summary: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики аналитики
+
+        Returns:
+            Счетчики записанных, потерянных записей и файлов
+        """
+        return {
+            "enabled": self._started,
+            "buffered": self._buffered,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "files_written": self.files_written,
+            "write_failures": self.write_failures,
+            "summary_publisher": self._summary_task is not None
+        }
+
+
+# Аналитика запросов процесса
+analytics_service = AnalyticsService()
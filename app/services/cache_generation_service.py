@@ -0,0 +1,165 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+from app.config import get_cache_generation_config
+from app.services.cache_stats_service import cache_stats_service, EVICTIONS
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CacheGenerationService:
+    """
+    Инвалидация кэша по поколениям
+
+    Номер поколения входит в ключ кэша и хранится в каждой записи. Очистка кэша -
+    увеличение номера в одной строке cache_generation: все прежние записи сразу
+    перестают находиться, без долгой транзакции по всей таблице. Записи старых
+    поколений удаляются в фоне небольшими порциями, а в секционированной таблице -
+    удалением секций старых поколений.
+
+    Воркеры периодически перечитывают поколение и сбрасывают локальные структуры
+    (пространственный индекс, кэш тайлов), если поколение сменил другой процесс.
+    Чтения из базы отбрасывают записи старых поколений сразу, независимо от этого.
+    """
+
+    def __init__(self):
+        self.config = get_cache_generation_config()
+        self.refresh_interval = self.config.get('refresh_interval', 1.0)
+        self.purge_chunk_size = max(1, self.config.get('purge_chunk_size', 1000))
+        self.purge_pause = self.config.get('purge_pause', 0.1)
+
+        self.generation = 0
+        # Поколение, ниже которого записей в базе уже нет (-1 - неизвестно, проверяется при запуске)
+        self._purged_generation = -1
+        self._listeners: List[Callable[[int], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self._repository = None
+
+        self.bumps = 0
+        self.purged_entries = 0
+        self.refresh_failures = 0
+        self.purge_failures = 0
+        metrics.register_collector("cache_generation", self.get_metrics)
+
+    def _get_repository(self):
+        # Репозиторий тянет SQLAlchemy, поэтому создается при первом обращении к базе
+        if self._repository is None:
+            from app.repositories.cache_repository import CacheRepository
+            self._repository = CacheRepository()
+        return self._repository
+
+    def add_listener(self, callback: Callable[[int], None]) -> None:
+        """Подписывает на смену поколения другим процессом (аргумент - новое поколение)"""
+        self._listeners.append(callback)
+
+    def start(self) -> None:
+        """Запускает периодическое чтение поколения и фоновое удаление устаревших записей"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновые задачи (недоудаленные записи удалятся после перезапуска)"""
+        for task in (self._task, self._purge_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = None
+        self._purge_task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.debug(f"Error reading cache generation: {e}")
+            else:
+                if self._purged_generation < self.generation:
+                    self._schedule_purge()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self) -> int:
+        """
+        Перечитывает поколение из базы
+
+        Returns:
+            Текущее поколение
+        """
+        generation = await self._get_repository().get_generation()
+        if generation != self.generation:
+            logger.info(f"Cache generation changed: {self.generation} -> {generation}")
+            self.generation = generation
+            for callback in self._listeners:
+                try:
+                    callback(generation)
+                except Exception as e:
+                    logger.error(f"Cache generation listener failed: {e}")
+        return generation
+
+    async def bump(self) -> int:
+        """
+        Делает недействительными все записи кэша
+
+        Returns:
+            Количество записей, ожидающих фонового удаления
+        """
+        generation, entries = await self._get_repository().bump_generation()
+        self.generation = generation
+        self.bumps += 1
+        self._schedule_purge()
+        return entries
+
+    def _schedule_purge(self) -> None:
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.get_running_loop().create_task(self._purge())
+
+    async def _purge(self) -> None:
+        repository = self._get_repository()
+        dropped_generation = -1
+        while True:
+            generation = self.generation
+            try:
+                if dropped_generation != generation:
+                    # Секции старых поколений удаляются целиком, порциями - только остаток
+                    dropped = await repository.drop_stale_partitions(generation)
+                    dropped_generation = generation
+                    if dropped:
+                        self.purged_entries += dropped
+                        cache_stats_service.record(EVICTIONS, dropped)
+                deleted = await repository.purge_stale_entries(generation, self.purge_chunk_size)
+            except Exception as e:
+                # Повтор при следующем чтении поколения
+                self.purge_failures += 1
+                logger.warning(f"Error purging stale cache entries: {e}")
+                return
+
+            if deleted:
+                self.purged_entries += deleted
+                cache_stats_service.record(EVICTIONS, deleted)
+            if deleted < self.purge_chunk_size:
+                self._purged_generation = generation
+                if generation == self.generation:
+                    return
+            await asyncio.sleep(self.purge_pause)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики инвалидации кэша
+
+        Returns:
+            Текущее поколение, состояние фонового удаления и счетчики процесса
+        """
+        return {
+            "generation": self.generation,
+            "purging": self._purge_task is not None and not self._purge_task.done(),
+            "bumps": self.bumps,
+            "purged_entries": self.purged_entries,
+            "refresh_failures": self.refresh_failures,
+            "purge_failures": self.purge_failures
+        }
+
+
+# Поколение кэша процесса
+cache_generation_service = CacheGenerationService()
@@ -1,7 +1,12 @@
 import hashlib
 import json
-from typing import Optional, Dict, Any
+import orjson
+from typing import Optional, Dict, Any, List, Sequence, Tuple
 from app.repositories.cache_repository import CacheRepository
+from app.services.cache_generation_service import cache_generation_service
+from app.services.cache_stats_service import cache_stats_service, EVICTIONS, HITS, HOT_HITS, MISSES, WRITES
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.shared_cache import shared_polygon_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,8 +15,39 @@ logger = logging.getLogger(__name__)
 class CacheService:
     def __init__(self):
         self.repository = CacheRepository()
+        self._listeners: List[Any] = []
+        # Горячие полигоны в разделяемой памяти проверяются до обращения к базе
+        self.hot_cache = shared_polygon_cache
+        self.add_listener(self.hot_cache)
+        cache_generation_service.add_listener(self._on_generation_change)
     
-    def _generate_cache_key(self, lat: float, lon: float, radius_meters: float) -> str:
+    def add_listener(self, listener: Any) -> None:
+        """
+        Подписывает компонент на изменения кэша (пространственный индекс, кэш тайлов)
+        
+        Слушатель может реализовать любые из методов:
+        on_cache_write(cache_key, lat, lon, radius_meters, polygon_json, area),
+        on_cache_delete(cache_key), on_cache_clear() и on_cache_generation(generation) -
+        кэш очищен другим процессом (горячий кэш в разделяемой памяти его не получает:
+        ключи содержат поколение, а общий сегмент очищает процесс, сменивший поколение).
+        """
+        self._listeners.append(listener)
+    
+    def _notify(self, event: str, *args) -> None:
+        for listener in self._listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                # Ошибка слушателя не должна влиять на запись в кэш
+                logger.error(f"Cache listener {type(listener).__name__}.{event} failed: {e}")
+    
+    def _on_generation_change(self, generation: int) -> None:
+        self._notify("on_cache_generation", generation)
+    
+    def _generate_cache_key(self, lat: float, lon: float, radius_meters: float, options: Optional[Dict] = None) -> str:
         """
         Генерирует ключ кэша на основе параметров запроса
         
@@ -19,6 +55,7 @@ class CacheService:
             lat: широта
             lon: долгота
             radius_meters: радиус в метрах
+            options: параметры построения (segments, precision, simplify_tolerance)
             
         Returns:
             Хэш ключ для кэша
@@ -28,10 +65,22 @@ class CacheService:
             "lon": round(lon, 6), 
             "radius": round(radius_meters, 2)
         }
+        # В ключ попадают только параметры, отличные от умолчаний, поэтому прежние ключи не меняются
+        for name, value in (options or {}).items():
+            if value is not None:
+                data[name] = value
+        # Смена поколения меняет все ключи (поколение 0 не добавляется, ключи до инвалидаций прежние)
+        if cache_generation_service.generation:
+            data["generation"] = cache_generation_service.generation
         json_str = json.dumps(data, sort_keys=True)
         return hashlib.sha256(json_str.encode()).hexdigest()
     
-    async def get_cached_polygon(self, lat: float, lon: float, radius_meters: float) -> Optional[Dict]:
+    def get_cache_key(self, lat: float, lon: float, radius_meters: float, options: Optional[Dict] = None) -> str:
+        """Возвращает ключ кэша для параметров запроса (используется для HTTP-валидаторов)"""
+        return self._generate_cache_key(lat, lon, radius_meters, options)
+    
+    async def get_cached_polygon(self, lat: float, lon: float, radius_meters: float,
+                                 options: Optional[Dict] = None) -> Optional[Dict]:
         """
         Получает полигон из кэша
         
@@ -39,26 +88,50 @@ class CacheService:
             lat: широта
             lon: долгота
             radius_meters: радиус в метрах
+            options: параметры построения полигона
             
         Returns:
-            Кэшированный GeoJSON или None
+            Кэшированный GeoJSON (готовый JSON-фрагмент orjson и исходная строка) или None
         """
-        cache_key = self._generate_cache_key(lat, lon, radius_meters)
+        cache_key = self._generate_cache_key(lat, lon, radius_meters, options)
+        
+        hot_entry = self.hot_cache.get(cache_key)
+        if hot_entry is not None:
+            polygon_json, area = hot_entry
+            logger.debug("Shared memory cache hit for key: %s", cache_key)
+            cache_stats_service.record(HITS)
+            cache_stats_service.record(HOT_HITS)
+            return {
+                "polygon": orjson.Fragment(polygon_json),
+                "polygon_json": polygon_json,
+                "area": area
+            }
+        
+        try:
+            cache_entry = await self.repository.get_by_cache_key(cache_key)
+        except CircuitOpenError:
+            logger.debug("Cache circuit is open, treating lookup as miss for key: %s", cache_key)
+            cache_stats_service.record(MISSES)
+            return None
+        except Exception as e:
+            # Недоступный кэш не должен ломать построение полигона
+            logger.error(f"Error reading polygon from cache: {e}")
+            cache_stats_service.record(MISSES)
+            return None
         
-        cache_entry = await self.repository.get_by_cache_key(cache_key)
         if cache_entry:
-            try:
-                polygon_data = json.loads(cache_entry.polygon_data)
-                logger.info(f"Cache hit for coordinates ({lat}, {lon}) with radius {radius_meters}m")
-                return {
-                    "polygon": polygon_data,
-                    "area": cache_entry.area_sqm
-                }
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing cached polygon data: {e}")
-                return None
+            logger.info("Cache hit for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+            self.hot_cache.put(cache_key, cache_entry.polygon_data, cache_entry.area_sqm)
+            cache_stats_service.record(HITS)
+            # Сохраненный GeoJSON отдается клиенту как есть, без разбора и повторной сериализации
+            return {
+                "polygon": orjson.Fragment(cache_entry.polygon_data),
+                "polygon_json": cache_entry.polygon_data,
+                "area": cache_entry.area_sqm
+            }
         
-        logger.debug(f"Cache miss for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+        logger.debug("Cache miss for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+        cache_stats_service.record(MISSES)
         return None
     def get_cashed_data(self, lat: float, lon: float, radius_meters: float) -> Optional[Dict]:
         """
@@ -76,13 +149,14 @@ class CacheService:
         
         cache_entry = self.repository.get_by_cache_key(cache_key)
         if cache_entry:
-            logger.info(f"Cache hit for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+            logger.info("Cache hit for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
             return cache_entry
-        logger.debug(f"Cache miss for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+        logger.debug("Cache miss for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
         return None
 
 
-    async def cache_polygon(self, lat: float, lon: float, radius_meters: float, polygon_data: Dict, area: float) -> None:
+    async def cache_polygon(self, lat: float, lon: float, radius_meters: float, polygon_data: Dict, area: float,
+                            options: Optional[Dict] = None) -> None:
         """
         Сохраняет полигон в кэш
         
@@ -92,41 +166,249 @@ class CacheService:
             radius_meters: радиус в метрах
             polygon_data: GeoJSON полигон
             area: площадь полигона
+            options: параметры построения полигона
         """
-        cache_key = self._generate_cache_key(lat, lon, radius_meters)
+        cache_key = self._generate_cache_key(lat, lon, radius_meters, options)
         
         try:
-            await self.repository.create_cache_entry(
+            cache_entry = await self.repository.create_cache_entry(
                 cache_key=cache_key,
                 lat=lat,
                 lon=lon,
                 radius_meters=radius_meters,
                 polygon_data=polygon_data,
-                area=area
+                area=area,
+                generation=cache_generation_service.generation
             )
-            logger.info(f"Cached polygon for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+            logger.info("Cached polygon for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+        except CircuitOpenError:
+            logger.debug("Cache circuit is open, skipping cache write for key: %s", cache_key)
+            self._store_hot(cache_key, polygon_data, area)
+            return
         except Exception as e:
             logger.error(f"Error caching polygon: {e}")
+            self._store_hot(cache_key, polygon_data, area)
+            return
+        
+        cache_stats_service.record(WRITES)
+        self._notify("on_cache_write", cache_key, lat, lon, radius_meters, cache_entry.polygon_data, area)
+    
+    async def find_cached_polygon(self, lat: float, lon: float, radius_meters: float,
+                                  options: Optional[Dict] = None, primary: bool = True) -> Optional[Dict]:
+        """
+        Ищет полигон в кэше без построения: в разделяемой памяти, затем в базе
+        
+        В отличие от get_cached_polygon ошибки базы не считаются промахом, а передаются
+        вызывающему, и промах не учитывается в статистике (его учтет построение).
+        
+        Args:
+            lat: широта
+            lon: долгота
+            radius_meters: радиус в метрах
+            options: параметры построения полигона
+            primary: читать основную базу (промах реплики перечитывается в ней);
+                False - только реплики, промах перепроверит функция lookup_or_create
+            
+        Returns:
+            Результат в формате lookup_or_create_polygon или None (промах)
+            
+        Raises:
+            CircuitOpenError: если circuit breaker кэша разомкнут
+        """
+        cache_key = self._generate_cache_key(lat, lon, radius_meters, options)
+        
+        hot_entry = self.hot_cache.get(cache_key)
+        if hot_entry is not None:
+            polygon_json, area = hot_entry
+            logger.debug("Shared memory cache hit for key: %s", cache_key)
+            cache_stats_service.record(HITS)
+            cache_stats_service.record(HOT_HITS)
+            return {"polygon": orjson.Fragment(polygon_json), "polygon_json": polygon_json, "cached": True, "area": area}
+        
+        if primary or self.repository.reads_from_replicas:
+            cache_entry = await self.repository.get_by_cache_key(cache_key, primary_fallback=primary)
+            if cache_entry:
+                logger.info("Cache hit for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+                self.hot_cache.put(cache_key, cache_entry.polygon_data, cache_entry.area_sqm)
+                cache_stats_service.record(HITS)
+                return {
+                    "polygon": orjson.Fragment(cache_entry.polygon_data),
+                    "polygon_json": cache_entry.polygon_data,
+                    "cached": True,
+                    "area": cache_entry.area_sqm
+                }
+        return None
+    
+    async def lookup_or_create_polygon(self, lat: float, lon: float, radius_meters: float,
+                                       options: Optional[Dict] = None, check_cached: bool = True) -> Dict:
+        """
+        Получает полигон из кэша, а при промахе строит и сохраняет его в базе одним запросом
+        
+        Args:
+            lat: широта
+            lon: долгота
+            radius_meters: радиус в метрах
+            options: параметры построения полигона
+            check_cached: сначала проверить разделяемую память и реплики (False - кэш уже
+                проверен вызывающим)
+            
+        Returns:
+            GeoJSON (готовый JSON-фрагмент orjson и исходная строка), площадь и признак попадания в кэш
+            
+        Raises:
+            CircuitOpenError: если circuit breaker кэша разомкнут
+        """
+        if check_cached:
+            # Попадание обслуживает реплика; промах перепроверит сама функция в основной базе
+            cached_result = await self.find_cached_polygon(lat, lon, radius_meters, options, primary=False)
+            if cached_result is not None:
+                return cached_result
+        
+        cache_key = self._generate_cache_key(lat, lon, radius_meters, options)
+        options = options or {}
+        polygon_json, area, created = await self.repository.lookup_or_create(
+            cache_key, lat, lon, radius_meters,
+            segments=options.get("segments"),
+            simplify_tolerance=options.get("simplify_tolerance"),
+            precision=options.get("precision"),
+            generation=cache_generation_service.generation
+        )
+        
+        if created:
+            logger.info("Created and cached polygon for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+            cache_stats_service.record(MISSES)
+            cache_stats_service.record(WRITES)
+            self._notify("on_cache_write", cache_key, lat, lon, radius_meters, polygon_json, area)
+        else:
+            logger.info("Cache hit for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+            self.hot_cache.put(cache_key, polygon_json, area)
+            cache_stats_service.record(HITS)
+        return {"polygon": orjson.Fragment(polygon_json), "polygon_json": polygon_json, "cached": not created, "area": area}
+    
+    async def get_cached_polygons(self, requests: Sequence[Tuple[float, float, float, Optional[Dict]]]) -> Dict[str, Dict]:
+        """
+        Получает полигоны из кэша для набора точек одним запросом к базе
+        
+        Сначала проверяется кэш в разделяемой памяти, оставшиеся ключи ищутся в базе
+        одним запросом.
+        
+        Args:
+            requests: кортежи (lat, lon, radius_meters, options)
+            
+        Returns:
+            Найденные полигоны по ключу кэша (get_cache_key), промахов в словаре нет
+        """
+        results: Dict[str, Dict] = {}
+        missing: List[str] = []
+        requested = set()
+        for lat, lon, radius_meters, options in requests:
+            cache_key = self._generate_cache_key(lat, lon, radius_meters, options)
+            if cache_key in requested:
+                continue
+            requested.add(cache_key)
+            hot_entry = self.hot_cache.get(cache_key)
+            if hot_entry is None:
+                missing.append(cache_key)
+                continue
+            polygon_json, area = hot_entry
+            results[cache_key] = {"polygon": orjson.Fragment(polygon_json), "polygon_json": polygon_json, "area": area}
+        hot_hits = len(results)
+        
+        try:
+            found = await self.repository.get_many(missing)
+        except CircuitOpenError:
+            logger.debug("Cache circuit is open, treating lookup of %s keys as misses", len(missing))
+            found = {}
+        except Exception as e:
+            # Недоступный кэш не должен ломать построение полигонов
+            logger.error(f"Error reading polygons from cache: {e}")
+            found = {}
+        
+        for cache_key, (polygon_json, area) in found.items():
+            self.hot_cache.put(cache_key, polygon_json, area)
+            results[cache_key] = {"polygon": orjson.Fragment(polygon_json), "polygon_json": polygon_json, "area": area}
+        
+        cache_stats_service.record(HITS, len(results))
+        cache_stats_service.record(HOT_HITS, hot_hits)
+        cache_stats_service.record(MISSES, len(missing) - len(found))
+        logger.debug("Cache lookup for %s keys: %s hits (%s in shared memory)", len(requested), len(results), hot_hits)
+        return results
+    
+    async def cache_polygons(self, polygons: Sequence[Tuple[float, float, float, Dict, float, Optional[Dict]]]) -> None:
+        """
+        Сохраняет набор полигонов в кэш одним запросом к базе
+        
+        Args:
+            polygons: кортежи (lat, lon, radius_meters, polygon_data, area, options)
+        """
+        entries = [
+            {
+                "cache_key": self._generate_cache_key(lat, lon, radius_meters, options),
+                "lat": lat,
+                "lon": lon,
+                "radius_meters": radius_meters,
+                "polygon_data": polygon_data,
+                "area": area
+            }
+            for lat, lon, radius_meters, polygon_data, area, options in polygons
+        ]
+        
+        try:
+            stored = await self.repository.put_many(entries, generation=cache_generation_service.generation)
+            logger.info("Cached %s polygons", len(stored))
+        except Exception as e:
+            if isinstance(e, CircuitOpenError):
+                logger.debug("Cache circuit is open, skipping cache write of %s polygons", len(entries))
+            else:
+                logger.error(f"Error caching polygons: {e}")
+            for entry in entries:
+                self._store_hot(entry["cache_key"], entry["polygon_data"], entry["area"])
+            return
+        
+        cache_stats_service.record(WRITES, len(stored))
+        for entry in entries:
+            polygon_json = stored.pop(entry["cache_key"], None)
+            if polygon_json is not None:
+                self._notify(
+                    "on_cache_write", entry["cache_key"], entry["lat"], entry["lon"], entry["radius_meters"],
+                    polygon_json, entry["area"]
+                )
+    
+    def _store_hot(self, cache_key: str, polygon_data: Dict, area: float) -> None:
+        # Без базы полигон остается хотя бы в разделяемой памяти, чтобы воркеры не строили его заново
+        if self.hot_cache.attached:
+            self.hot_cache.put(cache_key, orjson.dumps(polygon_data, option=orjson.OPT_SERIALIZE_NUMPY).decode(), area)
+    
+    async def warm_up(self) -> bool:
+        """
+        Прогревает кэш перед приемом трафика
+        
+        Returns:
+            True если хранилище кэша доступно
+        """
+        return await self.repository.ping()
     
     async def get_cache_stats(self) -> Dict[str, Any]:
         """
-        Получает статистику кэша
+        Получает статистику кэша (без сканирования таблицы)
         
         Returns:
             Статистика кэша
         """
-        return await self.repository.get_cache_stats()
+        return await cache_stats_service.get_stats()
     
     async def clear_cache(self) -> int:
         """
-        Очищает весь кэш
+        Очищает весь кэш сменой поколения (записи удаляются из базы в фоне)
         
         Returns:
-            Количество удаленных записей
+            Количество недействительных записей
         """
-        return await self.repository.clear_cache()
+        invalidated_count = await cache_generation_service.bump()
+        self._notify("on_cache_clear")
+        return invalidated_count
     
-    def delete_cache_entry(self, lat: float, lon: float, radius_meters: float) -> bool:
+    def delete_cache_entry(self, lat: float, lon: float, radius_meters: float, options: Optional[Dict] = None) -> bool:
         """
         Удаляет конкретную запись кэша
         
@@ -134,9 +416,14 @@ class CacheService:
             lat: широта
             lon: долгота
             radius_meters: радиус в метрах
+            options: параметры построения полигона
             
         Returns:
             True если запись была удалена
         """
-        cache_key = self._generate_cache_key(lat, lon, radius_meters)
-        return self.repository.delete_by_cache_key(cache_key) 
\ No newline at end of file
+        cache_key = self._generate_cache_key(lat, lon, radius_meters, options)
+        deleted = self.repository.delete_by_cache_key(cache_key)
+        if deleted:
+            cache_stats_service.record(EVICTIONS)
+            self._notify("on_cache_delete", cache_key)
+        return deleted 
\ No newline at end of file
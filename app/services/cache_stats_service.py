@@ -0,0 +1,136 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Optional
+from app.config import get_cache_stats_config
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+HITS = "hits"
+HOT_HITS = "hot_hits"
+MISSES = "misses"
+WRITES = "writes"
+EVICTIONS = "evictions"
+
+
+class CacheStatsService:
+    """
+    Статистика кэша без сканирования таблицы
+
+    Попадания, промахи, записи и вытеснения считаются в памяти процесса и
+    периодически прибавляются к таблице cache_counters одним upsert, поэтому
+    значения в ней общие для всех воркеров. Количество записей и гистограмма
+    радиусов поддерживаются триггерами на cache_entries. Чтение статистики -
+    несколько строк независимо от размера кэша.
+    """
+
+    def __init__(self):
+        self.config = get_cache_stats_config()
+        self.flush_interval = self.config.get('flush_interval', 5.0)
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._totals: Dict[str, int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+        self._repository = None
+        self.flush_failures = 0
+        metrics.register_collector("cache_stats", self.get_metrics)
+
+    def _get_repository(self):
+        # Репозиторий тянет SQLAlchemy, поэтому создается при первом обращении к базе
+        if self._repository is None:
+            from app.repositories.cache_repository import CacheRepository
+            self._repository = CacheRepository()
+        return self._repository
+
+    def record(self, name: str, value: int = 1) -> None:
+        """
+        Увеличивает счетчик кэша
+
+        Args:
+            name: имя счетчика (hits, hot_hits, misses, writes, evictions)
+            value: прирост
+        """
+        if value:
+            self._pending[name] += value
+            self._totals[name] += value
+
+    def start(self) -> None:
+        """Запускает периодический сброс счетчиков в базу"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает сброс и сохраняет накопленные значения"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """
+        Прибавляет накопленные значения к счетчикам в базе
+
+        Returns:
+            True если значения сохранены (при ошибке они остаются до следующего сброса)
+        """
+        if not self._pending:
+            return True
+
+        pending, self._pending = self._pending, defaultdict(int)
+        try:
+            await self._get_repository().add_counters(dict(pending))
+        except Exception as e:
+            for name, value in pending.items():
+                self._pending[name] += value
+            self.flush_failures += 1
+            logger.debug(f"Error flushing cache counters: {e}")
+            return False
+        return True
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику кэша
+
+        Returns:
+            Количество записей, гистограмма радиусов, счетчики и доля попаданий
+        """
+        stats = await self._get_repository().get_cache_stats()
+        counters = stats.pop("counters")
+        # Еще не сброшенные значения этого процесса
+        for name, value in self._pending.items():
+            counters[name] = counters.get(name, 0) + value
+
+        hits = counters.get(HITS, 0)
+        misses = counters.get(MISSES, 0)
+        stats.update({
+            HITS: hits,
+            HOT_HITS: counters.get(HOT_HITS, 0),
+            MISSES: misses,
+            WRITES: counters.get(WRITES, 0),
+            EVICTIONS: counters.get(EVICTIONS, 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else None
+        })
+        return stats
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики кэша этого процесса
+
+        Returns:
+            Значения с момента запуска и еще не сброшенные в базу
+        """
+        return {
+            "totals": dict(self._totals),
+            "pending": dict(self._pending),
+            "flush_failures": self.flush_failures
+        }
+
+
+# Счетчики кэша процесса
+cache_stats_service = CacheStatsService()
@@ -0,0 +1,198 @@
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+from app.config import get_circuit_breaker_config
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Вызов отклонен, так как цепь разомкнута"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для внешней зависимости
+
+    В состоянии closed вызовы проходят, ошибки и слишком медленные вызовы считаются подряд.
+    При достижении порога цепь размыкается (open) и вызовы сразу отклоняются.
+    По истечении open_seconds пропускается ограниченное число пробных вызовов (half_open):
+    успех замыкает цепь, ошибка снова размыкает. Отмененный пробный вызов (таймаут
+    вызывающего, остановка) освобождает свое место, а пробы, не завершившиеся за
+    half_open_timeout, перестают учитываться: полуоткрытое состояние начинается заново.
+
+    Каждая смена состояния увеличивает номер эпохи; результат вызова, начатого в
+    прежней эпохе (например, успех запроса, отправленного до размыкания), не учитывается,
+    поэтому разомкнутую цепь замыкает только пробный вызов.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.config = get_circuit_breaker_config()
+        self.failure_threshold = max(1, self.config.get('failure_threshold', 5))
+        self.latency_threshold = self.config.get('latency_threshold', 2.0)
+        self.open_seconds = self.config.get('open_seconds', 30.0)
+        self.half_open_max_calls = max(1, self.config.get('half_open_max_calls', 1))
+        self.half_open_timeout = self.config.get('half_open_timeout', 30.0)
+        self.state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_at = 0.0
+        self._epoch = 0
+        metrics.register_collector(f"circuit_breaker_{name}", self.get_state)
+
+    def allow_request(self) -> bool:
+        """
+        Проверяет, можно ли выполнить вызов
+
+        Returns:
+            True если вызов разрешен
+        """
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self._transition(CircuitState.HALF_OPEN)
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                if time.monotonic() - self._half_open_at < self.half_open_timeout:
+                    return False
+                # Зависшие пробы не освободили места - их результат больше не учитывается
+                logger.warning(f"Circuit breaker '{self.name}' half-open probes timed out")
+                self._transition(CircuitState.HALF_OPEN)
+            self._half_open_calls += 1
+
+        return True
+
+    @property
+    def is_open(self) -> bool:
+        """True если вызовы сейчас отклоняются"""
+        return self.state == CircuitState.OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    @property
+    def epoch(self) -> int:
+        """Номер эпохи: увеличивается при каждой смене состояния"""
+        return self._epoch
+
+    def record_success(self, epoch: Optional[int] = None) -> None:
+        """
+        Учитывает успешный вызов
+
+        Args:
+            epoch: эпоха начала вызова (None - результат учитывается всегда)
+        """
+        if epoch is not None and epoch != self._epoch:
+            return
+        self._consecutive_failures = 0
+        if self.state != CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self, epoch: Optional[int] = None) -> None:
+        """
+        Учитывает неудачный (или слишком медленный) вызов
+
+        Args:
+            epoch: эпоха начала вызова (None - результат учитывается всегда)
+        """
+        if epoch is not None and epoch != self._epoch:
+            return
+        self._consecutive_failures += 1
+        metrics.increment(f"circuit_breaker_{self.name}_failures")
+        if self.state == CircuitState.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._transition(CircuitState.OPEN)
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Выполняет асинхронный вызов под защитой circuit breaker
+
+        Args:
+            func: функция, возвращающая awaitable
+            *args: аргументы функции
+            **kwargs: именованные аргументы функции
+
+        Returns:
+            Результат вызова
+
+        Raises:
+            CircuitOpenError: если цепь разомкнута
+        """
+        if not self.allow_request():
+            metrics.increment(f"circuit_breaker_{self.name}_rejected")
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is open")
+
+        epoch = self._epoch
+        started_at = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record_failure(epoch)
+            raise
+        except BaseException:
+            # Отмена ничего не говорит о зависимости: место пробного вызова освобождается
+            self._release_probe(epoch)
+            raise
+
+        duration = time.monotonic() - started_at
+        if duration > self.latency_threshold:
+            logger.warning(f"Slow call through circuit breaker '{self.name}': {duration:.2f}s")
+            self.record_failure(epoch)
+        else:
+            self.record_success(epoch)
+        return result
+
+    def _release_probe(self, epoch: int) -> None:
+        if self.state == CircuitState.HALF_OPEN and epoch == self._epoch and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _transition(self, state: CircuitState) -> None:
+        previous_state = self.state
+        self.state = state
+        self._half_open_calls = 0
+        self._epoch += 1
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+        if state == CircuitState.HALF_OPEN:
+            self._half_open_at = time.monotonic()
+        if state == CircuitState.CLOSED:
+            self._consecutive_failures = 0
+        metrics.increment(f"circuit_breaker_{self.name}_{state.value}")
+        logger.warning(f"Circuit breaker '{self.name}' changed state: {previous_state.value} -> {state.value}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Возвращает текущее состояние
+
+        Returns:
+            Состояние цепи, счетчик ошибок и пороги
+        """
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "latency_threshold_seconds": self.latency_threshold,
+            "open_seconds": self.open_seconds
+        }
+
+
+# Circuit breaker'ы репозиториев
+postgis_breaker = CircuitBreaker("postgis")
+cache_breaker = CircuitBreaker("cache")
+
+
+def get_circuit_breakers_state() -> Dict[str, Dict[str, Any]]:
+    """
+    Возвращает состояние всех circuit breaker'ов
+
+    Returns:
+        Словарь имя -> состояние
+    """
+    return {breaker.name: breaker.get_state() for breaker in (postgis_breaker, cache_breaker)}
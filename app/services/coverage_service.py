@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional, Tuple
+from app.services.geometry_service import GeometryService, geometry_to_geojson, round_coordinates
+from app.services.geometry_executor import geometry_executor, compute_coverage_part, merge_coverage_parts
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.profiling_service import profile_stage
+from app.repositories.postgis_repository import PostgisRepository
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CoverageService:
+    """
+    Объединение покрытия из множества кругов
+
+    Круги строятся и объединяются в пуле геометрических вычислений: каждый чанк
+    объединяется в своем воркере (shapely.union_all), затем части объединяются
+    в одну геометрию. Опционально объединение выполняется в PostGIS (ST_Union).
+    """
+
+    def __init__(self):
+        self.geometry_service = GeometryService()
+        self.postgis_repository = PostgisRepository()
+        self.max_circles = self.geometry_service.config.get('max_coverage_circles', 1000)
+
+    async def build_coverage(self, circles: List[Tuple[float, float, float]], segments: Optional[int] = None,
+                             precision: Optional[int] = None, use_postgis: bool = False) -> Dict:
+        """
+        Строит объединение кругов и считает покрытую площадь
+
+        Args:
+            circles: кортежи (lat, lon, radius_meters)
+            segments: количество сегментов на четверть окружности
+            precision: знаков после запятой в координатах
+            use_postgis: объединять силами PostGIS (при ошибке - локально)
+
+        Returns:
+            Словарь с GeoJSON геометрией объединения, площадью и движком, выполнившим объединение
+        """
+        self._validate(circles, segments)
+
+        if precision is None:
+            precision = self.geometry_service.config.get('coordinate_precision')
+
+        result = None
+        engine = "local"
+        if use_postgis:
+            result = await self._build_with_postgis(circles, segments)
+            if result is not None:
+                engine = "postgis"
+        if result is None:
+            result = await self._build_locally(circles, segments)
+
+        logger.info(f"Built coverage of {len(circles)} circles with {engine} engine, area {result['area_sqm']:.2f} m²")
+        return {
+            "geometry": round_coordinates(result["geometry"], precision),
+            "area_sqm": result["area_sqm"],
+            "engine": engine
+        }
+
+    def _validate(self, circles: List[Tuple[float, float, float]], segments: Optional[int]) -> None:
+        if not circles:
+            raise ValueError("Не переданы круги покрытия")
+        if len(circles) > self.max_circles:
+            raise ValueError(f"В запросе не больше {self.max_circles} кругов")
+        if not self.geometry_service.validate_segments(segments):
+            raise ValueError("Некорректное количество сегментов")
+        for lat, lon, radius_meters in circles:
+            if not self.geometry_service.validate_coordinates(lat, lon):
+                raise ValueError("Некорректные координаты")
+            if not self.geometry_service.validate_radius(radius_meters):
+                raise ValueError("Некорректный радиус")
+
+    async def _build_locally(self, circles: List[Tuple[float, float, float]], segments: Optional[int]) -> Dict:
+        chunk_size = geometry_executor.chunk_size
+        parts_args = [(circles[i:i + chunk_size], segments) for i in range(0, len(circles), chunk_size)]
+
+        with profile_stage("coverage_parts"):
+            parts = await geometry_executor.map_chunked(compute_coverage_part, parts_args, chunk_size=1)
+        with profile_stage("coverage_merge"):
+            return await geometry_executor.run(merge_coverage_parts, parts)
+
+    async def _build_with_postgis(self, circles: List[Tuple[float, float, float]],
+                                  segments: Optional[int]) -> Optional[Dict]:
+        try:
+            with profile_stage("postgis_coverage"):
+                db_result = await self.postgis_repository.union_circles(circles, segments)
+        except CircuitOpenError as e:
+            logger.debug(f"PostGIS circuit is open, building coverage locally: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error building coverage in db: {e}")
+            return None
+        return {
+            "geometry": geometry_to_geojson(db_result["geometry"]),
+            "area_sqm": db_result["area_sqm"]
+        }
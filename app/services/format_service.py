@@ -0,0 +1,290 @@
+import io
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+import logging
+
+if TYPE_CHECKING:
+    import numpy as np
+    from shapely.geometry.base import BaseGeometry
+
+logger = logging.getLogger(__name__)
+
+GEOJSON = "geojson"
+WKB = "wkb"
+TWKB = "twkb"
+FLATGEOBUF = "flatgeobuf"
+PROTOBUF = "protobuf"
+
+MEDIA_TYPES = {
+    GEOJSON: "application/geo+json",
+    WKB: "application/wkb",
+    TWKB: "application/twkb",
+    FLATGEOBUF: "application/flatgeobuf",
+    PROTOBUF: "application/x-protobuf",
+}
+
+# Соответствие media type из заголовка Accept и значения параметра format формату ответа
+_ACCEPT_ALIASES = {
+    "application/geo+json": GEOJSON,
+    "application/json": GEOJSON,
+    "application/wkb": WKB,
+    "application/vnd.geo.wkb": WKB,
+    "application/twkb": TWKB,
+    "application/flatgeobuf": FLATGEOBUF,
+    "application/x-protobuf": PROTOBUF,
+    "application/protobuf": PROTOBUF,
+}
+_FORMAT_ALIASES = {
+    "geojson": GEOJSON,
+    "json": GEOJSON,
+    "wkb": WKB,
+    "twkb": TWKB,
+    "fgb": FLATGEOBUF,
+    "flatgeobuf": FLATGEOBUF,
+    "protobuf": PROTOBUF,
+    "pb": PROTOBUF,
+}
+
+SINGLE_FORMATS = (GEOJSON, WKB, TWKB, PROTOBUF)
+BATCH_FORMATS = (GEOJSON, FLATGEOBUF, PROTOBUF)
+
+# Точность TWKB по умолчанию (7 знаков - около 1 см) и допустимый максимум формата
+TWKB_DEFAULT_PRECISION = 7
+TWKB_MAX_PRECISION = 7
+
+
+class UnsupportedFormatError(ValueError):
+    """Запрошенный формат ответа не поддерживается"""
+
+
+class FormatService:
+    """
+    Кодирование полигонов в бинарные форматы: WKB, TWKB, FlatGeobuf и protobuf
+
+    Полигон берется из результата PolygonService: либо GeoJSON со NumPy-координатами
+    после построения, либо сохраненная в кэше JSON-строка. В обоих случаях геометрия
+    не перестраивается, а только разбирается и перекодируется.
+    
+    Модуль импортируется вместе с роутами, поэтому shapely и numpy загружаются
+    только при первом кодировании в бинарный формат.
+    """
+
+    def negotiate(self, accept: Optional[str], format_param: Optional[str], batch: bool = False) -> str:
+        """
+        Определяет формат ответа по параметру format или заголовку Accept
+
+        Args:
+            accept: заголовок Accept
+            format_param: значение параметра format (имеет приоритет)
+            batch: ответ для пакетного запроса
+
+        Returns:
+            Имя формата
+
+        Raises:
+            UnsupportedFormatError: если формат не поддерживается
+        """
+        allowed = BATCH_FORMATS if batch else SINGLE_FORMATS
+
+        if format_param:
+            fmt = _FORMAT_ALIASES.get(format_param.lower())
+            if fmt not in allowed:
+                raise UnsupportedFormatError(f"Формат {format_param} не поддерживается")
+            return fmt
+
+        if not accept:
+            return GEOJSON
+
+        for media_range in accept.split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in ("*/*", "application/*"):
+                return GEOJSON
+            fmt = _ACCEPT_ALIASES.get(media_type)
+            if fmt in allowed:
+                return fmt
+
+        raise UnsupportedFormatError(f"Ни один из форматов {accept} не поддерживается")
+
+    @staticmethod
+    def to_geometry(result: Dict) -> "BaseGeometry":
+        """
+        Возвращает геометрию shapely из результата PolygonService без повторного построения
+
+        Args:
+            result: результат create_polygon
+
+        Returns:
+            Полигон shapely
+        """
+        import shapely
+        from shapely.geometry import shape
+
+        polygon_json = result.get("polygon_json")
+        if polygon_json is not None:
+            return shapely.from_geojson(polygon_json)
+        return shape(result["polygon"])
+
+    def encode_feature(self, fmt: str, result: Dict, properties: Dict[str, Any],
+                       precision: Optional[int] = None) -> bytes:
+        """
+        Кодирует один полигон в бинарный формат
+
+        Args:
+            fmt: формат (wkb, twkb, protobuf)
+            result: результат create_polygon
+            properties: свойства объекта (center, radius, area_sqm, cached)
+            precision: знаков после запятой для TWKB/protobuf
+
+        Returns:
+            Закодированные байты
+        """
+        import shapely
+
+        geometry = self.to_geometry(result)
+        if fmt == WKB:
+            return shapely.to_wkb(geometry)
+        if fmt == TWKB:
+            return encode_twkb(geometry, self._twkb_precision(precision))
+        if fmt == PROTOBUF:
+            return self._to_protobuf_feature(geometry, properties, precision).SerializeToString()
+        raise UnsupportedFormatError(f"Формат {fmt} не поддерживается для одного полигона")
+
+    def encode_collection(self, fmt: str, results: List[Dict], properties: List[Dict[str, Any]],
+                          precision: Optional[int] = None) -> bytes:
+        """
+        Кодирует набор полигонов в бинарный формат
+
+        Args:
+            fmt: формат (flatgeobuf, protobuf)
+            results: результаты create_polygon
+            properties: свойства объектов в том же порядке
+            precision: знаков после запятой для protobuf
+
+        Returns:
+            Закодированные байты
+        """
+        geometries = [self.to_geometry(result) for result in results]
+        if fmt == FLATGEOBUF:
+            return self._to_flatgeobuf(geometries, properties)
+        if fmt == PROTOBUF:
+            from app.proto.messages import PolygonFeatureCollection
+            collection = PolygonFeatureCollection()
+            for geometry, feature_properties in zip(geometries, properties):
+                collection.features.append(self._to_protobuf_feature(geometry, feature_properties, precision))
+            return collection.SerializeToString()
+        raise UnsupportedFormatError(f"Формат {fmt} не поддерживается для набора полигонов")
+
+    @staticmethod
+    def _twkb_precision(precision: Optional[int]) -> int:
+        if precision is None:
+            return TWKB_DEFAULT_PRECISION
+        return min(precision, TWKB_MAX_PRECISION)
+
+    def _to_protobuf_feature(self, geometry: "BaseGeometry", properties: Dict[str, Any], precision: Optional[int]):
+        import numpy as np
+        import shapely
+        from app.proto.messages import PolygonFeature
+
+        precision = self._twkb_precision(precision)
+        rings = [geometry.exterior, *geometry.interiors]
+        coords = np.concatenate([shapely.get_coordinates(ring) for ring in rings])
+        center_lon, center_lat = properties["center"]
+        return PolygonFeature(
+            center_lon=center_lon,
+            center_lat=center_lat,
+            radius=properties["radius"],
+            area_sqm=properties["area_sqm"],
+            cached=properties["cached"],
+            precision=precision,
+            ring_sizes=[len(ring.coords) for ring in rings],
+            coords=_delta_encode(coords, precision).tolist()
+        )
+
+    @staticmethod
+    def _to_flatgeobuf(geometries: List["BaseGeometry"], properties: List[Dict[str, Any]]) -> bytes:
+        import geopandas as gpd
+        import pyogrio
+
+        frame = gpd.GeoDataFrame(
+            {
+                "center_lon": [feature["center"][0] for feature in properties],
+                "center_lat": [feature["center"][1] for feature in properties],
+                "radius": [feature["radius"] for feature in properties],
+                "area_sqm": [feature["area_sqm"] for feature in properties],
+                "cached": [feature["cached"] for feature in properties],
+            },
+            geometry=geometries,
+            crs="EPSG:4326"
+        )
+        buffer = io.BytesIO()
+        pyogrio.write_dataframe(frame, buffer, driver="FlatGeobuf", layer="polygons")
+        return buffer.getvalue()
+
+
+def _delta_encode(coords: "np.ndarray", precision: int) -> "np.ndarray":
+    """Переводит координаты в целые со сдвигом 10^precision и кодирует дельтами"""
+    import numpy as np
+
+    scaled = np.round(np.asarray(coords, dtype=float) * (10 ** precision)).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return deltas.reshape(-1)
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def encode_twkb(geometry: "BaseGeometry", precision: int) -> bytes:
+    """
+    Кодирует Polygon или MultiPolygon в TWKB (Tiny Well-known Binary)
+
+    Координаты масштабируются на 10^precision и пишутся zigzag-varint дельтами,
+    дельты продолжаются через границы колец и полигонов.
+
+    Args:
+        geometry: полигон или мультиполигон shapely
+        precision: знаков после запятой (не больше 7)
+
+    Returns:
+        Байты TWKB
+    """
+    import numpy as np
+    import shapely
+
+    if geometry.geom_type == "Polygon":
+        polygons, geometry_type = [geometry], 3
+    elif geometry.geom_type == "MultiPolygon":
+        polygons, geometry_type = list(geometry.geoms), 6
+    else:
+        raise UnsupportedFormatError(f"TWKB для {geometry.geom_type} не поддерживается")
+
+    buffer = bytearray()
+    buffer.append(geometry_type | (_zigzag(precision) << 4))
+    if geometry.is_empty:
+        buffer.append(0x10)
+        return bytes(buffer)
+    buffer.append(0x00)
+
+    if geometry_type == 6:
+        _write_varint(buffer, len(polygons))
+
+    previous = np.zeros(2, dtype=np.int64)
+    for polygon in polygons:
+        rings = [polygon.exterior, *polygon.interiors]
+        _write_varint(buffer, len(rings))
+        for ring in rings:
+            coords = shapely.get_coordinates(ring)
+            scaled = np.round(coords * (10 ** precision)).astype(np.int64)
+            deltas = np.diff(scaled, axis=0, prepend=previous.reshape(1, 2))
+            previous = scaled[-1]
+            _write_varint(buffer, len(scaled))
+            for value in deltas.reshape(-1).tolist():
+                _write_varint(buffer, _zigzag(value))
+
+    return bytes(buffer)
@@ -0,0 +1,284 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from app.config import get_geometry_executor_config
+from app.services.metrics_service import metrics
+from app.services.profiling_service import get_current_profile, run_profiled
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Экземпляр GeometryService внутри воркера, создается один раз на процесс
+_worker_geometry_service = None
+
+
+def _get_worker_geometry_service():
+    global _worker_geometry_service
+    if _worker_geometry_service is None:
+        from app.services.geometry_service import GeometryService
+        _worker_geometry_service = GeometryService()
+    return _worker_geometry_service
+
+
+def compute_circular_polygon(lat: float, lon: float, radius_meters: float, num_points: int = None,
+                             simplify_tolerance: float = None) -> Dict:
+    """
+    Строит круговой полигон и считает его площадь (выполняется в воркере пула)
+
+    Args:
+        lat: широта центральной точки
+        lon: долгота центральной точки
+        radius_meters: радиус в метрах
+        num_points: количество точек для аппроксимации круга
+        simplify_tolerance: допуск упрощения контура в метрах
+
+    Returns:
+        Словарь с GeoJSON геометрией и площадью в квадратных метрах
+    """
+    geometry_service = _get_worker_geometry_service()
+    polygon = geometry_service.create_circular_polygon(lat, lon, radius_meters, num_points, simplify_tolerance)
+    area = geometry_service.calculate_polygon_area(polygon)
+    return {
+        "geometry": polygon,
+        "area_sqm": area
+    }
+
+
+def compute_coverage_part(circles: Sequence[tuple], num_points: int = None):
+    """
+    Строит круги части покрытия и объединяет их (выполняется в воркере пула)
+
+    Args:
+        circles: кортежи (lat, lon, radius_meters)
+        num_points: количество точек для аппроксимации круга
+
+    Returns:
+        Объединение кругов - геометрия shapely
+    """
+    import shapely
+    geometry_service = _get_worker_geometry_service()
+    geometries = [
+        geometry_service.create_circle_geometry(lat, lon, radius_meters, num_points)
+        for lat, lon, radius_meters in circles
+    ]
+    return shapely.union_all(geometries)
+
+
+def merge_coverage_parts(parts: Sequence[Any]) -> Dict:
+    """
+    Объединяет части покрытия и считает площадь (выполняется в воркере пула)
+
+    Args:
+        parts: геометрии shapely, полученные от compute_coverage_part
+
+    Returns:
+        Словарь с GeoJSON геометрией объединения и площадью в квадратных метрах
+    """
+    import shapely
+    from app.services.geometry_service import geometry_to_geojson
+    geometry_service = _get_worker_geometry_service()
+    coverage = shapely.union_all(parts)
+    return {
+        "geometry": geometry_to_geojson(coverage),
+        "area_sqm": geometry_service.calculate_geodesic_area(coverage)
+    }
+
+
+def _warm_up_worker(prewarm_transformers: bool = True) -> int:
+    """Прогревает воркер: импортирует shapely/pyproj, создает трансформеры и строит тестовый полигон"""
+    if prewarm_transformers:
+        _get_worker_geometry_service().prewarm_transformers()
+    compute_circular_polygon(55.7558, 37.6176, 1.0, 4)
+    return os.getpid()
+
+
+def _run_chunk(func: Callable, chunk: Sequence[tuple]) -> List[Any]:
+    """Выполняет функцию для каждого набора аргументов из чанка"""
+    return [func(*args) for args in chunk]
+
+
+class GeometryExecutorOverloadedError(RuntimeError):
+    """Очередь пула геометрических вычислений переполнена"""
+
+
+class GeometryExecutor:
+    """
+    Выделенный пул для CPU-bound геометрии (shapely/pyproj), чтобы не блокировать event loop
+
+    Пул ограничен по количеству ожидающих задач, каждая задача выполняется с таймаутом,
+    пакетные вызовы отправляются в пул чанками.
+    """
+
+    def __init__(self):
+        self.config = get_geometry_executor_config()
+        self.executor_type = self.config.get('executor_type', 'process')
+        self.max_workers = max(1, self.config.get('workers', 2))
+        self.max_pending = self.max_workers + max(0, self.config.get('queue_size', 64))
+        self.task_timeout = self.config.get('task_timeout', 10.0)
+        self.chunk_size = max(1, self.config.get('chunk_size', 32))
+        self.prewarm_transformers = self.config.get('prewarm_transformers', True)
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._warmed_up = False
+        metrics.register_collector("geometry_executor", self.get_metrics)
+
+    def _create_executor(self) -> Executor:
+        if self.executor_type == "thread":
+            # shapely 2.x и pyproj отпускают GIL на тяжелых операциях
+            return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="geometry")
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._create_executor()
+            logger.info(f"Geometry executor started: {self.executor_type} pool with {self.max_workers} workers")
+        return self._executor
+
+    async def start(self) -> None:
+        """Запускает пул и прогревает все воркеры"""
+        executor = self._get_executor()
+        loop = asyncio.get_event_loop()
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(executor, _warm_up_worker, self.prewarm_transformers)
+            for _ in range(self.max_workers)
+        ])
+        self._warmed_up = True
+        logger.info(f"Geometry executor warmed up: {len(set(pids))} worker process(es)")
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        Выполняет функцию в пуле с таймаутом
+
+        Args:
+            func: функция верхнего уровня модуля (должна сериализоваться через pickle)
+            *args: аргументы функции
+
+        Returns:
+            Результат функции
+
+        Raises:
+            GeometryExecutorOverloadedError: если очередь пула переполнена
+            asyncio.TimeoutError: если задача не уложилась в таймаут
+        """
+        self._acquire_slots(1)
+        profile = get_current_profile()
+        submitted_at = time.perf_counter()
+        try:
+            future = self._submit(run_profiled, func, profile is not None, *args)
+        except BaseException:
+            self._pending -= 1
+            raise
+        result, stages, compute_seconds = await self._await_with_timeout(future)
+
+        if profile is not None:
+            # Время ожидания в очереди и передачи данных между процессами
+            profile.add_stage("executor_wait", time.perf_counter() - submitted_at - compute_seconds)
+            profile.add_stages(stages or [], prefix="worker.")
+        return result
+
+    async def map_chunked(self, func: Callable, args_list: Sequence[tuple], chunk_size: int = None) -> List[Any]:
+        """
+        Выполняет функцию для множества наборов аргументов, отправляя их в пул чанками
+
+        Args:
+            func: функция верхнего уровня модуля
+            args_list: список кортежей аргументов
+            chunk_size: размер чанка (по умолчанию из конфигурации)
+
+        Returns:
+            Результаты в порядке исходных аргументов
+        """
+        if not args_list:
+            return []
+
+        chunk_size = chunk_size or self.chunk_size
+        chunks = [args_list[i:i + chunk_size] for i in range(0, len(args_list), chunk_size)]
+
+        self._acquire_slots(len(chunks))
+        futures = []
+        try:
+            for chunk in chunks:
+                futures.append(self._submit(_run_chunk, func, chunk))
+        finally:
+            # Слоты неотправленных чанков (пул остановлен или сломан) освобождаются сразу
+            self._pending -= len(chunks) - len(futures)
+        chunk_results = await asyncio.gather(*[self._await_with_timeout(f) for f in futures])
+
+        metrics.increment("geometry_executor_batch_chunks", len(chunks))
+        return [result for chunk_result in chunk_results for result in chunk_result]
+
+    def _acquire_slots(self, count: int) -> None:
+        if self._pending + count > self.max_pending:
+            metrics.increment("geometry_executor_rejected")
+            raise GeometryExecutorOverloadedError(
+                f"Geometry executor queue is full ({self._pending}/{self.max_pending})"
+            )
+        self._pending += count
+        metrics.increment("geometry_executor_submitted", count)
+
+    def _submit(self, func: Callable, *args) -> asyncio.Future:
+        """
+        Отправляет задачу в пул; слот освобождается, когда задача действительно завершилась
+
+        После таймаута задача, уже выполняющаяся в воркере, продолжает занимать его,
+        поэтому слот остается занятым до ее завершения, а не до отмены ожидания.
+        """
+        loop = asyncio.get_running_loop()
+        concurrent_future = self._get_executor().submit(func, *args)
+
+        def _release(_) -> None:
+            try:
+                loop.call_soon_threadsafe(self._release_slot)
+            except RuntimeError:
+                # Event loop уже закрыт - счетчик больше никому не нужен
+                pass
+
+        concurrent_future.add_done_callback(_release)
+        return asyncio.wrap_future(concurrent_future, loop=loop)
+
+    def _release_slot(self) -> None:
+        self._pending = max(0, self._pending - 1)
+
+    async def _await_with_timeout(self, future: asyncio.Future) -> Any:
+        try:
+            return await asyncio.wait_for(future, timeout=self.task_timeout)
+        except asyncio.TimeoutError:
+            # Задачу в процессе прервать нельзя: еще не начатая отменяется, выполняющаяся
+            # держит свой слот до завершения, результат игнорируется
+            metrics.increment("geometry_executor_timeouts")
+            logger.error(f"Geometry task exceeded timeout of {self.task_timeout}s")
+            raise
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики пула
+
+        Returns:
+            Тип и размер пула, число ожидающих задач и лимит очереди
+        """
+        return {
+            "type": self.executor_type,
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "started": self._executor is not None,
+            "warmed_up": self._warmed_up
+        }
+
+    def shutdown(self) -> None:
+        """Останавливает пул"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._warmed_up = False
+            logger.info("Geometry executor stopped")
+
+
+# Общий пул геометрических вычислений процесса
+geometry_executor = GeometryExecutor()
@@ -1,19 +1,120 @@
 import math
 import logging
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import numpy as np
+import shapely
 from shapely.geometry import Point, Polygon
 from shapely.ops import transform
 import pyproj
 from app.config import get_geometry_config
+from app.services.profiling_service import profile_stage
 
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=None)
+def _get_utm_proj(utm_zone: int, hemisphere: str) -> pyproj.Proj:
+    return pyproj.Proj(f"+proj=utm +zone={utm_zone} +{hemisphere} +ellps=WGS84")
+
+
+@lru_cache(maxsize=None)
+def _get_utm_transformers(utm_zone: int, hemisphere: str) -> Tuple[pyproj.Transformer, pyproj.Transformer]:
+    """Возвращает пару трансформеров WGS84 -> UTM и UTM -> WGS84 для зоны (создаются один раз)"""
+    utm_proj = _get_utm_proj(utm_zone, hemisphere)
+    wgs84_proj = pyproj.Proj('EPSG:4326')
+    return (
+        pyproj.Transformer.from_proj(wgs84_proj, utm_proj, always_xy=True),
+        pyproj.Transformer.from_proj(utm_proj, wgs84_proj, always_xy=True)
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_geod() -> pyproj.Geod:
+    return pyproj.Geod(ellps="WGS84")
+
+
+def polygon_to_geojson(polygon: Polygon) -> Dict:
+    """
+    Конвертирует полигон shapely в GeoJSON, кольца координат - массивы NumPy формы (N, 2)
+    
+    Args:
+        polygon: полигон shapely
+        
+    Returns:
+        GeoJSON полигон
+    """
+    rings = [polygon.exterior, *polygon.interiors]
+    return {
+        "type": "Polygon",
+        "coordinates": [shapely.get_coordinates(ring) for ring in rings]
+    }
+
+
+def geometry_to_geojson(geometry) -> Dict:
+    """
+    Конвертирует Polygon или MultiPolygon shapely в GeoJSON с кольцами - массивами NumPy
+    
+    Args:
+        geometry: полигон или мультиполигон shapely
+        
+    Returns:
+        GeoJSON геометрия
+    """
+    if geometry.geom_type == "Polygon":
+        return polygon_to_geojson(geometry)
+    if geometry.geom_type == "MultiPolygon":
+        return {
+            "type": "MultiPolygon",
+            "coordinates": [polygon_to_geojson(polygon)["coordinates"] for polygon in geometry.geoms]
+        }
+    raise ValueError(f"Unsupported geometry type: {geometry.geom_type}")
+
+
+def round_coordinates(polygon_geojson: Dict, precision: Optional[int]) -> Dict:
+    """
+    Округляет координаты GeoJSON полигона до заданного числа знаков после запятой
+    
+    Координаты привязываются к сетке shapely.set_precision: совпавшие после округления
+    соседние вершины удаляются, а контур остается валидным. Если при такой точности
+    полигон вырождается, возвращается исходная геометрия.
+    
+    Args:
+        polygon_geojson: GeoJSON полигон или мультиполигон
+        precision: число знаков (None - без округления)
+        
+    Returns:
+        GeoJSON полигон с округленными координатами
+    """
+    if precision is None:
+        return polygon_geojson
+    if polygon_geojson["type"] == "MultiPolygon":
+        geometry = shapely.MultiPolygon([(polygon[0], polygon[1:]) for polygon in polygon_geojson["coordinates"]])
+    else:
+        rings = polygon_geojson["coordinates"]
+        geometry = shapely.Polygon(rings[0], rings[1:])
+    
+    snapped = shapely.set_precision(geometry, 10.0 ** -precision)
+    if snapped.is_empty or snapped.geom_type not in ("Polygon", "MultiPolygon"):
+        logger.debug("Polygon collapses at precision %s, returning it unrounded", precision)
+        return polygon_geojson
+    
+    # Вершины уже на сетке, повторное округление убирает хвосты двоичного представления
+    result = geometry_to_geojson(snapped)
+    if result["type"] == "MultiPolygon":
+        coordinates = [[np.round(ring, precision) for ring in polygon] for polygon in result["coordinates"]]
+    else:
+        coordinates = [np.round(ring, precision) for ring in result["coordinates"]]
+    return {**polygon_geojson, "type": result["type"], "coordinates": coordinates}
+
+
 class GeometryService:
     def __init__(self):
         self.earth_radius = 6371000  # радиус Земли в метрах
         self.config = get_geometry_config()
     
-    def create_circular_polygon(self, lat: float, lon: float, radius_meters: float, num_points: int = None) -> Dict:
+    def create_circular_polygon(self, lat: float, lon: float, radius_meters: float, num_points: int = None,
+                                simplify_tolerance: float = None) -> Dict:
         """
         Создает круговой полигон с заданным радиусом вокруг точки
         
@@ -22,39 +123,60 @@ class GeometryService:
             lon: долгота центральной точки  
             radius_meters: радиус в метрах
             num_points: количество точек для аппроксимации круга
+            simplify_tolerance: допуск упрощения контура в метрах
             
         Returns:
             GeoJSON полигон
         """
+        circle_wgs84 = self.create_circle_geometry(lat, lon, radius_meters, num_points, simplify_tolerance)
+        
+        # Конвертируем в GeoJSON, координаты остаются NumPy массивом без копирования в списки
+        polygon_geojson = polygon_to_geojson(circle_wgs84)
+        
+        logger.debug(f"Created polygon with {len(polygon_geojson['coordinates'][0])} points for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+        
+        return polygon_geojson
+    
+    def create_circle_geometry(self, lat: float, lon: float, radius_meters: float, num_points: int = None,
+                               simplify_tolerance: float = None) -> Polygon:
+        """
+        Строит круг с заданным радиусом вокруг точки как полигон shapely в WGS84
+        
+        Args:
+            lat: широта центральной точки
+            lon: долгота центральной точки
+            radius_meters: радиус в метрах
+            num_points: количество точек для аппроксимации круга
+            simplify_tolerance: допуск упрощения контура в метрах
+            
+        Returns:
+            Полигон shapely
+        """
         if num_points is None:
             num_points = self.config.get('default_points', 64)
             
         center_point = Point(lon, lat)
         
-        # Создаем круг в проекции UTM для точности
-        utm_proj = self._get_utm_projection(lon, lat)
-        wgs84_proj = pyproj.Proj('EPSG:4326')
+        # Создаем круг в проекции UTM для точности, трансформеры зоны берутся из кэша
+        utm_zone, hemisphere = self._get_utm_zone(lon, lat)
+        transformer, transformer_back = _get_utm_transformers(utm_zone, hemisphere)
         
         # Трансформируем центр в UTM
-        transformer = pyproj.Transformer.from_proj(wgs84_proj, utm_proj, always_xy=True)
-        center_utm = transform(transformer.transform, center_point)
+        with profile_stage("pyproj_to_utm"):
+            center_utm = transform(transformer.transform, center_point)
         
         # Создаем круг в UTM координатах
-        circle_utm = center_utm.buffer(radius_meters, quad_segs=num_points)
-        
-        # Трансформируем обратно в WGS84
-        transformer_back = pyproj.Transformer.from_proj(utm_proj, wgs84_proj, always_xy=True)
-        circle_wgs84 = transform(transformer_back.transform, circle_utm)
-        
-        # Конвертируем в GeoJSON
-        coords = list(circle_wgs84.exterior.coords)
+        with profile_stage("shapely_buffer"):
+            circle_utm = center_utm.buffer(radius_meters, quad_segs=num_points)
         
-        logger.debug(f"Created polygon with {len(coords)} points for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+        # Упрощаем контур в метрической проекции, чтобы допуск был в метрах
+        if simplify_tolerance:
+            with profile_stage("shapely_simplify"):
+                circle_utm = circle_utm.simplify(simplify_tolerance, preserve_topology=True)
         
-        return {
-            "type": "Polygon",
-            "coordinates": [coords]
-        }
+        # Трансформируем обратно в WGS84
+        with profile_stage("pyproj_to_wgs84"):
+            return transform(transformer_back.transform, circle_utm)
     
     def calculate_polygon_area(self, polygon_geojson: Dict) -> float:
         """
@@ -92,14 +214,32 @@ class GeometryService:
         area_proj = pyproj.Proj(f"+proj=aea +lat_1={lat_1} +lat_2={lat_2} +lat_0={lat_0} +lon_0={center_lon}")
         wgs84_proj = pyproj.Proj('EPSG:4326')
         
-        transformer = pyproj.Transformer.from_proj(wgs84_proj, area_proj, always_xy=True)
-        polygon_projected = transform(transformer.transform, polygon)
+        with profile_stage("pyproj_area_projection"):
+            transformer = pyproj.Transformer.from_proj(wgs84_proj, area_proj, always_xy=True)
+            polygon_projected = transform(transformer.transform, polygon)
         
         area = polygon_projected.area
         logger.debug(f"Calculated polygon area using Albers projection: {area:.2f} m²")
         
         return area
     
+    @staticmethod
+    def calculate_geodesic_area(geometry) -> float:
+        """
+        Вычисляет площадь произвольного (мульти)полигона на эллипсоиде WGS84
+        
+        В отличие от calculate_polygon_area не зависит от выбора проекции,
+        поэтому подходит для объединений, охватывающих несколько UTM зон.
+        
+        Args:
+            geometry: полигон или мультиполигон shapely в WGS84
+            
+        Returns:
+            Площадь в квадратных метрах
+        """
+        area, _ = _get_geod().geometry_area_perimeter(geometry)
+        return abs(area)
+    
     @staticmethod
     def calculate_albers_center_by_polygon(polygon: Polygon):
         centroid = polygon.centroid
@@ -136,6 +276,22 @@ class GeometryService:
         
         return area
     
+    @staticmethod
+    def _get_utm_zone(lon: float, lat: float) -> Tuple[int, str]:
+        """
+        Определяет номер UTM зоны и полушарие для заданных координат
+        
+        Args:
+            lon: долгота
+            lat: широта
+            
+        Returns:
+            Номер зоны и полушарие ('north' или 'south')
+        """
+        utm_zone = int((lon + 180) / 6) + 1
+        hemisphere = 'north' if lat >= 0 else 'south'
+        return utm_zone, hemisphere
+    
     def _get_utm_projection(self, lon: float, lat: float) -> pyproj.Proj:
         """
         Определяет UTM зону для заданных координат
@@ -147,10 +303,24 @@ class GeometryService:
         Returns:
             UTM проекция
         """
-        utm_zone = int((lon + 180) / 6) + 1
-        hemisphere = 'north' if lat >= 0 else 'south'
+        utm_zone, hemisphere = self._get_utm_zone(lon, lat)
+        return _get_utm_proj(utm_zone, hemisphere)
+    
+    @staticmethod
+    def prewarm_transformers() -> int:
+        """
+        Заранее создает трансформеры WGS84 <-> UTM для всех зон обоих полушарий
         
-        return pyproj.Proj(f"+proj=utm +zone={utm_zone} +{hemisphere} +ellps=WGS84")
+        Returns:
+            Количество созданных пар трансформеров
+        """
+        count = 0
+        for utm_zone in range(1, 61):
+            for hemisphere in ('north', 'south'):
+                _get_utm_transformers(utm_zone, hemisphere)
+                count += 1
+        logger.debug(f"Prewarmed {count} UTM transformer pairs")
+        return count
     
     def validate_coordinates(self, lat: float, lon: float) -> bool:
         """
@@ -168,6 +338,24 @@ class GeometryService:
             logger.warning(f"Invalid coordinates: lat={lat}, lon={lon}")
         return is_valid
     
+    def validate_segments(self, segments: Optional[int]) -> bool:
+        """
+        Валидирует количество сегментов аппроксимации
+        
+        Args:
+            segments: количество сегментов на четверть окружности (None - по умолчанию)
+            
+        Returns:
+            True если значение валидно
+        """
+        if segments is None:
+            return True
+        max_points = self.config.get('max_points', 256)
+        is_valid = 1 <= segments <= max_points
+        if not is_valid:
+            logger.warning(f"Invalid segments: {segments} (max: {max_points})")
+        return is_valid
+    
     def validate_radius(self, radius_meters: float) -> bool:
         """
         Валидирует радиус
@@ -0,0 +1,168 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+from app.config import get_hedging_config
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Повторное вычисление задержки через столько новых замеров
+_DELAY_UPDATE_INTERVAL = 16
+
+
+def _consume_result(task: asyncio.Future) -> None:
+    # Результат проигравшего вызова не нужен, но исключение должно быть получено
+    if not task.cancelled():
+        task.exception()
+
+
+class HedgeFailedError(Exception):
+    """Оба вызова (основной и резервный) завершились ошибкой"""
+
+    def __init__(self, primary_error: BaseException, hedge_error: BaseException):
+        super().__init__(f"primary failed: {primary_error}; hedge failed: {hedge_error}")
+        self.primary_error = primary_error
+        self.hedge_error = hedge_error
+
+
+class HedgedExecutor:
+    """
+    Hedged-выполнение: основной вызов и резервный, запускаемый с задержкой
+
+    Если основной вызов (PostGIS) не ответил за задержку, равную заданному
+    перцентилю его последних замеров, параллельно запускается резервный
+    (локальный расчет), и возвращается результат того, кто ответит первым.
+    Проигравший резервный вызов отменяется; проигравший основной дорабатывает
+    в фоне, его результат отбрасывается, а задержка учитывается в замерах,
+    чтобы перцентиль не смещался вниз.
+    """
+
+    def __init__(self, primary_name: str, hedge_name: str):
+        self.config = get_hedging_config()
+        self.enabled = self.config.get('enabled', False)
+        self.percentile = min(1.0, max(0.0, self.config.get('percentile', 0.95)))
+        self.min_delay = self.config.get('min_delay', 0.02)
+        self.max_delay = self.config.get('max_delay', 1.0)
+        self.min_samples = max(1, self.config.get('min_samples', 50))
+        self.primary_name = primary_name
+        self.hedge_name = hedge_name
+
+        self._latencies: Deque[float] = deque(maxlen=max(1, self.config.get('window', 1000)))
+        self._delay = self._clamp(self.config.get('initial_delay', 0.2))
+        self._samples_since_update = 0
+
+        self.calls = 0
+        self.hedges = 0
+        self.wins: Dict[str, int] = {primary_name: 0, hedge_name: 0}
+        self.errors: Dict[str, int] = {primary_name: 0, hedge_name: 0}
+        metrics.register_collector("hedging", self.get_metrics)
+
+    def _clamp(self, delay: float) -> float:
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    @property
+    def delay(self) -> float:
+        """Задержка перед запуском резервного вызова, секунды"""
+        return self._delay
+
+    def observe(self, duration: float) -> None:
+        """
+        Учитывает задержку успешного основного вызова
+
+        Args:
+            duration: длительность вызова в секундах
+        """
+        self._latencies.append(duration)
+        self._samples_since_update += 1
+        if len(self._latencies) >= self.min_samples and self._samples_since_update >= _DELAY_UPDATE_INTERVAL:
+            self._samples_since_update = 0
+            ordered = sorted(self._latencies)
+            index = max(0, math.ceil(self.percentile * len(ordered)) - 1)
+            self._delay = self._clamp(ordered[index])
+
+    async def _timed(self, primary: Callable[[], Awaitable[Any]]) -> Any:
+        started_at = time.monotonic()
+        result = await primary()
+        self.observe(time.monotonic() - started_at)
+        return result
+
+    async def run(self, primary: Callable[[], Awaitable[Any]], hedge: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет основной вызов, при задержке - параллельно резервный
+
+        Args:
+            primary: функция, возвращающая awaitable основного вызова
+            hedge: функция, возвращающая awaitable резервного вызова
+
+        Returns:
+            Результат первого успешно завершившегося вызова
+
+        Raises:
+            Exception: ошибка основного вызова, если он завершился до запуска резервного
+            HedgeFailedError: оба вызова завершились неудачно
+        """
+        self.calls += 1
+        primary_task = asyncio.ensure_future(self._timed(primary))
+        primary_task.add_done_callback(_consume_result)
+
+        done, _ = await asyncio.wait({primary_task}, timeout=self._delay)
+        if done:
+            return self._result(primary_task, self.primary_name)
+
+        self.hedges += 1
+        metrics.increment("hedging_fired")
+        hedge_task = asyncio.ensure_future(hedge())
+        hedge_task.add_done_callback(_consume_result)
+        names = {primary_task: self.primary_name, hedge_task: self.hedge_name}
+
+        errors: Dict[asyncio.Future, Exception] = {}
+        pending = {primary_task, hedge_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # При одновременном завершении предпочитается основной вызов
+                for task in sorted(done, key=lambda task: task is not primary_task):
+                    try:
+                        return self._result(task, names[task])
+                    except Exception as e:
+                        errors[task] = e
+            raise HedgeFailedError(errors[primary_task], errors[hedge_task])
+        finally:
+            if not hedge_task.done():
+                hedge_task.cancel()
+
+    def _result(self, task: asyncio.Future, name: str) -> Any:
+        try:
+            result = task.result()
+        except Exception:
+            self.errors[name] += 1
+            raise
+        self.wins[name] += 1
+        metrics.increment(f"hedging_{name}_wins")
+        return result
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики hedging
+
+        Returns:
+            Текущая задержка, доля запусков резервного вызова и победы по движкам
+        """
+        return {
+            "enabled": self.enabled,
+            "delay_seconds": self._delay,
+            "percentile": self.percentile,
+            "samples": len(self._latencies),
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_rate": self.hedges / self.calls if self.calls else 0.0,
+            "wins": dict(self.wins),
+            "errors": dict(self.errors)
+        }
+
+
+# Hedging построения полигонов: PostGIS против локального движка
+geometry_hedge = HedgedExecutor("postgis", "local")
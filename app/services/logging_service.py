@@ -0,0 +1,268 @@
+import atexit
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+import orjson
+from app.config import get_logging_config
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Стандартные атрибуты LogRecord - остальные попали в запись через extra и выводятся полями JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись одной строкой JSON, поля из extra выводятся как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        # Один форматтер у всех обработчиков (а файл с ротацией форматирует запись дважды) -
+        # строка собирается один раз на запись
+        formatted = record.__dict__.get("_json")
+        if formatted is not None:
+            return formatted
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        record._json = orjson.dumps(entry, default=str).decode()
+        return record._json
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ограничение частоты и выборка записей уровня INFO и ниже для заданных логгеров
+
+    Для каждого логгера - token bucket (rate записей в секунду, burst подряд) и
+    случайная выборка доли sample_rate. Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, prefixes: List[str], sample_rate: float, rate: float, burst: int):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.rate = rate
+        self.burst = max(1, burst)
+        # Записи приходят из потока event loop и потоков executor
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self.sampled_out: Dict[str, int] = {}
+        self.rate_limited: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not record.name.startswith(self.prefixes):
+            return True
+        name = record.name
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out[name] = self.sampled_out.get(name, 0) + 1
+            return False
+        if self.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(name, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+            if tokens < 1.0:
+                self._buckets[name] = (tokens, now)
+                self.rate_limited[name] = self.rate_limited.get(name, 0) + 1
+                return False
+            self._buckets[name] = (tokens - 1.0, now)
+        return True
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Пишет в текущий sys.stdout: поток мог быть подменен (перехват вывода) после настройки"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+    def flush(self) -> None:
+        try:
+            super().flush()
+        except ValueError:
+            # Подмененный поток уже закрыт (завершение процесса)
+            pass
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в потоке вызова и без блокировки при переполнении очереди"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь внутри процесса - запись не сериализуется, сообщение из msg и args
+        # собирается форматтером в потоке QueueListener
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """
+    Неблокирующее логирование: QueueHandler на корневом логгере и QueueListener в отдельном потоке
+
+    Поток запроса только кладет запись в ограниченную очередь; форматирование
+    (подстановка аргументов, JSON) и запись в файл с ротацией выполняются в потоке
+    слушателя. При переполнении очереди записи отбрасываются, а не задерживают
+    event loop. Сообщения горячего пути проходят выборку и ограничение частоты
+    по логгерам (SamplingFilter).
+
+    После fork (pre-fork сервер) в дочернем процессе создаются новая очередь и
+    новый поток слушателя: поток родителя в дочерний процесс не переходит. Файл
+    с ротацией у каждого процесса свой (api.<pid>.log для api.log): процессы,
+    ротирующие один файл по своему представлению о его размере, продолжали бы
+    писать в переименованный файл и перезаписывать резервные копии.
+    """
+
+    def __init__(self):
+        self.config = get_logging_config()
+        self._handler: Optional[_LazyQueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+        self._handlers: List[logging.Handler] = []
+        self._log_file: Optional[str] = None
+        self._filter: Optional[SamplingFilter] = None
+        self._atexit_registered = False
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        metrics.register_collector("logging", self.get_metrics)
+
+    def _make_formatter(self) -> logging.Formatter:
+        if self.config.get('format', 'json') == 'json':
+            return JsonFormatter()
+        return logging.Formatter(TEXT_FORMAT)
+
+    def configure(self, level: str = "INFO", log_file: Optional[str] = None) -> None:
+        """
+        Заменяет обработчики корневого логгера очередью с потоком записи
+
+        Args:
+            level: уровень корневого логгера
+            log_file: файл с ротацией (None - только stdout)
+        """
+        self.stop()
+        for handler in self._handlers:
+            handler.close()
+        formatter = self._make_formatter()
+        handlers: List[logging.Handler] = [_StdoutHandler()]
+        self._log_file = log_file or None
+        if log_file:
+            handlers.append(self._make_file_handler(log_file))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        self._handlers = handlers
+
+        self._filter = SamplingFilter(
+            self.config.get('sampled_loggers', []),
+            self.config.get('sample_rate', 1.0),
+            self.config.get('rate_limit_per_second', 0.0),
+            self.config.get('rate_limit_burst', 1)
+        )
+        self._handler = _LazyQueueHandler(queue.Queue(max(1, self.config.get('queue_size', 10000))))
+        self._handler.addFilter(self._filter)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self._handler)
+        root.setLevel(getattr(logging, level))
+        self._start_listener()
+
+        if not self._atexit_registered:
+            # Оставшиеся в очереди записи дописываются при завершении процесса
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+    def _make_file_handler(self, path: str) -> RotatingFileHandler:
+        return RotatingFileHandler(
+            path,
+            maxBytes=self.config.get('file_max_bytes', 1024 * 1024),
+            backupCount=self.config.get('file_backup_count', 5)
+        )
+
+    def _start_listener(self) -> None:
+        self._listener = QueueListener(self._handler.queue, *self._handlers, respect_handler_level=True)
+        self._listener.start()
+
+    def _after_fork(self) -> None:
+        if self._listener is None:
+            return
+        # Записи родителя, оставшиеся в скопированной очереди, запишет сам родитель
+        self._handler.queue = queue.Queue(self._handler.queue.maxsize)
+        self._handler.dropped = 0
+        if self._log_file:
+            root, ext = os.path.splitext(self._log_file)
+            for index, handler in enumerate(self._handlers):
+                if isinstance(handler, RotatingFileHandler):
+                    # Закрывается только копия дескриптора родителя, его файл остается открытым
+                    handler.close()
+                    worker_handler = self._make_file_handler(f"{root}.{os.getpid()}{ext}")
+                    worker_handler.setFormatter(handler.formatter)
+                    self._handlers[index] = worker_handler
+        self._start_listener()
+
+    def stop(self) -> None:
+        """Дописывает записи из очереди и останавливает поток слушателя"""
+        if self._listener is None:
+            return
+        listener, self._listener = self._listener, None
+        listener.stop()
+        for handler in self._handlers:
+            handler.flush()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики логирования
+
+        Returns:
+            Размер очереди, отброшенные при переполнении записи и записи, не прошедшие выборку
+        """
+        if self._handler is None:
+            return {"enabled": False}
+        return {
+            "enabled": self._listener is not None,
+            "queued": self._handler.queue.qsize(),
+            "dropped": self._handler.dropped,
+            "sampled_out": dict(self._filter.sampled_out),
+            "rate_limited": dict(self._filter.rate_limited)
+        }
+
+
+# Конвейер логирования процесса
+logging_pipeline = LoggingPipeline()
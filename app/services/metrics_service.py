@@ -0,0 +1,76 @@
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsService:
+    """Простой реестр метрик процесса: счетчики, gauge-значения и коллекторы"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        Увеличивает счетчик
+
+        Args:
+            name: имя счетчика
+            value: на сколько увеличить
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """
+        Устанавливает текущее значение gauge-метрики
+
+        Args:
+            name: имя метрики
+            value: значение
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+        """
+        Регистрирует функцию, которая отдает метрики компонента на момент снятия снимка
+
+        Args:
+            name: имя раздела метрик
+            collector: функция без аргументов, возвращающая словарь метрик
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Возвращает снимок всех метрик
+
+        Returns:
+            Словарь с счетчиками, gauge-метриками и разделами коллекторов
+        """
+        with self._lock:
+            result: Dict[str, Any] = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges)
+            }
+            collectors = dict(self._collectors)
+
+        for name, collector in collectors.items():
+            try:
+                result[name] = collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics for {name}: {e}")
+                result[name] = {"error": str(e)}
+
+        return result
+
+
+# Глобальный реестр метрик процесса
+metrics = MetricsService()
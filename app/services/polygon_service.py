@@ -1,14 +1,26 @@
 import asyncio
-from typing import Dict, Optional
-from app.services.geometry_service import GeometryService
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.services.geometry_service import GeometryService, round_coordinates
 from app.services.cache_service import CacheService
 from app.services.sheets_service import SheetsService
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.profiling_service import profile_stage
+from app.services.admission_service import AdmissionError, admission_controller
+from app.services.analytics_service import analytics_service
+from app.services.geometry_executor import geometry_executor, compute_circular_polygon
+from app.services.hedging_service import HedgeFailedError, geometry_hedge
+from app.services.spatial_index_service import spatial_index_service
+from app.services.tile_service import tile_service
 from app.repositories.postgis_repository import PostgisRepository
-from app.config import settings
+from app.config import get_polygon_function_config, settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# SQLSTATE undefined_function: SQL функция не установлена (init_db.py не запускался)
+_UNDEFINED_FUNCTION = "42883"
+
 
 class PolygonService:
     def __init__(self):
@@ -16,7 +28,16 @@ class PolygonService:
         self.cache_service = CacheService()
         self.sheets_service = SheetsService()
         self.postgis_repository = PostgisRepository()
-    async def create_polygon(self, lat: float, lon: float, radius_meters: float) -> Dict:
+        self.db_function_enabled = get_polygon_function_config().get('enabled', True)
+        # Пространственный индекс и кэш тайлов обновляются при каждом изменении кэша
+        self.cache_service.add_listener(spatial_index_service)
+        self.cache_service.add_listener(tile_service)
+        # В Google Sheets пишутся только периодические сводки аналитики
+        analytics_service.set_summary_sink(self.sheets_service.log_summary)
+        
+    async def create_polygon(self, lat: float, lon: float, radius_meters: float, segments: Optional[int] = None,
+                             precision: Optional[int] = None, simplify_tolerance: Optional[float] = None,
+                             client_id: Optional[str] = None) -> Dict:
         """
         Создает полигон покрытия с заданными параметрами
         
@@ -24,85 +45,333 @@ class PolygonService:
             lat: широта центральной точки
             lon: долгота центральной точки
             radius_meters: радиус в метрах
+            segments: количество сегментов на четверть окружности (по умолчанию из настроек)
+            precision: знаков после запятой в координатах (по умолчанию из настроек)
+            simplify_tolerance: допуск упрощения контура в метрах
+            client_id: идентификатор клиента для лимита построения новых полигонов
             
         Returns:
             Словарь с результатом операции
+            
+        Raises:
+            AdmissionError: построение нового полигона отклонено admission control
         """
-        # Валидация входных данных
-        if not self.geometry_service.validate_coordinates(lat, lon):
-            raise ValueError("Некорректные координаты")
+        started_at = time.perf_counter()
+        self.validate(lat, lon, radius_meters, segments)
+        options = self.build_options(segments, precision, simplify_tolerance)
         
-        if not self.geometry_service.validate_radius(radius_meters):
-            raise ValueError("Некорректный радиус")
+        # Построение с записью в кэш одним вызовом SQL функции; hedging гонит только построение, поэтому идет по шагам
+        if self.db_function_enabled and not geometry_hedge.enabled:
+            result = await self._lookup_or_create(lat, lon, radius_meters, options, client_id)
+            if result is not None:
+                engine = "cache" if result["cached"] else "postgis"
+                self._record_request(lat, lon, radius_meters, options, result["area"], result["cached"], engine,
+                                     started_at)
+                return result
         
         # Проверяем кэш
-        cached_result = await self.cache_service.get_cached_polygon(lat, lon, radius_meters)
+        with profile_stage("cache_lookup"):
+            cached_result = await self.cache_service.get_cached_polygon(lat, lon, radius_meters, options)
         if cached_result:
-            # Логируем кэшированный запрос в Google Sheets
-            asyncio.create_task(self._log_to_sheets(lat, lon, radius_meters, cached_result["area"]))
-            logger.info(f"Returning cached polygon for coordinates ({lat}, {lon}) with radius {radius_meters}m")
+            self._record_request(lat, lon, radius_meters, options, cached_result["area"], True, "cache", started_at)
+            logger.info("Returning cached polygon for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
             return {
                 "polygon": cached_result["polygon"],
+                "polygon_json": cached_result["polygon_json"],
                 "cached": True,
                 "area": cached_result["area"]
             }
         
-        # Имитируем долгий запрос
-        await asyncio.sleep(settings.async_sleep_seconds)
+        # Промах кэша: построение ограничено по параллельности и лимиту клиента
+        async with admission_controller.admit(client_id):
+            polygon, area, engine = await self._build_polygon(lat, lon, radius_meters, options)
+            
+            # Кэшируем результат
+            with profile_stage("cache_write"):
+                await self.cache_service.cache_polygon(lat, lon, radius_meters, polygon, area, options)
+        
+        self._record_request(lat, lon, radius_meters, options, area, False, engine, started_at)
         
+        return {
+            "polygon": polygon,
+            "cached": False,
+            "area": area
+        }
+    
+    async def _lookup_or_create(self, lat: float, lon: float, radius_meters: float, options: Dict,
+                                client_id: Optional[str]) -> Optional[Dict]:
+        """
+        Получает полигон из кэша или строит его в базе одним запросом
+        
+        Попадания (разделяемая память, затем база) admission control не проходят;
+        при промахе SQL функция, строящая полигон, вызывается внутри admission control
+        (полигон, успевший появиться после чтения, функция вернет из кэша).
+        
+        Returns:
+            Результат в формате create_polygon или None, если база недоступна
+            (тогда полигон строится по шагам с локальным fallback)
+            
+        Raises:
+            AdmissionError: построение нового полигона отклонено admission control
+        """
         try:
-            # Создаем полигон в базе данных
-            db_result = await self.postgis_repository.create_polygon(lat, lon, radius_meters)
+            with profile_stage("cache_lookup"):
+                result = await self.cache_service.find_cached_polygon(lat, lon, radius_meters, options)
+            if result is None:
+                async with admission_controller.admit(client_id):
+                    with profile_stage("lookup_or_create"):
+                        result = await self.cache_service.lookup_or_create_polygon(
+                            lat, lon, radius_meters, options, check_cached=False
+                        )
+                    if not result["cached"]:
+                        # Новый полигон: имитация долгого запроса, как при построении по шагам
+                        with profile_stage("simulated_delay"):
+                            await asyncio.sleep(settings.async_sleep_seconds)
+        except AdmissionError:
+            raise
+        except CircuitOpenError as e:
+            logger.debug("Cache circuit is open, building polygon step by step: %s", e)
+            return None
+        except Exception as e:
+            if getattr(getattr(e, "orig", None), "pgcode", None) == _UNDEFINED_FUNCTION:
+                self.db_function_enabled = False
+                logger.warning("Polygon SQL function is not installed, run init_db.py; building polygons step by step")
+            else:
+                logger.error(f"Error looking up or creating polygon in db: {e}")
+            return None
+        
+        if result["cached"]:
+            logger.info("Returning cached polygon for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+        else:
+            logger.info("Created new polygon for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+        return result
+    
+    async def create_polygons(self, points: Sequence[Dict], client_id: Optional[str] = None) -> List[Dict]:
+        """
+        Создает полигоны для набора точек
+        
+        Кэш проверяется одним запросом для всех точек, строятся только промахи
+        (одинаковые точки - один раз), новые полигоны сохраняются одним upsert.
+        Пакет расходует по токену лимита клиента на каждый промах, списываемых разом.
+        
+        Args:
+            points: словари с аргументами create_polygon (lat, lon, radius_meters, segments,
+                precision, simplify_tolerance)
+            client_id: идентификатор клиента для лимита построения новых полигонов
             
-            # Используем результат из базы данных
-            polygon = db_result["geometry"]
-            area = db_result["area_sqm"]
+        Returns:
+            Результаты в порядке точек, в формате create_polygon
             
-            # Кэшируем результат
-            await self.cache_service.cache_polygon(lat, lon, radius_meters, polygon, area)
+        Raises:
+            AdmissionError: построение нового полигона отклонено admission control
+        """
+        started_at = time.perf_counter()
+        requests = []
+        for point in points:
+            self.validate(point["lat"], point["lon"], point["radius_meters"], point.get("segments"))
+            options = self.build_options(point.get("segments"), point.get("precision"), point.get("simplify_tolerance"))
+            requests.append((point["lat"], point["lon"], point["radius_meters"], options))
+        
+        with profile_stage("cache_lookup"):
+            cached = await self.cache_service.get_cached_polygons(requests)
+        
+        keys = [self.cache_service.get_cache_key(*request) for request in requests]
+        misses = {key: request for key, request in zip(keys, requests) if key not in cached}
+        
+        if misses:
+            # Токен на промах; пакет дороже burst проходит при полном ведре и уводит его в долг
+            admission_controller.charge(client_id, len(misses))
+        built = await self._build_misses(misses)
+        logger.info("Polygon batch of %s points: %s cached, %s built",
+                    len(requests), len(requests) - len(misses), len(built))
+        
+        results = []
+        for key, (lat, lon, radius_meters, options) in zip(keys, requests):
+            cached_result = cached.get(key)
+            if cached_result is not None:
+                engine = "cache"
+                result = {
+                    "polygon": cached_result["polygon"],
+                    "polygon_json": cached_result["polygon_json"],
+                    "cached": True,
+                    "area": cached_result["area"]
+                }
+            else:
+                polygon, area, engine = built[key]
+                result = {"polygon": polygon, "cached": False, "area": area}
+            self._record_request(lat, lon, radius_meters, options, result["area"], result["cached"], engine, started_at,
+                                 cache_key=key)
+            results.append(result)
+        return results
+    
+    async def _build_misses(self, misses: Dict[str, Tuple[float, float, float, Dict]]) -> Dict[str, Tuple[Dict, float, str]]:
+        """
+        Строит промахи пакета и сохраняет их одним upsert
+        
+        Параллельность ограничена слотами admission control; пакет занимает не больше
+        max_concurrent слотов сразу, чтобы не заполнить общую очередь ожидания.
+        Если построение одной точки не удалось, построенные остальные все равно
+        сохраняются в кэш, а ошибка пробрасывается.
+        
+        Returns:
+            Ключ кэша -> (полигон, площадь, движок)
+        """
+        limit = asyncio.Semaphore(admission_controller.max_concurrent)
+        
+        async def _build_miss(lat: float, lon: float, radius_meters: float, options: Dict) -> Tuple[Dict, float, str]:
+            async with limit:
+                async with admission_controller.admit():
+                    return await self._build_polygon(lat, lon, radius_meters, options)
+        
+        keys = list(misses)
+        outcomes = await asyncio.gather(*[_build_miss(*misses[key]) for key in keys], return_exceptions=True)
+        built = {key: outcome for key, outcome in zip(keys, outcomes) if not isinstance(outcome, BaseException)}
+        if built:
+            with profile_stage("cache_write"):
+                await self.cache_service.cache_polygons([
+                    (lat, lon, radius_meters, built[key][0], built[key][1], options)
+                    for key, (lat, lon, radius_meters, options) in misses.items() if key in built
+                ])
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return built
+    
+    def validate(self, lat: float, lon: float, radius_meters: float, segments: Optional[int]) -> None:
+        """
+        Проверяет параметры полигона
+        
+        Raises:
+            ValueError: некорректные координаты, радиус или количество сегментов
+        """
+        if not self.geometry_service.validate_coordinates(lat, lon):
+            raise ValueError("Некорректные координаты")
+        
+        if not self.geometry_service.validate_radius(radius_meters):
+            raise ValueError("Некорректный радиус")
+        
+        if not self.geometry_service.validate_segments(segments):
+            raise ValueError("Некорректное количество сегментов")
+    
+    async def _build_polygon(self, lat: float, lon: float, radius_meters: float,
+                             options: Dict) -> Tuple[Dict, float, str]:
+        # Имитируем долгий запрос
+        with profile_stage("simulated_delay"):
+            await asyncio.sleep(settings.async_sleep_seconds)
+        
+        polygon, area, engine = await self._compute_polygon(lat, lon, radius_meters, options)
+        return round_coordinates(polygon, options["precision"]), area, engine
+    
+    def build_options(self, segments: Optional[int], precision: Optional[int],
+                       simplify_tolerance: Optional[float]) -> Dict:
+        """
+        Приводит параметры построения к каноничному виду для ключа кэша
+        
+        Значения, совпадающие с умолчаниями, заменяются на None, чтобы один и тот же
+        полигон не кэшировался под разными ключами.
+        
+        Returns:
+            Словарь параметров segments, precision, simplify_tolerance
+        """
+        if segments == self.geometry_service.config.get('default_points'):
+            segments = None
+        if precision is None:
+            precision = self.geometry_service.config.get('coordinate_precision')
+        return {
+            "segments": segments,
+            "precision": precision,
+            "simplify_tolerance": simplify_tolerance or None
+        }
+    
+    def get_cache_key(self, lat: float, lon: float, radius_meters: float, segments: Optional[int] = None,
+                      precision: Optional[int] = None, simplify_tolerance: Optional[float] = None) -> str:
+        """
+        Возвращает ключ кэша полигона без обращения к кэшу и построения геометрии
+        
+        Returns:
+            Ключ кэша
+        """
+        options = self.build_options(segments, precision, simplify_tolerance)
+        return self.cache_service.get_cache_key(lat, lon, radius_meters, options)
+    
+    async def _compute_polygon(self, lat: float, lon: float, radius_meters: float,
+                               options: Dict) -> Tuple[Dict, float, str]:
+        """
+        Строит полигон силами PostGIS, а при недоступности базы - локально
+        
+        В режиме hedging локальный расчет запускается параллельно, если PostGIS
+        не ответил за перцентиль своей задержки, и возвращается первый результат.
+        Если оба вызова завершились ошибкой, локальный расчет не повторяется.
+        
+        Args:
+            lat: широта центральной точки
+            lon: долгота центральной точки
+            radius_meters: радиус в метрах
+            options: параметры построения полигона
             
-            # Логируем в Google Sheets (асинхронно)
-            asyncio.create_task(self._log_to_sheets(lat, lon, radius_meters, area))
+        Returns:
+            GeoJSON полигон, площадь в квадратных метрах и движок (postgis или local)
+        """
+        async def _postgis():
+            return await self.postgis_repository.create_polygon(
+                lat, lon, radius_meters, options["segments"], options["simplify_tolerance"]
+            ), "postgis"
+        
+        async def _local():
+            return await geometry_executor.run(
+                compute_circular_polygon, lat, lon, radius_meters, options["segments"], options["simplify_tolerance"]
+            ), "local"
+        
+        try:
+            if geometry_hedge.enabled:
+                with profile_stage("hedged_geometry"):
+                    db_result, engine = await geometry_hedge.run(_postgis, _local)
+            else:
+                # Создаем полигон в базе данных
+                with profile_stage("postgis"):
+                    db_result, engine = await _postgis()
             
-            logger.info(f"Created new polygon for coordinates ({lat}, {lon}) with radius {radius_meters}m")
-            return {
-                "polygon": polygon,
-                "cached": False,
-                "area": area
-            }
+            logger.info("Created new polygon for coordinates (%s, %s) with radius %sm", lat, lon, radius_meters)
+            return db_result["geometry"], db_result["area_sqm"], engine
+        except HedgeFailedError as e:
+            # Локальный расчет уже выполнялся и упал - повторять его бессмысленно
+            logger.error("Both geometry engines failed for (%s, %s) with radius %sm: %s",
+                         lat, lon, radius_meters, e)
+            raise e.hedge_error from e
         except Exception as e:
-            logger.error(f"Error creating polygon in db: {e}")
-            # Fallback к локальному созданию полигона
-            polygon = self.geometry_service.create_circular_polygon(lat, lon, radius_meters)
-            area = self.geometry_service.calculate_polygon_area(polygon)
-            
-            # Кэшируем результат
-            await self.cache_service.cache_polygon(lat, lon, radius_meters, polygon, area)
+            if isinstance(e, CircuitOpenError):
+                logger.debug("PostGIS circuit is open, using local geometry engine: %s", e)
+            else:
+                logger.error(f"Error creating polygon in db: {e}")
+            # Fallback к локальному созданию полигона в пуле геометрических вычислений
+            with profile_stage("local_geometry"):
+                local_result, engine = await _local()
             
-            # Логируем в Google Sheets (асинхронно)
-            asyncio.create_task(self._log_to_sheets(lat, lon, radius_meters, area))
-            
-            logger.info(f"Created polygon using fallback for coordinates ({lat}, {lon}) with radius {radius_meters}m")
-            return {
-                "polygon": polygon,
-                "cached": False,
-                "area": area
-            }
+            logger.info("Created polygon using fallback for coordinates (%s, %s) with radius %sm",
+                        lat, lon, radius_meters)
+            return local_result["geometry"], local_result["area_sqm"], engine
     
-    async def _log_to_sheets(self, lat: float, lon: float, radius_meters: float, area: float):
+    def _record_request(self, lat: float, lon: float, radius_meters: float, options: Dict, area: float,
+                        cached: bool, engine: str, started_at: float, cache_key: Optional[str] = None) -> None:
         """
-        Асинхронно логирует запрос в Google Sheets
+        Добавляет запрос в аналитику (запись в файлы - в фоне пачками)
         
         Args:
             lat: широта
             lon: долгота
             radius_meters: радиус в метрах
+            options: параметры построения полигона
             area: площадь полигона
+            cached: полигон взят из кэша
+            engine: кто построил полигон (cache, postgis, local)
+            started_at: время начала обработки (time.perf_counter)
+            cache_key: ключ кэша, если уже вычислен
         """
-        try:
-            await self.sheets_service.log_request(lat, lon, radius_meters, area)
-        except Exception as e:
-            logger.error(f"Error logging to sheets: {e}")
+        if cache_key is None:
+            cache_key = self.cache_service.get_cache_key(lat, lon, radius_meters, options)
+        analytics_service.record(
+            cache_key, lat, lon, radius_meters, area, cached, engine, time.perf_counter() - started_at
+        )
     
     async def get_cache_stats(self) -> Dict:
         """
@@ -118,18 +387,18 @@ class PolygonService:
         Очищает весь кэш
         
         Returns:
-            Количество удаленных записей
+            Количество недействительных записей (удаляются из базы в фоне)
         """
         return await self.cache_service.clear_cache()
     
-    def create_spreadsheet(self) -> Optional[str]:
+    async def create_spreadsheet(self) -> Optional[str]:
         """
         Создает новую Google таблицу для логирования
         
         Returns:
             ID созданной таблицы
         """
-        return self.sheets_service.create_spreadsheet()
+        return await self.sheets_service.create_spreadsheet()
     
     def get_spreadsheet_url(self) -> Optional[str]:
         """
@@ -0,0 +1,223 @@
+import cProfile
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import get_profiling_config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Профиль текущего запроса (None, если запрос не профилируется)
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """Разбивка времени обработки одного запроса по этапам"""
+
+    def __init__(self, profile_id: str = None, path: str = ""):
+        self.id = profile_id or uuid.uuid4().hex[:16]
+        self.path = path
+        self.started_at = time.perf_counter()
+        self.total_seconds: Optional[float] = None
+        self.stages: List[Tuple[str, float]] = []
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages.append((name, seconds))
+
+    def add_stages(self, stages: List[Tuple[str, float]], prefix: str = "") -> None:
+        for name, seconds in stages:
+            self.stages.append((f"{prefix}{name}", seconds))
+
+    def finish(self) -> None:
+        self.total_seconds = time.perf_counter() - self.started_at
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing"""
+        return ", ".join(
+            f"{name.replace('.', '_')};dur={seconds * 1000:.2f}" for name, seconds in self.stages
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        by_stage: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            by_stage[name] = by_stage.get(name, 0.0) + seconds * 1000
+        return {
+            "id": self.id,
+            "path": self.path,
+            "total_ms": round((self.total_seconds or 0.0) * 1000, 3),
+            "stages": [{"name": name, "duration_ms": round(seconds * 1000, 3)} for name, seconds in self.stages],
+            "by_stage_ms": {name: round(ms, 3) for name, ms in by_stage.items()}
+        }
+
+
+def get_current_profile() -> Optional[RequestProfile]:
+    """Возвращает профиль текущего запроса или None"""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_stage(name: str):
+    """
+    Замеряет длительность этапа, если текущий запрос профилируется
+
+    Args:
+        name: имя этапа
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - started_at)
+
+
+def bind_context(func: Callable) -> Callable:
+    """
+    Привязывает функцию к текущему контексту, чтобы этапы, замеренные
+    в потоке run_in_executor, попадали в профиль запроса
+    """
+    if _current_profile.get() is None:
+        return func
+    return partial(copy_context().run, func)
+
+
+def run_profiled(func: Callable, collect_stages: bool, *args) -> Tuple[Any, Optional[List[Tuple[str, float]]], float]:
+    """
+    Выполняет функцию в воркере пула, собирая этапы в отдельный профиль
+
+    Args:
+        func: функция
+        collect_stages: собирать ли этапы
+        *args: аргументы функции
+
+    Returns:
+        Результат функции, этапы (или None) и время выполнения в секундах
+    """
+    started_at = time.perf_counter()
+    if not collect_stages:
+        return func(*args), None, time.perf_counter() - started_at
+
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        result = func(*args)
+    finally:
+        _current_profile.reset(token)
+    return result, profile.stages, time.perf_counter() - started_at
+
+
+class ProfilingService:
+    """
+    Профилирование отдельных запросов по флагу администратора или по сэмплированию
+
+    Для профилируемого запроса включается cProfile и собирается разбивка по этапам.
+    Профили сохраняются в формате pstats (открываются snakeviz, gprof2dot и т.п.).
+    """
+
+    def __init__(self):
+        self.config = get_profiling_config()
+        self.admin_token = self.config.get('admin_token')
+        self.sample_rate = self.config.get('sample_rate', 0.0)
+        self.sampled_paths = tuple(self.config.get('sampled_paths', ()))
+        self.output_dir = self.config.get('output_dir', 'profiles')
+        self.max_stored = max(1, self.config.get('max_stored', 50))
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._profiler_active = False
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        """
+        Проверяет токен администратора
+
+        Args:
+            token: значение заголовка X-Admin-Token
+
+        Returns:
+            True если токен задан в настройках и совпадает
+        """
+        return bool(self.admin_token) and token == self.admin_token
+
+    def is_requested(self, profile_flag: Optional[str], token: Optional[str]) -> bool:
+        """Проверяет, запрошено ли профилирование администратором"""
+        return profile_flag in ("1", "true", "yes") and self.is_admin(token)
+
+    def is_sampled(self, path: str) -> bool:
+        """Проверяет, попал ли запрос в сэмпл фонового профилирования"""
+        return self.sample_rate > 0 and path.startswith(self.sampled_paths) and random.random() < self.sample_rate
+
+    def start(self, path: str) -> Tuple[RequestProfile, Optional[cProfile.Profile], Any]:
+        """
+        Начинает профилирование запроса
+
+        Args:
+            path: путь запроса
+
+        Returns:
+            Профиль, запущенный cProfile (или None) и токен контекста
+        """
+        profile = RequestProfile(path=path)
+        token = _current_profile.set(profile)
+
+        # В интерпретаторе может работать только один профилировщик:
+        # параллельный запрос получает только разбивку по этапам
+        profiler = None
+        if not self._profiler_active:
+            self._profiler_active = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profile, profiler, token
+
+    def finish(self, profile: RequestProfile, profiler: Optional[cProfile.Profile], token: Any) -> Dict[str, Any]:
+        """
+        Завершает профилирование и сохраняет результат
+
+        Returns:
+            Сводка профиля
+        """
+        if profiler is not None:
+            profiler.disable()
+            self._profiler_active = False
+        _current_profile.reset(token)
+        profile.finish()
+
+        summary = profile.summary()
+        if profiler is not None:
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                pstats_path = os.path.join(self.output_dir, f"{profile.id}.pstats")
+                profiler.dump_stats(pstats_path)
+                summary["pstats_file"] = pstats_path
+            except OSError as e:
+                logger.error(f"Error saving profile {profile.id}: {e}")
+
+        self._store(summary)
+        logger.info(f"Profiled {profile.path} in {summary['total_ms']:.1f} ms, profile id {profile.id}")
+        return summary
+
+    def _store(self, summary: Dict[str, Any]) -> None:
+        self._profiles[summary["id"]] = summary
+        while len(self._profiles) > self.max_stored:
+            _, evicted = self._profiles.popitem(last=False)
+            pstats_file = evicted.get("pstats_file")
+            if pstats_file and os.path.exists(pstats_file):
+                os.remove(pstats_file)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Возвращает сводки сохраненных профилей, новые первыми"""
+        return list(reversed(self._profiles.values()))
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает сводку профиля по идентификатору"""
+        return self._profiles.get(profile_id)
+
+
+# Профилировщик запросов процесса
+profiling_service = ProfilingService()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config import settings
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StartupCheck:
+    """Шаг запуска: асинхронная функция с дедлайном и зависимостями от других шагов"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], required: bool = True,
+                 depends_on: Optional[List[str]] = None, timeout: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.required = required
+        self.depends_on = depends_on or []
+        self.timeout = timeout or settings.startup_check_timeout_seconds
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "duration_seconds": round(self.duration, 3) if self.duration is not None else None,
+            "error": self.error
+        }
+
+
+class ReadinessService:
+    """
+    Неблокирующий конвейер запуска и состояние готовности сервиса
+
+    Шаги запуска выполняются конкурентно в фоне, каждый со своим дедлайном.
+    Сервис готов принимать трафик, когда все обязательные шаги завершились успешно.
+    """
+
+    def __init__(self):
+        self._checks: Dict[str, StartupCheck] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._pipeline_task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        metrics.register_collector("readiness", self.get_status)
+
+    def register_check(self, name: str, func: Callable[[], Awaitable[Any]], required: bool = True,
+                       depends_on: Optional[List[str]] = None, timeout: Optional[float] = None) -> None:
+        """
+        Регистрирует шаг запуска
+
+        Args:
+            name: имя шага
+            func: асинхронная функция без аргументов
+            required: нужен ли успешный шаг для готовности
+            depends_on: шаги, которые должны успешно завершиться до этого шага
+            timeout: дедлайн шага в секундах
+        """
+        self._checks[name] = StartupCheck(name, func, required, depends_on, timeout)
+
+    def start(self) -> None:
+        """Запускает конвейер в фоне, не блокируя старт сервера"""
+        self._started_at = time.monotonic()
+        self._pipeline_task = asyncio.create_task(self._run_pipeline())
+
+    async def _run_pipeline(self) -> None:
+        checks = list(self._checks.values())
+        while True:
+            for check in checks:
+                self._tasks[check.name] = asyncio.create_task(self._run_check(check))
+            await asyncio.gather(*[self._tasks[check.name] for check in checks], return_exceptions=True)
+
+            elapsed = time.monotonic() - self._started_at
+            logger.info(f"Startup pipeline finished in {elapsed:.2f}s, ready: {self.is_ready()}")
+            if self.is_ready():
+                return
+
+            # Повторяем неудавшиеся шаги, пока зависимости не станут доступны
+            await asyncio.sleep(settings.startup_retry_interval_seconds)
+            checks = [check for check in self._checks.values() if check.status != "ok"]
+            for check in checks:
+                check.status = "pending"
+                check.error = None
+
+    async def _run_check(self, check: StartupCheck) -> bool:
+        for dependency in check.depends_on:
+            dependency_task = self._tasks.get(dependency)
+            if dependency_task is None or self._checks[dependency].status == "ok":
+                continue
+            if not await asyncio.shield(dependency_task):
+                check.status = "skipped"
+                check.error = f"dependency '{dependency}' failed"
+                logger.warning(f"Startup check '{check.name}' skipped: {check.error}")
+                return False
+
+        check.status = "running"
+        started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(check.func(), timeout=check.timeout)
+            check.status = "ok"
+            logger.info(f"Startup check '{check.name}' completed")
+        except asyncio.TimeoutError:
+            check.status = "timeout"
+            check.error = f"deadline of {check.timeout}s exceeded"
+            logger.error(f"Startup check '{check.name}' timed out after {check.timeout}s")
+        except Exception as e:
+            check.status = "failed"
+            check.error = str(e)
+            logger.error(f"Startup check '{check.name}' failed: {e}")
+        finally:
+            check.duration = time.monotonic() - started_at
+
+        return check.status == "ok"
+
+    def is_ready(self) -> bool:
+        """
+        Проверяет готовность сервиса
+
+        Returns:
+            True если все обязательные шаги запуска успешны
+        """
+        if self._started_at is None:
+            return False
+        return all(check.status == "ok" for check in self._checks.values() if check.required)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Возвращает состояние готовности
+
+        Returns:
+            Флаг готовности и состояние каждого шага запуска
+        """
+        return {
+            "ready": self.is_ready(),
+            "checks": {name: check.to_dict() for name, check in self._checks.items()}
+        }
+
+    async def stop(self) -> None:
+        """Отменяет незавершенные шаги запуска"""
+        tasks = list(self._tasks.values())
+        if self._pipeline_task is not None:
+            tasks.insert(0, self._pipeline_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Состояние готовности процесса
+readiness_service = ReadinessService()
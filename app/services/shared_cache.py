@@ -0,0 +1,272 @@
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import get_shared_cache_config
+from app.services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Заголовок слота: seqlock-счетчик, ключ (sha256), площадь, время записи, длина данных
+_SEQ = struct.Struct("<Q")
+_META = struct.Struct("<32sddI")
+_SLOT_HEADER_SIZE = 64
+_EMPTY_KEY = b"\x00" * 32
+# Повторы чтения слота, который в этот момент пишет другой процесс
+_READ_RETRIES = 3
+
+
+class SharedPolygonCache:
+    """
+    Кэш горячих полигонов в разделяемой памяти, общий для всех воркеров
+
+    Таблица фиксированного размера в multiprocessing.shared_memory, разбитая на
+    множества по ways слотов (set-associative хэш-таблица). Сегмент и блокировки
+    создаются в главном процессе до fork, воркеры наследуют их, поэтому N воркеров
+    держат одну копию горячего набора, а полигон, построенный одним воркером,
+    сразу доступен остальным.
+
+    Чтение не берет блокировок: каждый слот защищен seqlock-счетчиком (нечетный
+    во время записи), и читатель перечитывает слот, если счетчик изменился.
+    Запись сериализуется блокировкой множества (блокировки разбиты на полосы).
+    В множестве вытесняется самая старая запись.
+    """
+
+    def __init__(self):
+        self.config = get_shared_cache_config()
+        self.enabled = self.config.get('enabled', True)
+        self.slots = max(1, self.config.get('slots', 4096))
+        self.slot_bytes = max(_SLOT_HEADER_SIZE + 1, self.config.get('slot_bytes', 16384))
+        self.ways = max(1, min(self.config.get('ways', 4), self.slots))
+        self.sets = self.slots // self.ways
+        self.capacity = self.slot_bytes - _SLOT_HEADER_SIZE
+
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._buffer: Optional[memoryview] = None
+        self._locks: List[Any] = []
+        self._owner = False
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.too_large = 0
+        metrics.register_collector("shared_cache", self.get_metrics)
+
+    @property
+    def attached(self) -> bool:
+        """Создан ли сегмент разделяемой памяти в этом процессе или унаследован от родителя"""
+        return self._buffer is not None
+
+    def create(self) -> bool:
+        """
+        Создает сегмент разделяемой памяти и блокировки
+
+        Вызывается в главном процессе до запуска воркеров.
+
+        Returns:
+            True если кэш создан
+        """
+        if not self.enabled or self.attached:
+            return self.attached
+
+        size = self.sets * self.ways * self.slot_bytes
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        # Сегмент может оказаться больше запрошенного (округление до страницы)
+        self._buffer = self._shm.buf[:size]
+        self._buffer[:] = bytes(size)
+        self._locks = [multiprocessing.Lock() for _ in range(min(64, self.sets))]
+        self._owner = True
+        logger.info(
+            f"Shared polygon cache created: {self.sets * self.ways} slots of {self.slot_bytes} bytes "
+            f"({size / 1024 / 1024:.1f} MB)"
+        )
+        return True
+
+    def release_ownership(self) -> None:
+        """Вызывается в воркере: унаследованный сегмент только закрывается при выходе"""
+        self._owner = False
+
+    def destroy(self) -> None:
+        """Освобождает сегмент; удаляет его из системы только процесс-владелец"""
+        if self._shm is None:
+            return
+        self._buffer.release()
+        self._buffer = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+        self._locks = []
+
+    def _set_index(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.sets
+
+    def _set_offsets(self, set_index: int) -> Iterator[int]:
+        start = set_index * self.ways
+        return (slot * self.slot_bytes for slot in range(start, start + self.ways))
+
+    def _lock(self, set_index: int):
+        return self._locks[set_index % len(self._locks)]
+
+    @staticmethod
+    def _digest(cache_key: str) -> bytes:
+        # Ключи кэша - hex sha256, поэтому байты ключа уже равномерно распределены
+        return bytes.fromhex(cache_key)
+
+    def get(self, cache_key: str) -> Optional[Tuple[str, float]]:
+        """
+        Ищет полигон по ключу кэша
+
+        Args:
+            cache_key: ключ кэша полигона
+
+        Returns:
+            GeoJSON строка и площадь или None
+        """
+        if self._buffer is None:
+            return None
+
+        digest = self._digest(cache_key)
+        buffer = self._buffer
+        for offset in self._set_offsets(self._set_index(digest)):
+            for _ in range(_READ_RETRIES):
+                seq_before = _SEQ.unpack_from(buffer, offset)[0]
+                if seq_before & 1:
+                    continue
+                key, area, _, length = _META.unpack_from(buffer, offset + _SEQ.size)
+                if key != digest:
+                    break
+                data_offset = offset + _SLOT_HEADER_SIZE
+                data = bytes(buffer[data_offset:data_offset + min(length, self.capacity)])
+                if _SEQ.unpack_from(buffer, offset)[0] == seq_before:
+                    self.hits += 1
+                    return data.decode(), area
+        self.misses += 1
+        return None
+
+    def put(self, cache_key: str, polygon_json: str, area: float) -> bool:
+        """
+        Сохраняет полигон, вытесняя самую старую запись множества
+
+        Returns:
+            True если полигон сохранен (не сохраняются полигоны больше слота)
+        """
+        if self._buffer is None:
+            return False
+
+        data = polygon_json.encode()
+        if len(data) > self.capacity:
+            self.too_large += 1
+            return False
+
+        digest = self._digest(cache_key)
+        set_index = self._set_index(digest)
+        buffer = self._buffer
+        with self._lock(set_index):
+            target = None
+            empty = None
+            oldest = None
+            for offset in self._set_offsets(set_index):
+                key, _, stored_at, _ = _META.unpack_from(buffer, offset + _SEQ.size)
+                if key == digest:
+                    target = offset
+                    break
+                if key == _EMPTY_KEY:
+                    if empty is None:
+                        empty = offset
+                elif oldest is None or stored_at < oldest[0]:
+                    oldest = (stored_at, offset)
+            if target is None:
+                target = empty
+            if target is None:
+                target = oldest[1]
+                self.evictions += 1
+            self._write_slot(target, digest, area, data)
+        self.stores += 1
+        return True
+
+    def delete(self, cache_key: str) -> bool:
+        """
+        Удаляет полигон по ключу кэша
+
+        Returns:
+            True если запись была в кэше
+        """
+        if self._buffer is None:
+            return False
+
+        digest = self._digest(cache_key)
+        set_index = self._set_index(digest)
+        with self._lock(set_index):
+            for offset in self._set_offsets(set_index):
+                if _META.unpack_from(self._buffer, offset + _SEQ.size)[0] == digest:
+                    self._write_slot(offset, _EMPTY_KEY, 0.0, b"")
+                    return True
+        return False
+
+    def clear(self) -> None:
+        """Очищает кэш во всех воркерах"""
+        if self._buffer is None:
+            return
+        for set_index in range(self.sets):
+            with self._lock(set_index):
+                for offset in self._set_offsets(set_index):
+                    if _META.unpack_from(self._buffer, offset + _SEQ.size)[0] != _EMPTY_KEY:
+                        self._write_slot(offset, _EMPTY_KEY, 0.0, b"")
+
+    def _write_slot(self, offset: int, digest: bytes, area: float, data: bytes) -> None:
+        # Вызывается под блокировкой множества: нечетный счетчик сообщает читателям о записи
+        buffer = self._buffer
+        seq = _SEQ.unpack_from(buffer, offset)[0]
+        _SEQ.pack_into(buffer, offset, seq + 1)
+        stored_at = time.monotonic() if data else 0.0
+        _META.pack_into(buffer, offset + _SEQ.size, digest, area, stored_at, len(data))
+        data_offset = offset + _SLOT_HEADER_SIZE
+        buffer[data_offset:data_offset + len(data)] = data
+        _SEQ.pack_into(buffer, offset, seq + 2)
+
+    def on_cache_write(self, cache_key: str, lat: float, lon: float, radius_meters: float,
+                       polygon_json: str, area: float) -> None:
+        """Сохраняет записанный в кэш полигон"""
+        self.put(cache_key, polygon_json, area)
+
+    def on_cache_delete(self, cache_key: str) -> None:
+        """Удаляет полигон, удаленный из кэша"""
+        self.delete(cache_key)
+
+    def on_cache_clear(self) -> None:
+        """Очищает кэш после очистки хранилища"""
+        self.clear()
+
+    def _count_entries(self) -> int:
+        return sum(
+            1 for slot in range(self.sets * self.ways)
+            if _META.unpack_from(self._buffer, slot * self.slot_bytes + _SEQ.size)[0] != _EMPTY_KEY
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики кэша
+
+        Returns:
+            Размер таблицы, заполненность (общая для воркеров) и счетчики процесса
+        """
+        return {
+            "enabled": self.enabled,
+            "attached": self.attached,
+            "slots": self.sets * self.ways,
+            "slot_bytes": self.slot_bytes,
+            "entries": self._count_entries() if self.attached else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "too_large": self.too_large
+        }
+
+
+# Кэш горячих полигонов процесса (сегмент создается сервером до запуска воркеров)
+shared_polygon_cache = SharedPolygonCache()
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import quote
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+_JWT_GRANT_TYPE = "urn:ietf:params:oauth:grant-type:jwt-bearer"
+_SCOPE = "https://www.googleapis.com/auth/spreadsheets"
+_TOKEN_LIFETIME_SECONDS = 3600
+
+
+class SheetsApiError(RuntimeError):
+    """Ошибка ответа Google Sheets API или сервера токенов"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
+def _is_retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class SheetsClient:
+    """
+    Асинхронный клиент Google Sheets API на httpx
+
+    Один AsyncClient с пулом keep-alive соединений на процесс, запросы не блокируют
+    event loop и потоки. Токен сервисного аккаунта (JWT bearer grant) кэшируется и
+    обновляется в фоне до истечения, поэтому запросы не ждут сервер токенов.
+    Ответы 429/5xx и сетевые ошибки повторяются с экспоненциальной задержкой
+    со случайным разбросом (full jitter) с учетом Retry-After.
+
+    Адреса API и сервера токенов настраиваются, что позволяет проверять клиент
+    на локальном mock-сервере.
+    """
+
+    def __init__(self, service_account_info: Dict[str, Any], config: Dict[str, Any]):
+        self.service_account_info = service_account_info
+        self.base_url = config.get('base_url') or "https://sheets.googleapis.com"
+        self.token_uri = config.get('token_uri') or service_account_info.get('token_uri') or _DEFAULT_TOKEN_URI
+        self.max_connections = max(1, config.get('max_connections', 10))
+        self.timeout = config.get('timeout', 10.0)
+        self.max_retries = max(0, config.get('max_retries', 4))
+        self.backoff_base = config.get('backoff_base', 0.5)
+        self.backoff_max = config.get('backoff_max', 30.0)
+        self.token_refresh_margin = config.get('token_refresh_margin', 300.0)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._signer = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.token_refreshes = 0
+
+    @classmethod
+    def from_service_account_file(cls, path: str, config: Dict[str, Any]) -> "SheetsClient":
+        """Создает клиент по JSON-файлу ключа сервисного аккаунта"""
+        with open(path) as file:
+            return cls(json.load(file), config)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Закрывает соединения пула"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _send(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Выполняет запрос, повторяя его при 429/5xx и сетевых ошибках"""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = await send()
+            except httpx.TransportError as e:
+                error: Exception = e
+            else:
+                if not _is_retryable(response.status_code):
+                    return response
+                error = SheetsApiError(response.status_code, response.text[:200])
+                retry_after = response.headers.get("Retry-After")
+
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            delay = self._backoff(attempt, retry_after)
+            logger.debug(f"Retrying Sheets request in {delay:.2f}s after error: {error}")
+            await asyncio.sleep(delay)
+        raise error
+
+    def _make_assertion(self) -> bytes:
+        from google.auth import crypt, jwt
+        if self._signer is None:
+            self._signer = crypt.RSASigner.from_service_account_info(self.service_account_info)
+        now = int(time.time())
+        return jwt.encode(self._signer, {
+            "iss": self.service_account_info["client_email"],
+            "scope": _SCOPE,
+            "aud": self.token_uri,
+            "iat": now,
+            "exp": now + _TOKEN_LIFETIME_SECONDS
+        })
+
+    async def _refresh_token(self, force: bool = False) -> str:
+        async with self._token_lock:
+            # Токен мог обновить другой запрос, пока этот ждал блокировку
+            if not force and self._token and time.monotonic() < self._token_expires_at - self.token_refresh_margin:
+                return self._token
+
+            assertion = self._make_assertion()
+            client = self._get_client()
+            response = await self._send(lambda: client.post(
+                self.token_uri, data={"grant_type": _JWT_GRANT_TYPE, "assertion": assertion}
+            ))
+            if response.is_error:
+                raise SheetsApiError(response.status_code, response.text[:200])
+
+            payload = response.json()
+            self._token = payload["access_token"]
+            self._token_expires_at = time.monotonic() + float(payload.get("expires_in", _TOKEN_LIFETIME_SECONDS))
+            self.token_refreshes += 1
+            logger.debug("Google access token refreshed")
+            return self._token
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self._refresh_token()
+        except Exception as e:
+            logger.warning(f"Background refresh of Google access token failed: {e}")
+
+    async def get_token(self) -> str:
+        """
+        Возвращает токен доступа
+
+        Токен, срок которого подходит к концу, еще используется, а новый запрашивается
+        в фоне; ожидание сервера токенов - только без действующего токена.
+        """
+        now = time.monotonic()
+        if self._token and now < self._token_expires_at:
+            if now >= self._token_expires_at - self.token_refresh_margin and (
+                    self._refresh_task is None or self._refresh_task.done()):
+                self._refresh_task = asyncio.get_running_loop().create_task(self._background_refresh())
+            return self._token
+        return await self._refresh_token()
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      json_body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Выполняет авторизованный запрос к API
+
+        Args:
+            method: HTTP метод
+            path: путь относительно base_url
+            params: параметры строки запроса
+            json_body: тело запроса
+
+        Returns:
+            Разобранный JSON ответа
+
+        Raises:
+            SheetsApiError: API вернул ошибку (после повторов для 429/5xx)
+            httpx.TransportError: сеть недоступна после всех повторов
+        """
+        self.requests += 1
+        client = self._get_client()
+        try:
+            token = await self.get_token()
+            for attempt in range(2):
+                headers = {"Authorization": f"Bearer {token}"}
+                response = await self._send(
+                    lambda: client.request(method, path, params=params, json=json_body, headers=headers)
+                )
+                if response.status_code == 401 and attempt == 0:
+                    # Токен отозван или истек раньше срока - один повтор с новым
+                    token = await self._refresh_token(force=True)
+                    continue
+                if response.is_error:
+                    raise SheetsApiError(response.status_code, response.text[:200])
+                return response.json()
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def append_values(self, spreadsheet_id: str, range_name: str, values: List[List[Any]]) -> Dict[str, Any]:
+        """Добавляет строки в конец диапазона (spreadsheets.values.append)"""
+        return await self.request(
+            "POST",
+            f"/v4/spreadsheets/{spreadsheet_id}/values/{quote(range_name, safe='!:')}:append",
+            params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+            json_body={"values": values}
+        )
+
+    async def update_values(self, spreadsheet_id: str, range_name: str, values: List[List[Any]]) -> Dict[str, Any]:
+        """Записывает значения в диапазон (spreadsheets.values.update)"""
+        return await self.request(
+            "PUT",
+            f"/v4/spreadsheets/{spreadsheet_id}/values/{quote(range_name, safe='!:')}",
+            params={"valueInputOption": "RAW"},
+            json_body={"values": values}
+        )
+
+    async def create_spreadsheet(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Создает таблицу (spreadsheets.create)"""
+        return await self.request("POST", "/v4/spreadsheets", json_body=body)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики клиента
+
+        Returns:
+            Счетчики запросов, повторов, ошибок и обновлений токена
+        """
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "token_refreshes": self.token_refreshes,
+            "token_valid_seconds": max(0.0, self._token_expires_at - time.monotonic()) if self._token else 0.0
+        }
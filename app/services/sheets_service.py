@@ -1,10 +1,8 @@
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from app.config import get_google_config, is_google_sheets_enabled
+from app.config import get_analytics_config, get_google_config, is_google_sheets_enabled
+from app.services.metrics_service import metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,27 +10,55 @@ logger = logging.getLogger(__name__)
 
 class SheetsService:
     def __init__(self):
-        self.scope = ['https://www.googleapis.com/auth/spreadsheets']
-        self.credentials = None
-        self.service = None
+        self.client = None
         self.config = get_google_config()
         self.spreadsheet_id = self.config.get('spreadsheet_id')
-        self._initialize_service()
+        self.summary_range = get_analytics_config().get('sheets_summary_range', 'Summary!A:H')
+        self._initialized = False
+        metrics.register_collector("sheets", self.get_metrics)
     
-    def _initialize_service(self):
-        """Инициализирует сервис Google Sheets"""
+    def _get_client(self):
+        """Возвращает клиент Google Sheets, создавая его при первом обращении"""
+        if not self._initialized:
+            self._initialized = True
+            self._initialize_client()
+        return self.client
+    
+    async def warm_up(self) -> bool:
+        """
+        Создает клиент Google Sheets и получает токен заранее, вне пути обработки запроса
+        
+        Returns:
+            True если клиент доступен
+        """
+        client = self._get_client()
+        if client is None:
+            return False
+        try:
+            await client.get_token()
+        except Exception as e:
+            logger.error(f"Error obtaining Google access token: {e}")
+            return False
+        return True
+    
+    async def aclose(self) -> None:
+        """Закрывает соединения клиента"""
+        if self.client is not None:
+            await self.client.aclose()
+    
+    def _initialize_client(self):
+        """Инициализирует клиент Google Sheets"""
         if not is_google_sheets_enabled():
             logger.warning("Google Sheets integration is disabled - missing configuration")
             return
             
         try:
+            from app.services.sheets_client import SheetsClient
+            
             service_account_file = self.config.get('service_account_file')
             
             if os.path.exists(service_account_file):
-                self.credentials = Credentials.from_service_account_file(
-                    service_account_file, scopes=self.scope
-                )
-                self.service = build('sheets', 'v4', credentials=self.credentials)
+                self.client = SheetsClient.from_service_account_file(service_account_file, self.config)
                 logger.info("Google Sheets service initialized successfully")
             else:
                 logger.warning(f"Service account file {service_account_file} not found")
@@ -52,10 +78,13 @@ class SheetsService:
         Returns:
             True если запись успешна
         """
-        if not self.service or not self.spreadsheet_id:
+        client = self._get_client()
+        if not client or not self.spreadsheet_id:
             logger.warning("Google Sheets service not available")
             return False
         
+        from app.services.sheets_client import SheetsApiError
+        
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
@@ -69,31 +98,64 @@ class SheetsService:
                 ]
             ]
             
-            range_name = 'A:E'
-            
-            body = {
-                'values': values
-            }
-            
-            result = self.service.spreadsheets().values().append(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                insertDataOption='INSERT_ROWS',
-                body=body
-            ).execute()
+            result = await client.append_values(self.spreadsheet_id, 'A:E', values)
             
-            logger.info(f"Logged request to Google Sheets: {result.get('updates').get('updatedCells')} cells updated")
+            logger.info(f"Logged request to Google Sheets: {result.get('updates', {}).get('updatedCells')} cells updated")
             return True
             
-        except HttpError as error:
+        except SheetsApiError as error:
             logger.error(f"Error logging to Google Sheets: {error}")
             return False
         except Exception as e:
             logger.error(f"Unexpected error logging to Google Sheets: {e}")
             return False
     
-    def create_spreadsheet(self, title: str = "GeoPolygon API Logs") -> Optional[str]:
+    async def log_summary(self, summary: Dict[str, Any]) -> bool:
+        """
+        Записывает сводку аналитики запросов одной строкой в Google Sheets
+        
+        Args:
+            summary: сводка из AnalyticsService.get_summary
+            
+        Returns:
+            True если запись успешна
+        """
+        client = self._get_client()
+        if not client or not self.spreadsheet_id:
+            return False
+        
+        from app.services.sheets_client import SheetsApiError
+        
+        latency = summary.get("latency_ms", {})
+        hot_keys = summary.get("hot_keys") or [{}]
+        top = hot_keys[0]
+        hot_key = (
+            f"{top['latitude']:.6f}, {top['longitude']:.6f}, {top['radius_meters']:.2f} ({top['requests']})"
+            if top else ""
+        )
+        values = [[
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            summary.get("period_hours", 0),
+            summary.get("requests", 0),
+            f"{summary.get('hit_rate') or 0.0:.4f}",
+            f"{latency.get('p50') or 0.0:.2f}",
+            f"{latency.get('p95') or 0.0:.2f}",
+            f"{latency.get('p99') or 0.0:.2f}",
+            hot_key
+        ]]
+        
+        try:
+            await client.append_values(self.spreadsheet_id, self.summary_range, values)
+            logger.info(f"Logged analytics summary to Google Sheets: {summary.get('requests', 0)} requests")
+            return True
+        except SheetsApiError as error:
+            logger.error(f"Error logging summary to Google Sheets: {error}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error logging summary to Google Sheets: {e}")
+            return False
+    
+    async def create_spreadsheet(self, title: str = "GeoPolygon API Logs") -> Optional[str]:
         """
         Создает новую Google таблицу
         
@@ -103,10 +165,13 @@ class SheetsService:
         Returns:
             ID созданной таблицы
         """
-        if not self.service:
+        client = self._get_client()
+        if not client:
             logger.warning("Google Sheets service not available")
             return None
         
+        from app.services.sheets_client import SheetsApiError
+        
         try:
             spreadsheet = {
                 'properties': {
@@ -121,29 +186,51 @@ class SheetsService:
                                 'columnCount': 5
                             }
                         }
+                    },
+                    {
+                        'properties': {
+                            'title': 'Summary',
+                            'gridProperties': {
+                                'rowCount': 1000,
+                                'columnCount': 8
+                            }
+                        }
                     }
                 ]
             }
             
-            spreadsheet = self.service.spreadsheets().create(body=spreadsheet).execute()
+            spreadsheet = await client.create_spreadsheet(spreadsheet)
             spreadsheet_id = spreadsheet.get('spreadsheetId')
             
             # Добавляем заголовки
             headers = [['Дата и время', 'Широта', 'Долгота', 'Радиус (м)', 'Площадь (м²)']]
             
-            self.service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range='A1:E1',
-                valueInputOption='RAW',
-                body={'values': headers}
-            ).execute()
+            await client.update_values(spreadsheet_id, 'A1:E1', headers)
+            await client.update_values(spreadsheet_id, 'Summary!A1:H1', [[
+                'Дата и время', 'Период (ч)', 'Запросов', 'Доля попаданий в кэш',
+                'p50 (мс)', 'p95 (мс)', 'p99 (мс)', 'Самый частый запрос'
+            ]])
             
             logger.info(f"Created Google Spreadsheet: {spreadsheet_id}")
             return spreadsheet_id
             
-        except HttpError as error:
+        except SheetsApiError as error:
             logger.error(f"Error creating Google Spreadsheet: {error}")
             return None
+        except Exception as e:
+            logger.error(f"Unexpected error creating Google Spreadsheet: {e}")
+            return None
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики интеграции с Google Sheets
+        
+        Returns:
+            Метрики HTTP клиента или признак недоступности
+        """
+        if self.client is None:
+            return {"available": False}
+        return {"available": True, **self.client.get_metrics()}
     
     def get_spreadsheet_url(self) -> Optional[str]:
         """
@@ -0,0 +1,327 @@
+import asyncio
+import itertools
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import orjson
+import shapely
+from shapely import STRtree
+from app.config import get_spatial_index_config
+from app.repositories.cache_repository import CacheRepository
+from app.services.metrics_service import metrics
+from app.services.profiling_service import profile_stage
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IndexRecord(NamedTuple):
+    """Запись пространственного индекса: полигон кэша и его свойства"""
+    record_id: int
+    cache_key: str
+    latitude: float
+    longitude: float
+    radius_meters: float
+    area_sqm: float
+    polygon_json: str
+
+
+class SpatialIndexService:
+    """
+    Пространственный индекс кэшированных полигонов в памяти (shapely STRtree)
+
+    STRtree неизменяем, поэтому новые записи из CacheService попадают в небольшой
+    буфер, который проверяется векторизованно, а при накоплении порога дерево
+    перестраивается в фоновом потоке. Удаленные записи отсекаются по идентификатору.
+    Если индекс не загружен или кэш не помещается в память, запросы обслуживает
+    PostGIS по GiST индексу колонки geom.
+    """
+
+    def __init__(self):
+        self.config = get_spatial_index_config()
+        self.enabled = self.config.get('enabled', True)
+        self.max_entries = self.config.get('max_entries', 200000)
+        self.rebuild_threshold = max(1, self.config.get('rebuild_threshold', 1000))
+        self.max_results = self.config.get('max_results', 1000)
+        self.repository = CacheRepository()
+
+        self._ids = itertools.count()
+        # Актуальный идентификатор записи для каждого ключа кэша
+        self._alive: Dict[str, int] = {}
+        self._tree: Optional[STRtree] = None
+        self._records: List[IndexRecord] = []
+        self._pending_geometries: List[Any] = []
+        self._pending_records: List[IndexRecord] = []
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._loaded = False
+        self._too_large = False
+        # Меняется при очистке и загрузке индекса, чтобы не применить устаревшее перестроение
+        self._epoch = 0
+        metrics.register_collector("spatial_index", self.get_metrics)
+
+    @property
+    def in_memory(self) -> bool:
+        """Обслуживаются ли запросы индексом в памяти"""
+        return self.enabled and self._loaded and not self._too_large
+
+    async def load(self) -> int:
+        """
+        Загружает все записи кэша и строит индекс
+
+        Returns:
+            Количество проиндексированных записей
+        """
+        if not self.enabled:
+            return 0
+
+        rows = await self.repository.load_index_entries(self.max_entries + 1)
+        if len(rows) > self.max_entries:
+            self._too_large = True
+            self._loaded = True
+            logger.warning(f"Cache has more than {self.max_entries} entries, spatial queries will use PostGIS")
+            return 0
+
+        epoch = self._epoch
+        records = []
+        for cache_key, lat, lon, radius_meters, area, polygon_json in rows:
+            record = IndexRecord(next(self._ids), cache_key, lat, lon, radius_meters, area, polygon_json)
+            self._alive[cache_key] = record.record_id
+            records.append(record)
+
+        # Записи, пришедшие во время загрузки, остаются в буфере и будут учтены при следующем перестроении
+        tree, records = await asyncio.to_thread(self._build_tree, records)
+        if epoch != self._epoch:
+            logger.info("Cache was cleared while building spatial index, discarding loaded entries")
+            self._loaded = True
+            return 0
+        # Перестроение, начатое до загрузки, не должно заменить загруженное дерево
+        self._epoch += 1
+        self._tree, self._records = tree, records
+        self._too_large = False
+        self._loaded = True
+        logger.info(f"Spatial index built for {len(records)} cache entries")
+        return len(records)
+
+    @staticmethod
+    def _build_tree(records: List[IndexRecord]):
+        geometries = shapely.from_geojson(np.array([record.polygon_json for record in records], dtype=object))
+        return STRtree(geometries), records
+
+    def on_cache_write(self, cache_key: str, lat: float, lon: float, radius_meters: float,
+                       polygon_json: str, area: float) -> None:
+        """Добавляет новую запись кэша в индекс"""
+        if not self.enabled or self._too_large:
+            return
+
+        record = IndexRecord(next(self._ids), cache_key, lat, lon, radius_meters, area, polygon_json)
+        self._alive[cache_key] = record.record_id
+        self._pending_geometries.append(shapely.from_geojson(polygon_json))
+        self._pending_records.append(record)
+
+        if self._loaded and len(self._alive) > self.max_entries:
+            self._switch_to_postgis()
+        elif len(self._pending_records) >= self.rebuild_threshold:
+            self._schedule_rebuild()
+
+    def on_cache_delete(self, cache_key: str) -> None:
+        """Исключает запись кэша из результатов"""
+        self._alive.pop(cache_key, None)
+
+    def on_cache_clear(self) -> None:
+        """Сбрасывает индекс после очистки кэша"""
+        self._epoch += 1
+        self._alive.clear()
+        self._tree = None
+        self._records = []
+        self._pending_geometries = []
+        self._pending_records = []
+        if self._too_large:
+            self._too_large = False
+            self._loaded = True
+
+    def on_cache_generation(self, generation: int) -> None:
+        """Сбрасывает индекс после очистки кэша другим процессом"""
+        self.on_cache_clear()
+
+    def _switch_to_postgis(self) -> None:
+        logger.warning(f"Spatial index exceeded {self.max_entries} entries, spatial queries will use PostGIS")
+        self._epoch += 1
+        self._too_large = True
+        self._tree = None
+        self._records = []
+        self._pending_geometries = []
+        self._pending_records = []
+        self._alive.clear()
+
+    def _schedule_rebuild(self) -> None:
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+        try:
+            self._rebuild_task = asyncio.get_running_loop().create_task(self._rebuild())
+        except RuntimeError:
+            # Вне event loop (например, в скриптах) перестраиваем синхронно
+            records, pending_count = self._snapshot()
+            tree, records = self._build_tree(records)
+            self._apply_rebuild(tree, records, pending_count, self._epoch)
+
+    def _snapshot(self):
+        pending_count = len(self._pending_records)
+        records = [
+            record for record in itertools.chain(self._records, self._pending_records)
+            if self._alive.get(record.cache_key) == record.record_id
+        ]
+        return records, pending_count
+
+    async def _rebuild(self) -> None:
+        epoch = self._epoch
+        records, pending_count = self._snapshot()
+        tree, records = await asyncio.to_thread(self._build_tree, records)
+        self._apply_rebuild(tree, records, pending_count, epoch)
+
+    def _apply_rebuild(self, tree: STRtree, records: List[IndexRecord], pending_count: int, epoch: int) -> None:
+        if epoch != self._epoch:
+            # Пока дерево строилось, индекс был очищен или загружен заново
+            return
+        self._tree, self._records = tree, records
+        del self._pending_geometries[:pending_count]
+        del self._pending_records[:pending_count]
+        metrics.increment("spatial_index_rebuilds")
+        logger.debug(f"Spatial index rebuilt with {len(records)} entries")
+
+    def _query_memory(self, geometry, tree_predicate: str, pending_predicate, limit: int) -> List[IndexRecord]:
+        return [record for record, _ in self._query_memory_geometries(geometry, tree_predicate, pending_predicate, limit)]
+
+    def _query_memory_geometries(self, geometry, tree_predicate: str, pending_predicate,
+                                 limit: int) -> List[Tuple[IndexRecord, Any]]:
+        candidates: List[Tuple[IndexRecord, Any]] = []
+        if self._tree is not None:
+            indices = np.sort(self._tree.query(geometry, predicate=tree_predicate))
+            candidates.extend(zip((self._records[i] for i in indices), self._tree.geometries[indices]))
+        if self._pending_geometries:
+            matches = pending_predicate(np.array(self._pending_geometries, dtype=object), geometry)
+            candidates.extend(
+                (record, pending_geometry)
+                for record, pending_geometry, match in zip(self._pending_records, self._pending_geometries, matches)
+                if match
+            )
+
+        results = []
+        for record, record_geometry in candidates:
+            if self._alive.get(record.cache_key) != record.record_id:
+                continue
+            results.append((record, record_geometry))
+            if len(results) >= limit:
+                break
+        return results
+
+    def find_geometries(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                        limit: int) -> List[Tuple[IndexRecord, Any]]:
+        """
+        Возвращает записи и геометрии из памяти, пересекающие прямоугольник (для локальной генерации тайлов)
+
+        Raises:
+            RuntimeError: если индекс не обслуживается из памяти
+        """
+        if not self.in_memory:
+            raise RuntimeError("Spatial index is not available in memory")
+        bbox = shapely.box(min_lon, min_lat, max_lon, max_lat)
+        return self._query_memory_geometries(bbox, "intersects", shapely.intersects, limit)
+
+    async def query_point(self, lat: float, lon: float, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Находит кэшированные полигоны, содержащие точку
+
+        Args:
+            lat: широта
+            lon: долгота
+            limit: максимальное количество результатов
+
+        Returns:
+            GeoJSON FeatureCollection и источник ответа (memory или postgis)
+        """
+        limit = min(limit or self.max_results, self.max_results)
+        if self.in_memory:
+            with profile_stage("spatial_index_query"):
+                # В дереве предикат применяется как predicate(точка, полигон), в буфере - как predicate(полигон, точка)
+                records = self._query_memory(shapely.Point(lon, lat), "within", shapely.contains, limit)
+            return self._to_feature_collection(records, "memory")
+
+        with profile_stage("postgis_spatial_query"):
+            entries = await self.repository.find_intersecting(lon, lat, lon, lat, limit)
+        return self._entries_to_feature_collection(entries)
+
+    async def query_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                         limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Находит кэшированные полигоны, пересекающие прямоугольник
+
+        Args:
+            min_lon, min_lat, max_lon, max_lat: границы прямоугольника
+            limit: максимальное количество результатов
+
+        Returns:
+            GeoJSON FeatureCollection и источник ответа (memory или postgis)
+        """
+        limit = min(limit or self.max_results, self.max_results)
+        if self.in_memory:
+            with profile_stage("spatial_index_query"):
+                bbox = shapely.box(min_lon, min_lat, max_lon, max_lat)
+                records = self._query_memory(bbox, "intersects", shapely.intersects, limit)
+            return self._to_feature_collection(records, "memory")
+
+        with profile_stage("postgis_spatial_query"):
+            entries = await self.repository.find_intersecting(min_lon, min_lat, max_lon, max_lat, limit)
+        return self._entries_to_feature_collection(entries)
+
+    @staticmethod
+    def _feature(polygon_json: str, lat: float, lon: float, radius_meters: float, area: float) -> Dict[str, Any]:
+        return {
+            "type": "Feature",
+            "geometry": orjson.Fragment(polygon_json),
+            "properties": {
+                "center": [lon, lat],
+                "radius": radius_meters,
+                "area_sqm": area
+            }
+        }
+
+    def _to_feature_collection(self, records: List[IndexRecord], source: str) -> Dict[str, Any]:
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                self._feature(record.polygon_json, record.latitude, record.longitude,
+                              record.radius_meters, record.area_sqm)
+                for record in records
+            ],
+            "source": source
+        }
+
+    def _entries_to_feature_collection(self, entries: List[Any]) -> Dict[str, Any]:
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                self._feature(entry.polygon_data, entry.latitude, entry.longitude,
+                              entry.radius_meters, entry.area_sqm)
+                for entry in entries
+            ],
+            "source": "postgis"
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики индекса
+
+        Returns:
+            Режим работы и количество записей в дереве и буфере
+        """
+        return {
+            "enabled": self.enabled,
+            "in_memory": self.in_memory,
+            "too_large": self._too_large,
+            "entries": len(self._alive),
+            "tree_size": len(self._records),
+            "pending": len(self._pending_records)
+        }
+
+
+# Пространственный индекс кэша процесса
+spatial_index_service = SpatialIndexService()
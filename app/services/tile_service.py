@@ -0,0 +1,318 @@
+import asyncio
+import math
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+import numpy as np
+import shapely
+from app.config import get_tile_config
+from app.repositories.cache_repository import CacheRepository
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.metrics_service import metrics
+from app.services.profiling_service import profile_stage
+from app.services.spatial_index_service import IndexRecord, spatial_index_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+LAYER_NAME = "coverage"
+
+# Радиус сферы Web Mercator (EPSG:3857) и граница по широте
+_MERCATOR_RADIUS = 6378137.0
+_MERCATOR_MAX_LAT = 85.0511287798066
+
+# Команды геометрии MVT
+_MOVE_TO = 1
+_LINE_TO = 2
+_CLOSE_PATH = 7
+_POLYGON = 3
+
+
+class CachedTile(NamedTuple):
+    data: bytes
+    bounds: Tuple[float, float, float, float]
+    cache_keys: FrozenSet[str]
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    Границы тайла в градусах WGS84
+
+    Returns:
+        min_lon, min_lat, max_lon, max_lat
+    """
+    n = 2 ** z
+
+    def _lat(tile_y: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360.0 - 180.0, _lat(y + 1), (x + 1) / n * 360.0 - 180.0, _lat(y)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 31)
+
+
+def _encode_ring(ring: np.ndarray, cursor: List[int], commands: List[int]) -> None:
+    # Последняя точка кольца совпадает с первой и заменяется командой ClosePath
+    points = ring[:-1]
+    if len(points) < 3:
+        return
+    commands.append(_MOVE_TO | (1 << 3))
+    x, y = int(points[0][0]), int(points[0][1])
+    commands.extend((_zigzag(x - cursor[0]), _zigzag(y - cursor[1])))
+    cursor[0], cursor[1] = x, y
+    commands.append(_LINE_TO | ((len(points) - 1) << 3))
+    for px, py in points[1:].tolist():
+        commands.extend((_zigzag(px - cursor[0]), _zigzag(py - cursor[1])))
+        cursor[0], cursor[1] = px, py
+    commands.append(_CLOSE_PATH | (1 << 3))
+
+
+def encode_polygon_geometry(geometry) -> List[int]:
+    """
+    Кодирует (мульти)полигон в тайловых координатах в команды геометрии MVT
+
+    Args:
+        geometry: Polygon или MultiPolygon в целочисленных координатах тайла (ось y вниз)
+
+    Returns:
+        Список команд и параметров
+    """
+    polygons = list(geometry.geoms) if geometry.geom_type == "MultiPolygon" else [geometry]
+    commands: List[int] = []
+    cursor = [0, 0]
+    for polygon in polygons:
+        if polygon.is_empty or polygon.area <= 0:
+            continue
+        for ring in [polygon.exterior, *polygon.interiors]:
+            _encode_ring(shapely.get_coordinates(ring).astype(np.int64), cursor, commands)
+    return commands
+
+
+class TileCache:
+    """LRU готовых тайлов с инвалидацией по области и по ключу кэша полигона"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._tiles: "OrderedDict[Tuple[int, int, int], CachedTile]" = OrderedDict()
+        # Меняется при любой инвалидации, чтобы не сохранить тайл, построенный по устаревшим данным
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[bytes]:
+        tile = self._tiles.get(key)
+        if tile is None:
+            self.misses += 1
+            return None
+        self._tiles.move_to_end(key)
+        self.hits += 1
+        return tile.data
+
+    def put(self, key: Tuple[int, int, int], tile: CachedTile, version: int) -> None:
+        if self.max_entries <= 0 or version != self.version:
+            return
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.max_entries:
+            self._tiles.popitem(last=False)
+
+    def invalidate_area(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> None:
+        self.version += 1
+        stale = [
+            key for key, tile in self._tiles.items()
+            if tile.bounds[0] <= max_lon and tile.bounds[2] >= min_lon
+            and tile.bounds[1] <= max_lat and tile.bounds[3] >= min_lat
+        ]
+        self._drop(stale)
+
+    def invalidate_key(self, cache_key: str) -> None:
+        self.version += 1
+        self._drop([key for key, tile in self._tiles.items() if cache_key in tile.cache_keys])
+
+    def clear(self) -> None:
+        self.version += 1
+        self.invalidated += len(self._tiles)
+        self._tiles.clear()
+
+    def _drop(self, keys: List[Tuple[int, int, int]]) -> None:
+        for key in keys:
+            del self._tiles[key]
+        self.invalidated += len(keys)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._tiles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated
+        }
+
+
+class TileService:
+    """
+    Векторные тайлы (Mapbox Vector Tile) из кэшированных полигонов
+
+    Тайл строится в PostGIS (ST_AsMVT, отбор по GiST индексу), при недоступности базы -
+    локально из пространственного индекса в памяти. Готовые тайлы хранятся в LRU,
+    который инвалидируется при записи, удалении и очистке кэша полигонов.
+    """
+
+    def __init__(self):
+        self.config = get_tile_config()
+        self.max_zoom = self.config.get('max_zoom', 22)
+        self.extent = self.config.get('extent', 4096)
+        self.buffer = self.config.get('buffer', 64)
+        self.max_features = self.config.get('max_features', 10000)
+        self.repository = CacheRepository()
+        self.cache = TileCache(self.config.get('cache_max_entries', 4096))
+        metrics.register_collector("tiles", self.get_metrics)
+
+    def validate_tile(self, z: int, x: int, y: int) -> bool:
+        """Проверяет, что координаты тайла существуют на уровне масштаба"""
+        return 0 <= z <= self.max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+    async def get_tile(self, z: int, x: int, y: int) -> Tuple[bytes, str]:
+        """
+        Возвращает векторный тайл
+
+        Args:
+            z, x, y: координаты тайла
+
+        Returns:
+            Байты тайла и источник (cache, postgis или local)
+
+        Raises:
+            ValueError: если координаты тайла некорректны
+            RuntimeError: если ни PostGIS, ни индекс в памяти недоступны
+        """
+        if not self.validate_tile(z, x, y):
+            raise ValueError("Некорректные координаты тайла")
+
+        key = (z, x, y)
+        data = self.cache.get(key)
+        if data is not None:
+            return data, "cache"
+
+        version = self.cache.version
+        try:
+            with profile_stage("postgis_mvt"):
+                data, cache_keys = await self.repository.get_mvt_tile(
+                    z, x, y, self.extent, self.buffer, self.max_features
+                )
+            source = "postgis"
+        except Exception as e:
+            if isinstance(e, CircuitOpenError):
+                logger.debug(f"Cache circuit is open, building tile {z}/{x}/{y} locally")
+            else:
+                logger.error(f"Error building tile {z}/{x}/{y} in db: {e}")
+            if not spatial_index_service.in_memory:
+                raise RuntimeError("Tile sources are unavailable") from e
+            with profile_stage("local_mvt"):
+                data, cache_keys = await self._build_local_tile(z, x, y)
+            source = "local"
+
+        self.cache.put(key, CachedTile(data, tile_bounds(z, x, y), frozenset(cache_keys)), version)
+        metrics.increment(f"tiles_{source}")
+        return data, source
+
+    async def _build_local_tile(self, z: int, x: int, y: int) -> Tuple[bytes, List[str]]:
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+        # Буфер тайла в градусах, чтобы захватить полигоны, выходящие за край
+        margin_lon = (max_lon - min_lon) * self.buffer / self.extent
+        margin_lat = (max_lat - min_lat) * self.buffer / self.extent
+        candidates = spatial_index_service.find_geometries(
+            min_lon - margin_lon, min_lat - margin_lat, max_lon + margin_lon, max_lat + margin_lat,
+            self.max_features
+        )
+        return await asyncio.to_thread(self._encode_tile, z, x, y, candidates)
+
+    def _encode_tile(self, z: int, x: int, y: int, candidates: List[Tuple[IndexRecord, Any]]) -> Tuple[bytes, List[str]]:
+        from app.proto.messages import VectorTile, VectorTileValue
+
+        world = 2 * math.pi * _MERCATOR_RADIUS
+        span = world / 2 ** z
+        min_x = -world / 2 + x * span
+        max_y = world / 2 - y * span
+        scale = self.extent / span
+
+        def _to_tile_coordinates(coords: np.ndarray) -> np.ndarray:
+            lon = np.radians(coords[:, 0])
+            lat = np.radians(np.clip(coords[:, 1], -_MERCATOR_MAX_LAT, _MERCATOR_MAX_LAT))
+            mercator_x = _MERCATOR_RADIUS * lon
+            mercator_y = _MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + lat / 2))
+            return np.column_stack(((mercator_x - min_x) * scale, (max_y - mercator_y) * scale))
+
+        tile = VectorTile()
+        layer = tile.layers.add(name=LAYER_NAME, version=2, extent=self.extent)
+        layer.keys.extend(["cache_key", "latitude", "longitude", "radius_meters", "area_sqm"])
+        cache_keys = []
+
+        for record, geometry in candidates:
+            tile_geometry = shapely.transform(geometry, _to_tile_coordinates)
+            tile_geometry = shapely.clip_by_rect(
+                tile_geometry, -self.buffer, -self.buffer, self.extent + self.buffer, self.extent + self.buffer
+            )
+            if tile_geometry.is_empty or tile_geometry.geom_type not in ("Polygon", "MultiPolygon"):
+                continue
+            # Внешнее кольцо должно иметь положительную площадь в координатах тайла (ось y вниз)
+            tile_geometry = shapely.set_precision(tile_geometry, 1.0)
+            if tile_geometry.geom_type not in ("Polygon", "MultiPolygon"):
+                continue
+            tile_geometry = shapely.orient_polygons(tile_geometry, exterior_cw=False)
+            commands = encode_polygon_geometry(tile_geometry)
+            if not commands:
+                continue
+
+            feature = layer.features.add(type=_POLYGON)
+            feature.geometry.extend(commands)
+            values = [
+                VectorTileValue(string_value=record.cache_key),
+                VectorTileValue(double_value=record.latitude),
+                VectorTileValue(double_value=record.longitude),
+                VectorTileValue(double_value=record.radius_meters),
+                VectorTileValue(double_value=record.area_sqm),
+            ]
+            for key_index, value in enumerate(values):
+                feature.tags.extend((key_index, len(layer.values)))
+                layer.values.append(value)
+            cache_keys.append(record.cache_key)
+
+        if not layer.features:
+            return b"", cache_keys
+        return tile.SerializeToString(), cache_keys
+
+    def on_cache_write(self, cache_key: str, lat: float, lon: float, radius_meters: float,
+                       polygon_json: str, area: float) -> None:
+        """Инвалидирует тайлы, пересекающие новый полигон"""
+        # Оценка охвата круга в градусах с запасом
+        delta_lat = radius_meters / 111320.0 * 1.1
+        delta_lon = delta_lat / max(math.cos(math.radians(lat)), 0.01)
+        self.cache.invalidate_area(lon - delta_lon, lat - delta_lat, lon + delta_lon, lat + delta_lat)
+
+    def on_cache_delete(self, cache_key: str) -> None:
+        """Инвалидирует тайлы, содержащие удаленный полигон"""
+        self.cache.invalidate_key(cache_key)
+
+    def on_cache_clear(self) -> None:
+        """Сбрасывает кэш тайлов"""
+        self.cache.clear()
+
+    def on_cache_generation(self, generation: int) -> None:
+        """Сбрасывает кэш тайлов после очистки кэша другим процессом"""
+        self.cache.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Возвращает метрики кэша тайлов
+
+        Returns:
+            Количество тайлов, попадания, промахи и инвалидации
+        """
+        return self.cache.get_metrics()
+
+
+# Векторные тайлы процесса
+tile_service = TileService()
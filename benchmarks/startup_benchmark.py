@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта: время импорта приложения и потребление памяти (RSS)
+
+Каждый замер выполняется в отдельном процессе интерпретатора:
+ - import: импорт app.main (то, что происходит до bind сокета)
+ - services: импорт app.main и создание PolygonService (все тяжелые зависимости загружены)
+
+Запуск из корня проекта:
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "import": "import app.main",
+    "services": "import app.main; app.main.get_polygon_service()",
+}
+
+MEASURE_TEMPLATE = """
+import json, resource, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+def measure(statement: str) -> dict:
+    """Выполняет замер в чистом процессе и возвращает время и пиковый RSS"""
+    code = MEASURE_TEMPLATE.format(statement=statement)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="количество замеров на сценарий")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for name, statement in SCENARIOS.items():
+        samples = [measure(statement) for _ in range(args.runs)]
+        seconds = [sample["seconds"] for sample in samples]
+        rss = [sample["max_rss_kb"] for sample in samples]
+        results[name] = {
+            "median_seconds": statistics.median(seconds),
+            "min_seconds": min(seconds),
+            "max_seconds": max(seconds),
+            "median_rss_mb": statistics.median(rss) / 1024
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<10} {'median, s':>10} {'min, s':>8} {'max, s':>8} {'RSS, MB':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<10} {result['median_seconds']:>10.3f} {result['min_seconds']:>8.3f} "
+            f"{result['max_seconds']:>8.3f} {result['median_rss_mb']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
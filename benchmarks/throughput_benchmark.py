@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности в зависимости от количества воркеров
+
+Для каждого значения --workers запускается сервер (python main.py с SERVER_WORKERS=N),
+горячий набор точек прогревается одним проходом, после чего несколько процессов
+нагрузки отправляют GET /polygon по keep-alive соединениям в течение --duration секунд.
+После прогрева все запросы обслуживаются кэшем горячих полигонов в разделяемой
+памяти, поэтому замер показывает масштабирование HTTP/сериализации по ядрам.
+Суммарный PSS сервера показывает стоимость каждого воркера по памяти: горячий
+набор хранится в одном сегменте и не копируется в каждый воркер.
+
+Запуск из корня проекта (база данных не обязательна):
+    python benchmarks/throughput_benchmark.py --workers 1 2 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def hot_set(size: int, seed: int = 42) -> list:
+    """Пути запросов горячего набора точек"""
+    rng = random.Random(seed)
+    return [
+        f"/polygon?latitude={rng.uniform(-60, 60):.5f}&longitude={rng.uniform(-180, 180):.5f}"
+        f"&radius={rng.choice((500, 1000, 5000))}"
+        for _ in range(size)
+    ]
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SERVER_WORKERS=str(workers),
+        SERVER_PORT=str(port),
+        ASYNC_SLEEP_SECONDS="0",
+        LOG_LEVEL="WARNING",
+        # Без ключа сервисного аккаунта логирование в Google Sheets выключено и не влияет на замер
+        GOOGLE_SERVICE_ACCOUNT_FILE=os.devnull + ".missing",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=PROJECT_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/livez", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"Server with {workers} workers did not start")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def tree_pss_mb(pid: int) -> float:
+    """
+    Суммарный PSS процесса и его потомков (Linux, /proc)
+
+    В отличие от RSS, общие страницы (разделяемая память, copy-on-write после fork)
+    делятся между процессами, а не учитываются в каждом.
+    """
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/smaps_rollup") as rollup:
+                for line in rollup:
+                    if line.startswith("Pss:"):
+                        total_kb += int(line.split()[1])
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+async def _request(reader, writer, path: str, port: int) -> None:
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode())
+    headers = await reader.readuntil(b"\r\n\r\n")
+    status = int(headers.split(b" ", 2)[1])
+    length = 0
+    for line in headers.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    if status != 200:
+        raise RuntimeError(f"Unexpected status {status}")
+
+
+async def _connection(paths: list, port: int, deadline: float, latencies: list) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    rng = random.Random()
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            await _request(reader, writer, rng.choice(paths), port)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+def load_worker(paths: list, port: int, connections: int, duration: float) -> list:
+    """Процесс нагрузки: connections keep-alive соединений в одном event loop"""
+    async def _run():
+        deadline = time.monotonic() + duration
+        latencies: list = []
+        await asyncio.gather(*[_connection(paths, port, deadline, latencies) for _ in range(connections)])
+        return latencies
+
+    return asyncio.run(_run())
+
+
+def warm_up(paths: list, port: int, attempts: int = 3) -> None:
+    # Первые запросы могут не уложиться в таймаут, пока воркеры пула геометрии прогреваются
+    for path in paths:
+        for attempt in range(attempts):
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=60) as response:
+                    response.read()
+                break
+            except urllib.error.HTTPError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(1)
+
+
+def measure(workers: int, args) -> dict:
+    port = args.port
+    paths = hot_set(args.hot_set)
+    process = start_server(workers, port)
+    try:
+        warm_up(paths, port)
+        # Воркеры завершают фоновые шаги запуска (прогрев пула геометрии), не конкурируя с замером
+        time.sleep(args.settle)
+        with multiprocessing.Pool(args.clients) as pool:
+            started = time.monotonic()
+            samples = pool.starmap(
+                load_worker, [(paths, port, args.connections, args.duration)] * args.clients
+            )
+            elapsed = time.monotonic() - started
+        pss_mb = tree_pss_mb(process.pid)
+    finally:
+        stop_server(process)
+
+    latencies = sorted(latency for sample in samples for latency in sample)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "server_pss_mb": pss_mb
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="количества воркеров сервера")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность замера, с")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="процессов нагрузки")
+    parser.add_argument("--connections", type=int, default=32, help="соединений на процесс нагрузки")
+    parser.add_argument("--hot-set", type=int, default=256, help="размер горячего набора точек")
+    parser.add_argument("--settle", type=float, default=10.0, help="пауза между прогревом и замером, с")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = [measure(workers, args) for workers in args.workers]
+    baseline = results[0]["rps"]
+    for result in results:
+        result["speedup"] = result["rps"] / baseline
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'p50, ms':>8} {'p99, ms':>8} {'PSS, MB':>8}")
+    for result in results:
+        print(
+            f"{result['workers']:>7} {result['rps']:>10.0f} {result['speedup']:>8.2f} "
+            f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['server_pss_mb']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
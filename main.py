@@ -1,6 +1,6 @@
 from app.main import app, setup_logging
 
 if __name__ == "__main__":
-    import uvicorn
+    from app.server import run
     setup_logging()
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    run(app) 
\ No newline at end of file
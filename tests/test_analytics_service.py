@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from app.services.analytics_service import AnalyticsService
+
+
+def _service(max_buffered: int = 100) -> AnalyticsService:
+    service = AnalyticsService()
+    service.max_buffered = max_buffered
+    service._started = True
+    return service
+
+
+def _record(service: AnalyticsService, count: int, start: int = 0) -> None:
+    for i in range(start, start + count):
+        service.record(f"key-{i}", 55.0, 37.0, 100.0, 1.0, False, "local", 0.01)
+
+
+def test_failed_write_is_requeued_before_new_records():
+    service = _service()
+    _record(service, 3)
+
+    async def scenario():
+        def _fail(columns):
+            raise OSError("disk full")
+
+        service._write = _fail
+        await service.flush()
+
+    asyncio.run(scenario())
+    _record(service, 2, start=3)
+
+    assert service.write_failures == 1
+    assert service._inflight is None
+    assert service._buffered == 5
+    assert service._columns["cache_key"] == [f"key-{i}" for i in range(5)]
+
+
+def test_requeue_is_bounded_by_buffer_limit():
+    service = _service(max_buffered=2)
+
+    async def scenario():
+        def _fail(columns):
+            raise OSError("disk full")
+
+        service._write = _fail
+        # Сброс по заполнению буфера запускается вручную
+        service._flush_task = asyncio.get_running_loop().create_future()
+        _record(service, 3)
+        task = service._flush_task = asyncio.ensure_future(service.flush())
+        await asyncio.sleep(0)
+        # Во время записи буфер почти заполнился новыми записями
+        _record(service, 3, start=3)
+        await task
+
+    asyncio.run(scenario())
+
+    assert service._buffered == 4
+    assert service._columns["cache_key"] == ["key-2", "key-3", "key-4", "key-5"]
+    assert service.dropped == 2
+
+
+def test_overlapping_flushes_are_serialized():
+    service = _service()
+    active = []
+    overlaps = []
+    guard = threading.Lock()
+
+    def _write(columns):
+        with guard:
+            active.append(columns)
+            if len(active) > 1:
+                overlaps.append(len(active))
+        threading.Event().wait(0.01)
+        with guard:
+            active.pop()
+
+    async def scenario():
+        service._write = _write
+        _record(service, 1)
+        first = asyncio.ensure_future(service.flush())
+        await asyncio.sleep(0)
+        _record(service, 1, start=1)
+        await asyncio.gather(first, service.flush())
+
+    asyncio.run(scenario())
+
+    assert overlaps == []
+    assert service._inflight is None
+    assert service._buffered == 0
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.repositories import cache_repository as cache_repository_module
+from app.repositories.cache_repository import CacheRepository
+
+
+class _PgError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+class _FakeSession:
+    def __init__(self, failures, pgcode="55P03"):
+        self.failures = failures
+        self.pgcode = pgcode
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        if "cache_entries_create_partition" in str(statement) and self.failures:
+            self.failures -= 1
+            raise OperationalError(str(statement), params, _PgError(self.pgcode))
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    monkeypatch.setattr(cache_repository_module.time, "sleep", lambda seconds: None)
+    repository = CacheRepository()
+    repository.partition_config = {"enabled": True, "hash_modulus": 4, "lock_timeout_ms": 500}
+    return repository
+
+
+def test_partition_creation_retries_on_lock_timeout(repository):
+    db = _FakeSession(failures=2)
+
+    assert repository._create_partition(db, 5) is True
+    assert db.rollbacks == 2
+    assert db.commits == 1
+    # lock_timeout выставляется в каждой транзакции перед созданием секции
+    timeouts = [params for statement, params in db.statements if "lock_timeout" in statement]
+    assert timeouts == [{"lock_timeout": "500ms"}] * 3
+
+
+def test_partition_creation_gives_up_after_attempts(repository):
+    db = _FakeSession(failures=10)
+
+    assert repository._create_partition(db, 5) is False
+    assert db.rollbacks == cache_repository_module._PARTITION_CREATE_ATTEMPTS
+
+
+def test_partition_creation_raises_other_errors(repository):
+    db = _FakeSession(failures=1, pgcode="42P01")
+
+    with pytest.raises(OperationalError):
+        repository._create_partition(db, 5)
@@ -0,0 +1,111 @@
+import asyncio
+from app.services.circuit_breaker import CircuitBreaker, CircuitState
+
+
+def _make_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test")
+    breaker.failure_threshold = 1
+    breaker.latency_threshold = 10.0
+    breaker.open_seconds = 60.0
+    return breaker
+
+
+def test_success_started_before_open_does_not_close_breaker():
+    async def scenario():
+        breaker = _make_breaker()
+        release = asyncio.Event()
+
+        async def slow_success():
+            await release.wait()
+            return "ok"
+
+        async def failure():
+            raise RuntimeError("boom")
+
+        pending = asyncio.ensure_future(breaker.call(slow_success))
+        await asyncio.sleep(0)
+        try:
+            await breaker.call(failure)
+        except RuntimeError:
+            pass
+        assert breaker.state == CircuitState.OPEN
+
+        release.set()
+        assert await pending == "ok"
+        assert breaker.state == CircuitState.OPEN
+
+    asyncio.run(scenario())
+
+
+def test_half_open_probe_closes_breaker():
+    async def scenario():
+        breaker = _make_breaker()
+        breaker.record_failure()
+        assert breaker.state == CircuitState.OPEN
+        breaker._opened_at -= breaker.open_seconds
+
+        async def success():
+            return "ok"
+
+        assert await breaker.call(success) == "ok"
+        assert breaker.state == CircuitState.CLOSED
+
+    asyncio.run(scenario())
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = _make_breaker()
+    breaker.record_failure()
+    breaker._opened_at -= breaker.open_seconds
+    return breaker
+
+
+def test_cancelled_half_open_probe_releases_its_slot():
+    async def scenario():
+        breaker = _half_open_breaker()
+
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def success():
+            return "ok"
+
+        try:
+            await asyncio.wait_for(breaker.call(slow), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        assert breaker.state == CircuitState.HALF_OPEN
+
+        assert await breaker.call(success) == "ok"
+        assert breaker.state == CircuitState.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_hung_half_open_probe_times_out():
+    async def scenario():
+        breaker = _half_open_breaker()
+        breaker.half_open_timeout = 5.0
+        release = asyncio.Event()
+
+        async def hung():
+            await release.wait()
+            raise RuntimeError("late failure")
+
+        async def success():
+            return "ok"
+
+        probe = asyncio.ensure_future(breaker.call(hung))
+        await asyncio.sleep(0)
+        assert not breaker.allow_request()
+
+        breaker._half_open_at -= breaker.half_open_timeout
+        assert await breaker.call(success) == "ok"
+        assert breaker.state == CircuitState.CLOSED
+
+        # Поздний результат зависшей пробы относится к прежней эпохе
+        release.set()
+        await asyncio.gather(probe, return_exceptions=True)
+        assert breaker.state == CircuitState.CLOSED
+
+    asyncio.run(scenario())
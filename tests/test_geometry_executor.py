@@ -0,0 +1,52 @@
+import asyncio
+import time
+import pytest
+from app.services.geometry_executor import GeometryExecutor, GeometryExecutorOverloadedError
+
+
+def _sleep(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def _make_executor(max_pending: int = 1, task_timeout: float = 0.1) -> GeometryExecutor:
+    executor = GeometryExecutor()
+    executor.executor_type = "thread"
+    executor.max_workers = 1
+    executor.max_pending = max_pending
+    executor.task_timeout = task_timeout
+    return executor
+
+
+def test_timed_out_task_keeps_slot_until_finished():
+    async def scenario():
+        executor = _make_executor()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await executor.run(_sleep, 0.5)
+            # Воркер еще считает - новая задача не принимается
+            assert executor._pending == 1
+            with pytest.raises(GeometryExecutorOverloadedError):
+                await executor.run(_sleep, 0.0)
+
+            await asyncio.sleep(0.6)
+            assert executor._pending == 0
+            assert await executor.run(_sleep, 0.0) == 0.0
+        finally:
+            executor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_map_chunked_releases_all_slots():
+    async def scenario():
+        executor = _make_executor(max_pending=3, task_timeout=5.0)
+        try:
+            results = await executor.map_chunked(_sleep, [(0.0,)] * 5, chunk_size=2)
+            assert results == [0.0] * 5
+            await asyncio.sleep(0)
+            assert executor._pending == 0
+        finally:
+            executor.shutdown()
+
+    asyncio.run(scenario())
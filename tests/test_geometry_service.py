@@ -0,0 +1,29 @@
+import numpy as np
+import shapely
+from app.services.geometry_service import GeometryService, round_coordinates
+
+
+def _to_shape(geojson):
+    rings = geojson["coordinates"]
+    return shapely.Polygon(rings[0], rings[1:])
+
+
+def test_round_coordinates_removes_repeated_vertices():
+    polygon = GeometryService().create_circular_polygon(55.7558, 37.6176, 100.0, 64)
+    rounded = round_coordinates(polygon, 3)
+
+    ring = np.asarray(rounded["coordinates"][0])
+    assert len(ring) < len(polygon["coordinates"][0])
+    assert not np.any(np.all(ring[1:] == ring[:-1], axis=1))
+    assert np.array_equal(ring, np.round(ring, 3))
+    assert _to_shape(rounded).is_valid
+
+
+def test_round_coordinates_keeps_polygon_that_collapses():
+    polygon = GeometryService().create_circular_polygon(55.7558, 37.6176, 10.0, 16)
+    assert round_coordinates(polygon, 1) is polygon
+
+
+def test_round_coordinates_without_precision():
+    polygon = GeometryService().create_circular_polygon(55.7558, 37.6176, 100.0, 16)
+    assert round_coordinates(polygon, None) is polygon
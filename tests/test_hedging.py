@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from app.services import polygon_service as polygon_service_module
+from app.services.hedging_service import HedgedExecutor, HedgeFailedError
+from app.services.polygon_service import PolygonService
+
+
+def _hedge() -> HedgedExecutor:
+    hedge = HedgedExecutor("postgis", "local")
+    hedge.enabled = True
+    hedge._delay = 0.0
+    return hedge
+
+
+async def _slow_failure():
+    await asyncio.sleep(0.01)
+    raise RuntimeError("postgis failed")
+
+
+async def _local_failure():
+    raise ValueError("local failed")
+
+
+def test_both_calls_failing_raise_hedge_failed_error():
+    hedge = _hedge()
+
+    with pytest.raises(HedgeFailedError) as excinfo:
+        asyncio.run(hedge.run(_slow_failure, _local_failure))
+
+    assert isinstance(excinfo.value.primary_error, RuntimeError)
+    assert isinstance(excinfo.value.hedge_error, ValueError)
+    assert hedge.errors == {"postgis": 1, "local": 1}
+
+
+def test_compute_polygon_does_not_rerun_local_after_both_hedges_fail(monkeypatch):
+    monkeypatch.setattr(polygon_service_module, "geometry_hedge", _hedge())
+    service = PolygonService()
+    service.postgis_repository.create_polygon = lambda *args: _slow_failure()
+    local_runs = []
+
+    async def _run(fn, *args):
+        local_runs.append(args)
+        raise ValueError("local failed")
+
+    monkeypatch.setattr(polygon_service_module.geometry_executor, "run", _run)
+
+    options = {"segments": 16, "simplify_tolerance": 0.0}
+    with pytest.raises(ValueError):
+        asyncio.run(service._compute_polygon(55.0, 37.0, 100.0, options))
+
+    assert len(local_runs) == 1
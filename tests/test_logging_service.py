@@ -0,0 +1,43 @@
+import logging
+import os
+import pytest
+from app.services.logging_service import LoggingPipeline
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+
+
+@pytest.fixture
+def pipeline():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    pipeline = LoggingPipeline()
+    yield pipeline
+    pipeline.stop()
+    for handler in pipeline._handlers:
+        handler.close()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_forked_worker_writes_its_own_log_file(pipeline, tmp_path):
+    log_file = tmp_path / "api.log"
+    pipeline.configure("INFO", log_file=str(log_file))
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            logging.getLogger("worker").warning("from worker")
+            pipeline.stop()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    logging.getLogger("supervisor").warning("from supervisor")
+    pipeline.stop()
+
+    assert "from worker" in (tmp_path / f"api.{pid}.log").read_text()
+    supervisor_log = log_file.read_text()
+    assert "from supervisor" in supervisor_log
+    assert "from worker" not in supervisor_log
@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services.admission_service import AdmissionController, RateLimitExceededError
+from app.services import polygon_service as polygon_service_module
+from app.services.polygon_service import PolygonService
+
+
+class _FakeCacheService:
+    def __init__(self, cached_keys=()):
+        self.cached_keys = set(cached_keys)
+        self.stored = []
+
+    def get_cache_key(self, lat, lon, radius_meters, options):
+        return f"{lat}:{lon}:{radius_meters}"
+
+    async def get_cached_polygons(self, requests):
+        result = {}
+        for request in requests:
+            key = self.get_cache_key(*request)
+            if key in self.cached_keys:
+                result[key] = {"polygon": {"type": "Polygon"}, "polygon_json": "{}", "cached": True, "area": 1.0}
+        return result
+
+    async def cache_polygons(self, entries):
+        self.stored.extend(entries)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    controller = AdmissionController()
+    controller.enabled = True
+    monkeypatch.setattr(polygon_service_module, "admission_controller", controller)
+
+    service = PolygonService()
+    service.cache_service = _FakeCacheService()
+    service._record_request = lambda *args, **kwargs: None
+    service.builds = 0
+
+    async def _build_polygon(lat, lon, radius_meters, options):
+        service.builds += 1
+        await asyncio.sleep(0)
+        if lat == 13.0:
+            raise RuntimeError("build failed")
+        return {"type": "Polygon"}, 2.0, "local"
+
+    service._build_polygon = _build_polygon
+    service.controller = controller
+    return service
+
+
+def _points(count: int, start: int = 0):
+    return [{"lat": float(i) / 10, "lon": 37.0, "radius_meters": 100.0} for i in range(start, start + count)]
+
+
+def test_batch_of_max_size_misses_is_admitted(service):
+    assert settings.max_batch_size > service.controller.limiter.burst
+
+    results = asyncio.run(service.create_polygons(_points(settings.max_batch_size), client_id="client"))
+
+    assert len(results) == settings.max_batch_size
+    assert not any(result["cached"] for result in results)
+    assert len(service.cache_service.stored) == settings.max_batch_size
+    assert service.controller._active == 0
+    # Пакет оплачен токеном за каждый промах - ведро ушло в долг
+    assert service.controller.limiter.try_acquire("client") > 0.0
+
+
+def test_partial_hit_batch_larger_than_burst(service):
+    points = _points(60)
+    service.cache_service.cached_keys = {
+        service.cache_service.get_cache_key(p["lat"], p["lon"], p["radius_meters"], None) for p in points[::2]
+    }
+
+    results = asyncio.run(service.create_polygons(points, client_id="client"))
+
+    assert [result["cached"] for result in results] == [i % 2 == 0 for i in range(60)]
+    assert service.builds == 30
+    assert len(service.cache_service.stored) == 30
+
+
+def test_batch_is_charged_per_miss(service):
+    service.controller.limiter.rate = 0.0
+    service.controller.limiter.burst = 20
+
+    asyncio.run(service.create_polygons(_points(15), client_id="client"))
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(service.create_polygons(_points(10, start=100), client_id="client"))
+    assert service.builds == 15
+
+    # Попадания не расходуют токены: повтор пакета проходит, остаток ведра - 5 промахов
+    service.cache_service.cached_keys = {
+        service.cache_service.get_cache_key(p["lat"], p["lon"], p["radius_meters"], None) for p in _points(15)
+    }
+    asyncio.run(service.create_polygons(_points(15) + _points(5, start=200), client_id="client"))
+    assert service.builds == 20
+
+
+def test_failed_build_keeps_other_results_cached(service):
+    points = _points(5) + [{"lat": 13.0, "lon": 37.0, "radius_meters": 100.0}]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.create_polygons(points, client_id="client"))
+
+    assert len(service.cache_service.stored) == 5
+    assert service.controller._active == 0
+
+
+def test_limiter_charges_cost_above_burst_only_from_full_bucket():
+    controller = AdmissionController()
+    limiter = controller.limiter
+    limiter.rate = 10.0
+    limiter.burst = 20
+
+    assert limiter.try_acquire("client", 5) == 0.0
+    # Неполное ведро: пакет дороже burst ждет полного ведра
+    assert limiter.try_acquire("other", 50) == 0.0
+    assert limiter.try_acquire("client", 50) > 0.0
+    # Долг 30 токенов восполняется за 3 секунды сверх одного токена
+    assert limiter.try_acquire("other") > 3.0
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services.admission_service import AdmissionController, RateLimitExceededError
+from app.services import polygon_service as polygon_service_module
+from app.services.polygon_service import PolygonService
+
+
+class _FakeCacheService:
+    def __init__(self, controller):
+        self.controller = controller
+        self.hot = set()
+        self.stored = set()
+        self.calls = []
+
+    async def find_cached_polygon(self, lat, lon, radius_meters, options=None, primary=True):
+        if (lat, lon) in self.hot or (primary and (lat, lon) in self.stored):
+            return {"polygon": {"type": "Polygon"}, "polygon_json": "{}", "cached": True, "area": 1.0}
+        return None
+
+    async def lookup_or_create_polygon(self, lat, lon, radius_meters, options=None, check_cached=True):
+        # Слот admission control занят до построения полигона в базе
+        self.calls.append((check_cached, self.controller._active))
+        cached = (lat, lon) in self.stored
+        self.stored.add((lat, lon))
+        return {"polygon": {"type": "Polygon"}, "polygon_json": "{}", "cached": cached, "area": 1.0}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    controller = AdmissionController()
+    controller.enabled = True
+    monkeypatch.setattr(polygon_service_module, "admission_controller", controller)
+    monkeypatch.setattr(polygon_service_module.geometry_hedge, "enabled", False)
+    monkeypatch.setattr(settings, "async_sleep_seconds", 0.0)
+
+    service = PolygonService()
+    service.db_function_enabled = True
+    service.cache_service = _FakeCacheService(controller)
+    service._record_request = lambda *args, **kwargs: None
+    service.controller = controller
+    return service
+
+
+def test_sql_function_runs_inside_admission(service):
+    result = asyncio.run(service.create_polygon(55.0, 37.0, 100.0, client_id="client"))
+
+    assert result["cached"] is False
+    assert service.cache_service.calls == [(False, 1)]
+    assert service.controller._active == 0
+
+
+def test_rate_limited_request_does_not_reach_sql_function(service):
+    service.controller.limiter.rate = 0.0
+    service.controller.limiter.burst = 1
+
+    asyncio.run(service.create_polygon(55.0, 37.0, 100.0, client_id="client"))
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(service.create_polygon(56.0, 37.0, 100.0, client_id="client"))
+
+    assert len(service.cache_service.calls) == 1
+    assert (56.0, 37.0) not in service.cache_service.stored
+
+
+def test_hot_cache_hit_skips_admission(service):
+    service.controller.limiter.rate = 0.0
+    service.controller.limiter.burst = 1
+    service.cache_service.hot = {(55.0, 37.0)}
+
+    for _ in range(3):
+        result = asyncio.run(service.create_polygon(55.0, 37.0, 100.0, client_id="client"))
+        assert result["cached"] is True
+
+    assert service.cache_service.calls == []
+    assert service.controller.limiter.try_acquire("client") == 0.0
+
+
+def test_database_hit_skips_admission(service):
+    service.controller.limiter.rate = 0.0
+    service.controller.limiter.burst = 1
+    service.cache_service.stored = {(55.0, 37.0)}
+
+    for _ in range(3):
+        result = asyncio.run(service.create_polygon(55.0, 37.0, 100.0, client_id="client"))
+        assert result["cached"] is True
+
+    assert service.cache_service.calls == []
+    assert service.controller._active == 0
+    assert service.controller.limiter.try_acquire("client") == 0.0
@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app, raise_server_exceptions=False)
+
+
+def test_invalid_radius_with_matching_etag_is_rejected():
+    response = client.get(
+        "/polygon",
+        params={"latitude": 55.75, "longitude": 37.61, "radius": 10 ** 9},
+        headers={"If-None-Match": "*"}
+    )
+    assert response.status_code == 400
+
+
+def test_out_of_range_latitude_with_matching_etag_is_rejected():
+    response = client.get(
+        "/polygon",
+        params={"latitude": 95.0, "longitude": 37.61, "radius": 100},
+        headers={"If-None-Match": "*"}
+    )
+    assert response.status_code == 422
+
+
+def test_valid_request_with_matching_etag_is_not_modified():
+    response = client.get(
+        "/polygon",
+        params={"latitude": 55.75, "longitude": 37.61, "radius": 100},
+        headers={"If-None-Match": "*"}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"]
@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import signal
+import time
+import pytest
+from app import server
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+
+
+class _SleepingSupervisor(server.WorkerSupervisor):
+    """Воркер вместо uvicorn записывает свой pid и ждет сигнала"""
+
+    def __init__(self, pid_dir: str, workers: int):
+        super().__init__(app=None, host="127.0.0.1", port=0, workers=workers)
+        self.pid_dir = pid_dir
+
+    def _serve(self) -> None:
+        with open(os.path.join(self.pid_dir, str(os.getpid())), "w"):
+            pass
+        while True:
+            time.sleep(1)
+
+
+def _run_supervisor(pid_dir: str, workers: int) -> None:
+    server._MIN_WORKER_UPTIME_SECONDS = 0.0
+    _SleepingSupervisor(pid_dir, workers).run()
+
+
+def _wait_for_pids(pid_dir, count: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = {int(name) for name in os.listdir(pid_dir)}
+        if len(pids) >= count:
+            return pids
+        time.sleep(0.05)
+    raise AssertionError(f"expected {count} workers, got {os.listdir(pid_dir)}")
+
+
+def test_dead_worker_is_respawned_and_stop_terminates_all(tmp_path):
+    supervisor = multiprocessing.get_context("fork").Process(target=_run_supervisor, args=(str(tmp_path), 2))
+    supervisor.start()
+    try:
+        first = _wait_for_pids(tmp_path, 2)
+        killed = min(first)
+        os.kill(killed, signal.SIGKILL)
+
+        pids = _wait_for_pids(tmp_path, 3)
+        respawned = pids - first
+        assert len(respawned) == 1
+
+        supervisor.terminate()
+        supervisor.join(timeout=10)
+        assert supervisor.exitcode is not None
+        for pid in pids - {killed}:
+            with pytest.raises(ProcessLookupError):
+                os.kill(pid, 0)
+    finally:
+        if supervisor.is_alive():
+            supervisor.kill()
+            supervisor.join()
@@ -0,0 +1,132 @@
+import hashlib
+import multiprocessing
+import pytest
+from app.services import shared_cache as shared_cache_module
+from app.services.shared_cache import SharedPolygonCache
+
+
+def _key(name: str) -> str:
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+@pytest.fixture
+def make_cache():
+    caches = []
+
+    def _make(sets: int = 1, ways: int = 2, slot_bytes: int = 256) -> SharedPolygonCache:
+        cache = SharedPolygonCache()
+        cache.enabled = True
+        cache.ways = ways
+        cache.sets = sets
+        cache.slots = sets * ways
+        cache.slot_bytes = slot_bytes
+        cache.capacity = slot_bytes - shared_cache_module._SLOT_HEADER_SIZE
+        assert cache.create()
+        caches.append(cache)
+        return cache
+
+    yield _make
+    for cache in caches:
+        cache.destroy()
+
+
+def test_full_set_evicts_oldest_entry(make_cache):
+    cache = make_cache(sets=1, ways=2)
+    cache.put(_key("a"), '{"a": 1}', 1.0)
+    cache.put(_key("b"), '{"b": 2}', 2.0)
+    cache.put(_key("c"), '{"c": 3}', 3.0)
+
+    assert cache.evictions == 1
+    assert cache.get(_key("a")) is None
+    assert cache.get(_key("b")) == ('{"b": 2}', 2.0)
+    assert cache.get(_key("c")) == ('{"c": 3}', 3.0)
+
+
+def test_rewrite_of_existing_key_does_not_evict(make_cache):
+    cache = make_cache(sets=1, ways=2)
+    cache.put(_key("a"), '{"v": 1}', 1.0)
+    cache.put(_key("b"), '{"b": 2}', 2.0)
+    cache.put(_key("a"), '{"v": 2}', 1.0)
+
+    assert cache.evictions == 0
+    assert cache.get(_key("a")) == ('{"v": 2}', 1.0)
+
+
+def test_polygon_larger_than_slot_is_not_stored(make_cache):
+    cache = make_cache(slot_bytes=128)
+    assert not cache.put(_key("a"), "x" * 1000, 1.0)
+    assert cache.too_large == 1
+
+
+class _WriteDuringRead:
+    """Подменяет _META: перед первым чтением заголовка слот переписывает «другой процесс»"""
+
+    def __init__(self, cache: SharedPolygonCache, key: str, data: bytes):
+        self._meta = shared_cache_module._META
+        self.size = self._meta.size
+        self.cache = cache
+        self.key = key
+        self.data = data
+        self.reads = 0
+
+    def unpack_from(self, buffer, offset=0):
+        self.reads += 1
+        if self.reads == 1:
+            self.cache._write_slot(offset - shared_cache_module._SEQ.size,
+                                   bytes.fromhex(self.key), 2.0, self.data)
+        return self._meta.unpack_from(buffer, offset)
+
+    def pack_into(self, buffer, offset, *values):
+        self._meta.pack_into(buffer, offset, *values)
+
+
+def test_read_retries_after_concurrent_write(make_cache, monkeypatch):
+    cache = make_cache(sets=1, ways=1)
+    key = _key("a")
+    cache.put(key, '{"v": 1}', 1.0)
+
+    meta = _WriteDuringRead(cache, key, b'{"v": 2}')
+    monkeypatch.setattr(shared_cache_module, "_META", meta)
+
+    # Счетчик слота изменился во время чтения - первая попытка отбрасывается, вторая видит новую запись
+    assert cache.get(key) == ('{"v": 2}', 2.0)
+    assert meta.reads == 2
+
+
+def test_slot_being_written_is_not_read(make_cache):
+    cache = make_cache(sets=1, ways=1)
+    key = _key("a")
+    cache.put(key, '{"v": 1}', 1.0)
+    seq = shared_cache_module._SEQ.unpack_from(cache._buffer, 0)[0]
+    shared_cache_module._SEQ.pack_into(cache._buffer, 0, seq + 1)
+
+    assert cache.get(key) is None
+    assert cache.misses == 1
+
+
+def _write_forever(cache: SharedPolygonCache, key: str, payloads, iterations: int) -> None:
+    for i in range(iterations):
+        cache.put(key, payloads[i % 2], float(i % 2))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="requires fork")
+def test_concurrent_writer_never_produces_torn_reads(make_cache):
+    cache = make_cache(sets=1, ways=1, slot_bytes=4096)
+    key = _key("a")
+    payloads = ("a" * 3000, "b" * 3000)
+    cache.put(key, payloads[0], 0.0)
+
+    writer = multiprocessing.get_context("fork").Process(
+        target=_write_forever, args=(cache, key, payloads, 20000)
+    )
+    writer.start()
+    try:
+        while writer.is_alive():
+            result = cache.get(key)
+            if result is not None:
+                data, area = result
+                assert data in payloads
+                assert data == payloads[int(area)]
+    finally:
+        writer.join(timeout=30)
+    assert writer.exitcode == 0